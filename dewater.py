@@ -1,32 +1,715 @@
 from typing import List
 from PIL import Image
 import argparse
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import math
+import numpy as np
 import os
+import select
+import struct
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 
 
-def change(rgbNew, input, output, silence: bool):
-    i = 1
-    j = 1
+# 三个通道都不低于这个值的像素视为水印
+THRESHOLD = 220
+
+
+class Detector:
+    """水印像素的判定条件: RGB 各通道范围, 可选的 HSV 范围 (H 0~360, S/V 0~100) 和感兴趣区域 (x0, y0, x1, y1)"""
+
+    def __init__(self, rgb=((THRESHOLD, 255),) * 3, hsv=None, roi=None):
+        # 与 uint8 比较时用整数, 避免整块数组被提升成浮点
+        self.rgb = tuple((int(lo), int(hi)) for lo, hi in rgb)
+        self.hsv = tuple(tuple(r) for r in hsv) if hsv else None
+        self.roi = tuple(roi) if roi else None
+
+    def key(self):
+        return repr((self.rgb, self.hsv, self.roi))
+
+    def match(self, pixels):
+        """只按颜色判断 (不看区域), pixels 是 (..., 3) 数组, 返回形状为 pixels.shape[:-1] 的布尔数组"""
+        lows = {lo for lo, _ in self.rgb}
+        if len(lows) == 1 and all(hi >= 255 for _, hi in self.rgb):
+            # 三个通道的最小值不低于阈值, 等价于每个通道都不低于阈值
+            mask = np.minimum(np.minimum(pixels[..., 0], pixels[..., 1]), pixels[..., 2]) >= lows.pop()
+        else:
+            mask = np.ones(pixels.shape[:-1], dtype=bool)
+            for channel, (lo, hi) in enumerate(self.rgb):
+                if lo > 0:
+                    mask &= pixels[..., channel] >= lo
+                if hi < 255:
+                    mask &= pixels[..., channel] <= hi
+        if self.hsv:
+            for values, (lo, hi) in zip(hsv_channels(pixels), self.hsv):
+                mask &= (values >= lo) & (values <= hi)
+        return mask
+
+    def detect(self, pixels, y0=0):
+        """pixels 是从第 y0 行开始的一条 (高, 宽, 3) 数组, 返回同样高宽的布尔掩码"""
+        mask = self.match(pixels)
+        if self.roi:
+            left, top, right, bottom = self.roi
+            mask[:max(0, top - y0)] = False
+            mask[max(0, bottom - y0):] = False
+            mask[:, :left] = False
+            mask[:, right:] = False
+        return mask
+
+
+def hsv_channels(pixels):
+    """RGB 数组转成 (H 0~360, S 0~100, V 0~100) 三个浮点数组"""
+    rgb = pixels.astype(np.float32)
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    high = rgb.max(axis=-1)
+    delta = high - rgb.min(axis=-1)
+    safe = np.where(delta == 0, 1, delta)
+    hue = np.where(high == r, (g - b) / safe % 6, np.where(high == g, (b - r) / safe + 2, (r - g) / safe + 4)) * 60
+    hue[delta == 0] = 0
+    saturation = np.where(high == 0, 0, delta / np.where(high == 0, 1, high)) * 100
+    return hue, saturation, high / 255 * 100
+
+
+class LearnedMask:
+    """从样张学出来的固定掩码 (.npy), 按行切片读取; 只有掩码内的像素再用 detector 的颜色条件判断
+
+    默认的判定条件连纸张底色也算在内, 掩码会盖住样张上所有空白处; 后面页面里落在这些位置的文字
+    不满足颜色条件, 不会被抹掉。掩码内的结果和对同一张图直接用 detector 判断完全一致。
+    """
+
+    def __init__(self, path, detector):
+        self.path = path
+        self.detector = detector
+
+    def key(self):
+        # 文件名里已经带了学习参数和样张内容的哈希
+        return repr((self.path, self.detector.key()))
+
+    def detect(self, pixels, y0=0):
+        # mmap 只读取需要的行; 每次打开只读文件头, 进程池里也不用传整块数组
+        learned = np.load(self.path, mmap_mode='r')[y0:y0 + len(pixels)]
+        if self.detector.hsv and np.count_nonzero(learned) * 2 < learned.size:
+            # HSV 换算很贵, 掩码不到一半时只换算掩码内的像素; 纯 RGB 判断整块算反而更快
+            ys, xs = np.nonzero(learned)
+            mask = np.zeros(learned.shape, dtype=bool)
+            mask[ys, xs] = self.detector.match(pixels[ys, xs])
+            return mask
+        return learned & self.detector.match(pixels)
+
+
+def whiten(pixels, rgbNew, detector=None, y0=0):
+    """把 (高, 宽, 3) 的 uint8 数组里 detector 判定为水印的像素改成 rgbNew (原地修改), 返回替换的像素数
+
+    默认判定三个通道都在 THRESHOLD~255; pixels 是整张图的一部分时 y0 为它的起始行。
+    """
+    mask = (detector or DEFAULT_DETECTOR).detect(pixels, y0)
+    # 按通道用标量赋值, 比 pixels[mask] = (r, g, b) 整体赋值快得多
+    for channel in range(3):
+        pixels[..., channel][mask] = rgbNew[channel]
+    return int(np.count_nonzero(mask))
+
+
+DEFAULT_DETECTOR = Detector()
+
+
+def load_rgb(img):
+    """转成可写的 RGB 数组; 调色板 (P)、灰度 (L)、RGBA 等模式先统一转成 RGB"""
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return np.array(img)
+
+
+def process_file(rgbNew, input, output, strip_rows=0, detector=None):
+    """处理单个文件 (不打印), 返回 (图片大小, 原始模式, 替换的像素数); 供进程池调用"""
+    if strip_rows:
+        return process_strips(rgbNew, input, output, strip_rows, detector)
     img = Image.open(input)  # 读取系统的内照片
-    # 使用Image模块的open()函数打开后，返回的图像对象的模式都是“RGB”。而对于灰度图像，不管其图像格式是PNG，还是BMP，或者JPG，打开后，其模式为“L”。
-    print(f'file: {input}, size: {img.size} resolving...')  # 打印图片大小
-
-    width = img.size[0]  # 长度
-    height = img.size[1]  # 宽度
-    for i in range(0, width):  # 遍历所有长度的点
-        if not silence:
-            print(f'file: {input}, row: {i + 1}/{width}')
-        for j in range(0, height):  # 遍历所有宽度的点
-            data = (img.getpixel((i, j)))  # 打印该图片的所有点
-            # 寻找复合水印范围像素点
-            if (data[0] >= 220 and data[0] <= 255 and data[1] >= 220 and data[1] <= 255 and data[1] >= 220 and data[1] <= 255):
-                # 像素点的颜色改成白色
-                img.putpixel((i, j), (rgbNew[0], rgbNew[1], rgbNew[2]))
-    img = img.convert("RGB")  # 把图片强制转成RGB
-    img.save(output)  # 保存修改像素点后的图片
+    pixels = load_rgb(img)
+    replaced = whiten(pixels, rgbNew, detector)
+    Image.fromarray(pixels, 'RGB').save(output)  # 保存修改像素点后的图片
+    return img.size, img.mode, replaced
+
+
+def change(rgbNew, input, output, silence: bool, strip_rows: int = 0, detector=None):
+    with Image.open(input) as img:  # 只读文件头, 像素在 process_file 里解码
+        print(f'file: {input}, size: {img.size} resolving...')  # 打印图片大小
+
+    # 整张图一次性做阈值判断和替换, 不再逐像素 getpixel/putpixel
+    _, mode, replaced = process_file(rgbNew, input, output, strip_rows, detector)
+    if not silence:
+        print(f'file: {input}, mode: {mode}, replaced {replaced} pixels')
     print(f'file: {input} resolved', end='\n\n')
 
 
+# 像素数达到这个量级的图片切成横条, 由进程池里的多个进程一起处理
+BAND_MIN_PIXELS = 32 * 1024 * 1024
+
+
+def whiten_band(shm_name, shape, rows, rgbNew, detector=None):
+    """在共享内存里的整张图上处理 rows=(起始行, 结束行) 这一条, 返回替换的像素数"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        pixels = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        replaced = whiten(pixels[rows[0]:rows[1]], rgbNew, detector, rows[0])
+        del pixels  # 先释放对共享内存的引用, 否则无法 close
+        return replaced
+    finally:
+        shm.close()
+
+
+def process_banded(pool, jobs, rgbNew, input, output, detector=None):
+    """大图: 读入共享内存后按行切成 jobs 条并行处理, 返回值同 process_file"""
+    img = Image.open(input)
+    width, height = img.size
+    shape = (height, width, 3)
+    shm = shared_memory.SharedMemory(create=True, size=height * width * 3)
+    try:
+        pixels = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        pixels[...] = load_rgb(img)
+        bounds = np.linspace(0, height, jobs + 1).astype(int)
+        bands = [
+            pool.submit(whiten_band, shm.name, shape, (int(lo), int(hi)), rgbNew, detector)
+            for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo
+        ]
+        replaced = sum(band.result() for band in bands)
+        Image.fromarray(pixels, 'RGB').save(output)
+        del pixels
+        return img.size, img.mode, replaced
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def is_huge(input):
+    # Image.open 只读文件头, 不解码像素
+    with Image.open(input) as img:
+        return img.size[0] * img.size[1] >= BAND_MIN_PIXELS
+
+
+# --strip 模式: 按固定行数的横条读入、处理、写出, 内存占用取决于条带大小而不是整张图。
+# 只有输入是未压缩的 raw 数据 (BMP/PPM/PGM/未压缩 TIFF) 时才能直接按行读取; PNG/JPEG 等压缩格式仍然整张解码,
+# 输出为 JPEG 等 STRIP_WRITERS 之外的格式时也要在内存里拼出整张图, 这两种情况内存不受 --strip 限制。
+# 下面是 raw 数据支持的 rawmode 每个像素占的字节数
+RAW_BYTES = {'L': 1, 'P': 1, 'RGB': 3, 'BGR': 3, 'RGBA': 4, 'RGBX': 4, 'BGRA': 4, 'BGRX': 4}
+
+
+def raw_layout(img):
+    """图片数据都是整行宽的未压缩 raw 块时返回 [(起始行, 结束行, 偏移, rawmode, 行字节数, 方向)], 否则返回 None"""
+    width = img.size[0]
+    layout = []
+    for codec, extents, offset, args in img.tile:
+        if codec != 'raw' or extents[0] != 0 or extents[2] != width:
+            return None
+        if isinstance(args, str):
+            args = (args,)
+        rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+        if rawmode not in RAW_BYTES:
+            return None
+        layout.append((extents[1], extents[3], offset, rawmode, stride or width * RAW_BYTES[rawmode], orientation))
+    return layout
+
+
+def read_raw_strip(f, img, layout, y0, y1):
+    """从文件里直接读出 [y0, y1) 行, 返回 RGB 数组"""
+    width = img.size[0]
+    parts = []
+    for top, bottom, offset, rawmode, stride, orientation in layout:
+        lo, hi = max(y0, top), min(y1, bottom)
+        if lo >= hi:
+            continue
+        # orientation 为 -1 时这一块是从下往上存的 (BMP)
+        first = lo - top if orientation >= 0 else bottom - hi
+        f.seek(offset + first * stride)
+        data = f.read((hi - lo) * stride)
+        part = Image.frombuffer(img.mode, (width, hi - lo), data, 'raw', rawmode, stride, orientation)
+        if img.mode == 'P':
+            rawmode, palette = img.palette.getdata()
+            part.putpalette(palette, rawmode)
+        parts.append(load_rgb(part))
+    return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+def iter_strips(img, input, rows):
+    """按 rows 行一条依次产出 (起始行, RGB 数组); 只有 raw 布局的输入是真正按条读取的"""
+    width, height = img.size
+    layout = raw_layout(img)
+    if layout is not None:
+        with open(input, 'rb') as f:
+            for y in range(0, height, rows):
+                yield y, read_raw_strip(f, img, layout, y, min(y + rows, height))
+        return
+    # 压缩格式 (PNG/JPEG 等) 只能整张解码一次, 之后的转换和写出仍按条进行, 内存占用和不加 --strip 相当
+    img.load()
+    for y in range(0, height, rows):
+        yield y, load_rgb(img.crop((0, y, width, min(y + rows, height))))
+
+
+class PngStripWriter:
+    """逐条写 8 位 RGB PNG, 每行用 Sub 过滤后交给同一个 zlib 流"""
+
+    def __init__(self, path, width, height):
+        self.f = open(path, 'wb')
+        self.f.write(b'\x89PNG\r\n\x1a\n')
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        self.z = zlib.compressobj(6)
+
+    def write(self, y, pixels):
+        rows = pixels.reshape(len(pixels), -1)
+        filtered = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 1  # Sub: 每个字节减去左边一个像素的同一通道 (uint8 自然回绕)
+        filtered[:, 1:4] = rows[:, :3]
+        np.subtract(rows[:, 3:], rows[:, :-3], out=filtered[:, 4:])
+        data = self.z.compress(filtered.tobytes())
+        if data:
+            self._chunk(b'IDAT', data)
+
+    def close(self):
+        self._chunk(b'IDAT', self.z.flush())
+        self._chunk(b'IEND', b'')
+        self.f.close()
+
+    def _chunk(self, tag, data):
+        self.f.write(struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data)))
+
+
+class BmpStripWriter:
+    """24 位 BMP, 行从下往上存放并按 4 字节对齐, 每条写到它在文件里的位置"""
+
+    def __init__(self, path, width, height):
+        self.f = open(path, 'wb')
+        self.height = height
+        self.stride = (width * 3 + 3) // 4 * 4
+        size = 54 + self.stride * height
+        self.f.write(b'BM' + struct.pack('<IHHI', size, 0, 0, 54))
+        self.f.write(struct.pack('<IiiHHIIiiII', 40, width, height, 1, 24, 0, self.stride * height, 0, 0, 0, 0))
+
+    def write(self, y, pixels):
+        rows = np.zeros((len(pixels), self.stride), dtype=np.uint8)
+        rows[:, :pixels.shape[1] * 3] = pixels[::-1, :, ::-1].reshape(len(pixels), -1)
+        self.f.seek(54 + (self.height - y - len(pixels)) * self.stride)
+        self.f.write(rows.tobytes())
+
+    def close(self):
+        self.f.close()
+
+
+class PpmStripWriter:
+    def __init__(self, path, width, height):
+        self.f = open(path, 'wb')
+        self.f.write(b'P6\n%d %d\n255\n' % (width, height))
+
+    def write(self, y, pixels):
+        self.f.write(pixels.tobytes())
+
+    def close(self):
+        self.f.close()
+
+
+class TiffStripWriter:
+    """未压缩 RGB TIFF: 像素数据紧跟文件头顺序写入, IFD 放在最后"""
+
+    def __init__(self, path, width, height):
+        self.f = open(path, 'wb')
+        self.width = width
+        self.height = height
+        self.f.write(b'II*\0' + struct.pack('<I', 0))  # IFD 偏移在 close 时补上
+
+    def write(self, y, pixels):
+        self.f.write(pixels.tobytes())
+
+    def close(self):
+        data_size = self.width * self.height * 3
+        ifd_offset = 8 + data_size
+        ifd_offset += ifd_offset % 2
+        bits_offset = ifd_offset + 2 + 10 * 12 + 4
+        entries = [
+            (256, 4, 1, self.width), (257, 4, 1, self.height), (258, 3, 3, bits_offset),
+            (259, 3, 1, 1), (262, 3, 1, 2), (273, 4, 1, 8), (277, 3, 1, 3),
+            (278, 4, 1, self.height), (279, 4, 1, data_size), (284, 3, 1, 1),
+        ]
+        self.f.seek(ifd_offset)
+        self.f.write(struct.pack('<H', len(entries)))
+        for tag, kind, count, value in entries:
+            packed = struct.pack('<H', value) + b'\0\0' if kind == 3 and count == 1 else struct.pack('<I', value)
+            self.f.write(struct.pack('<HHI', tag, kind, count) + packed)
+        self.f.write(struct.pack('<I', 0))
+        self.f.write(struct.pack('<HHH', 8, 8, 8))
+        self.f.seek(4)
+        self.f.write(struct.pack('<I', ifd_offset))
+        self.f.close()
+
+
+STRIP_WRITERS = {
+    '.png': PngStripWriter,
+    '.bmp': BmpStripWriter,
+    '.ppm': PpmStripWriter, '.pnm': PpmStripWriter,
+    '.tif': TiffStripWriter, '.tiff': TiffStripWriter,
+}
+
+
+class ImageStripWriter:
+    """其它格式 (JPEG 等) 的编码器需要整张图: 条带拼进一张 RGB 图, 最后一次保存"""
+
+    def __init__(self, path, width, height):
+        self.path = path
+        self.img = Image.new('RGB', (width, height))
+
+    def write(self, y, pixels):
+        self.img.paste(Image.fromarray(pixels, 'RGB'), (0, y))
+
+    def close(self):
+        self.img.save(self.path)
+
+
+def process_strips(rgbNew, input, output, rows, detector=None):
+    """--strip 模式的 process_file: 每次只处理 rows 行"""
+    img = Image.open(input)
+    writer = STRIP_WRITERS.get(extname(output).lower(), ImageStripWriter)(output, *img.size)
+    replaced = 0
+    for y, pixels in iter_strips(img, input, rows):
+        replaced += whiten(pixels, rgbNew, detector, y)
+        writer.write(y, pixels)
+    writer.close()
+    return img.size, img.mode, replaced
+
+
+def run_parallel(rgbNew, tasks, jobs, silence, strip_rows=0):
+    """用 jobs 个进程处理 [(输入, 输出, 判定条件), ...], 按输入顺序报告结果, 返回失败的 [(文件, 错误)]"""
+    failed = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        # 按任务下标对应, 同一个输入出现多次时 (比如 -i a.png a.png) 各自有自己的结果
+        futures = {}
+        for i, (input, output, detector) in enumerate(tasks):
+            try:
+                # 按条处理时内存已经有上限, 不再整张读进共享内存
+                if not strip_rows and is_huge(input):
+                    continue
+            except Exception:
+                pass  # 打不开的文件交给 process_file 报错
+            futures[i] = pool.submit(process_file, rgbNew, input, output, strip_rows, detector)
+
+        for i, (input, output, detector) in enumerate(tasks):
+            try:
+                if i not in futures:
+                    size, mode, replaced = process_banded(pool, jobs, rgbNew, input, output, detector)
+                else:
+                    size, mode, replaced = futures[i].result()
+            except Exception as e:
+                failed.append((input, e))
+                print(f'file: {input} failed: {e}', end='\n\n')
+                continue
+            print(f'file: {input}, size: {size} resolved')
+            if not silence:
+                print(f'file: {input}, mode: {mode}, replaced {replaced} pixels')
+            print()
+    return failed
+
+
+def run_serial(rgbNew, tasks, silence, strip_rows=0):
+    failed = []
+    for input, output, detector in tasks:
+        try:
+            change(rgbNew, input, output, silence, strip_rows, detector)
+        except Exception as e:
+            failed.append((input, e))
+            print(f'file: {input} failed: {e}', end='\n\n')
+    return failed
+
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def group_by_size(files):
+    """按图片大小分组 (只读文件头), 保持输入顺序; 打不开的文件留到处理时再报错"""
+    groups = {}
+    for filename in files:
+        try:
+            with Image.open(filename) as img:
+                groups.setdefault(img.size, []).append(filename)
+        except Exception:
+            pass
+    return groups
+
+
+def learn_mask(files, detector, consensus):
+    """在至少 consensus 比例的样张上都被判定为水印的像素"""
+    counts = None
+    for filename in files:
+        hits = detector.detect(load_rgb(Image.open(filename)))
+        counts = hits.astype(np.uint16) if counts is None else counts + hits
+    return counts >= max(1, math.ceil(consensus * len(files)))
+
+
+def prepare_masks(groups, detector, learn, reference, consensus, cache_dir):
+    """为每种图片大小准备学习好的掩码, 返回 {(宽, 高): LearnedMask}
+
+    reference 指定时只用这一张样张, 否则用每种大小的前 learn 张 (不足 learn 张的大小不学习)。
+    缓存文件名由图片大小、判定条件和样张内容的哈希组成, 换了文档或参数不会误用旧掩码。
+    """
+    if reference:
+        with Image.open(reference) as img:
+            sources = {img.size: [reference]}
+    else:
+        sources = {size: files[:learn] for size, files in groups.items() if len(files) >= learn}
+
+    os.makedirs(cache_dir, exist_ok=True)
+    masks = {}
+    for size, files in sources.items():
+        fingerprint = hashlib.sha1(f'{detector.key()}|{consensus}'.encode())
+        for filename in files:
+            fingerprint.update(file_digest(filename))
+        path = os.path.join(cache_dir, f'mask_{size[0]}x{size[1]}_{fingerprint.hexdigest()[:16]}.npy')
+        if os.path.exists(path):
+            print(f'mask: {size[0]}x{size[1]} cached {path}')
+        else:
+            tmp_path = path[:-len('.npy')] + '.tmp.npy'
+            np.save(tmp_path, learn_mask(files, detector, consensus))
+            os.replace(tmp_path, path)
+            print(f'mask: {size[0]}x{size[1]} learned from {len(files)} page(s) -> {path}')
+        masks[size] = LearnedMask(path, detector)
+    return masks
+
+
+def parse_ranges(text, count):
+    """'220-255' 或 '220-255,200-255,...' 解析成 count 个 (下限, 上限), 只写一个范围时所有分量共用"""
+    try:
+        ranges = [tuple(float(v) for v in part.split('-')) for part in text.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid range: {text}')
+    if len(ranges) == 1:
+        ranges *= count
+    if len(ranges) != count or any(len(r) != 2 for r in ranges):
+        raise argparse.ArgumentTypeError(f'expected 1 or {count} ranges LO-HI: {text}')
+    return ranges
+
+
+def parse_roi(text):
+    try:
+        roi = tuple(int(v) for v in text.split(','))
+    except ValueError:
+        roi = ()
+    if len(roi) != 4:
+        raise argparse.ArgumentTypeError(f'expected x0,y0,x1,y1: {text}')
+    return roi
+
+
+# 会被当作输入图片的扩展名 (--watch 时用来过滤目录里的文件)
+IMAGE_EXTS = {'.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.ppm', '.pgm', '.pnm', '.gif', '.webp'}
+MANIFEST_FILE = '.dewater_manifest.json'
+
+
+class Manifest:
+    """输出目录里的处理记录 {输入绝对路径: [大小, mtime_ns, sha1, 输出路径, 参数]}, 用来跳过没有变化的输入
+
+    大小和修改时间都没变时直接跳过, 不读文件内容; 只有修改时间变了才重新计算哈希确认。
+    """
+
+    def __init__(self, outputdir):
+        self.path = os.path.join(outputdir, MANIFEST_FILE)
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+        self.dirty = False
+
+    def unchanged(self, input, output, settings):
+        entry = self.entries.get(os.path.abspath(input))
+        if entry is None or entry[3] != output or entry[4] != settings or not os.path.exists(output):
+            return False
+        try:
+            st = os.stat(input)
+        except OSError:
+            return False
+        if st.st_size != entry[0]:
+            return False
+        if st.st_mtime_ns == entry[1]:
+            return True
+        if file_digest(input).hex() != entry[2]:
+            return False
+        entry[1] = st.st_mtime_ns  # 内容没变, 只是被重新拷贝或 touch 过
+        self.dirty = True
+        return True
+
+    def record(self, input, output, settings):
+        st = os.stat(input)
+        self.entries[os.path.abspath(input)] = [st.st_size, st.st_mtime_ns, file_digest(input).hex(), output, settings]
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+
+def is_candidate(path):
+    """watch 目录里需要处理的文件: 图片扩展名, 不是隐藏文件, 也不是本工具写出的 *_new 文件"""
+    name = os.path.basename(path)
+    stem, ext = os.path.splitext(name)
+    return ext.lower() in IMAGE_EXTS and not name.startswith('.') and not stem.endswith('_new') and os.path.isfile(path)
+
+
+def list_images(directory):
+    return sorted(entry.path for entry in os.scandir(directory) if is_candidate(entry.path))
+
+
+# inotify 事件: 写完关闭、从别处移入
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+_EVENT = struct.Struct('iIII')
+# 收到事件后再等这么久没有新事件才开始处理, 让同时拷进来的一批文件一起交给进程池
+SETTLE_SECONDS = 0.5
+
+
+def open_inotify(directory):
+    """监听 directory 里写完或移入的文件, 返回 inotify 的文件描述符; 系统不支持 (比如 macOS) 时抛出 OSError"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        init, add_watch = libc.inotify_init1, libc.inotify_add_watch
+    except (OSError, AttributeError):
+        raise OSError('inotify is not available')
+    fd = init(0)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+    if add_watch(fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+        os.close(fd)
+        raise OSError(ctypes.get_errno(), 'inotify_add_watch failed')
+    return fd
+
+
+def inotify_batches(fd, directory):
+    """每收到一批事件 (SETTLE_SECONDS 内没有新事件为止) 产出其中需要处理的文件"""
+    try:
+        while True:
+            names = []
+            ready = True
+            while ready:
+                data = os.read(fd, 64 * 1024)
+                offset = 0
+                while offset < len(data):
+                    _, _, _, length = _EVENT.unpack_from(data, offset)
+                    name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0')
+                    offset += _EVENT.size + length
+                    names.append(os.path.join(directory, os.fsdecode(name)))
+                ready = select.select([fd], [], [], SETTLE_SECONDS)[0]
+            batch = sorted({name for name in names if is_candidate(name)})
+            if batch:
+                yield batch
+    finally:
+        os.close(fd)
+
+
+def scan_images(directory):
+    """{路径: (大小, mtime_ns)}"""
+    result = {}
+    for path in list_images(directory):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        result[path] = (st.st_size, st.st_mtime_ns)
+    return result
+
+
+def poll_batches(directory, interval, known):
+    """轮询目录, 大小和修改时间连续两次不变 (已经写完) 且与 known 里记录的不同的文件作为一批产出"""
+    last = dict(known)
+    while True:
+        time.sleep(interval)
+        current = scan_images(directory)
+        batch = [path for path, sig in current.items() if sig == last.get(path) and known.get(path) != sig]
+        for path in batch:
+            known[path] = current[path]
+        last = current
+        if batch:
+            yield batch
+
+
+def watch(directory, handle, interval):
+    """先处理目录里已有的文件, 之后每来一批新文件调用一次 handle(文件列表), Ctrl-C 退出"""
+    # 先开始监听再扫描已有文件, 处理期间新来的文件不会漏掉
+    try:
+        fd = open_inotify(directory)
+    except OSError:
+        fd = None
+    known = scan_images(directory)
+    handle(sorted(known))
+    if fd is not None:
+        print(f'watching {directory} (inotify)', end='\n\n')
+        batches = inotify_batches(fd, directory)
+    else:
+        print(f'watching {directory} (polling every {interval}s)', end='\n\n')
+        batches = poll_batches(directory, interval, known)
+    for batch in batches:
+        handle(batch)
+
+
+def build_tasks(files, args, detector):
+    """[(输入, 输出, 判定条件), ...]; 开启掩码学习时, 学过掩码的大小的页面改用掩码"""
+    file_detectors = {}
+    if args.learn_mask or args.mask_ref:
+        groups = group_by_size(files)
+        masks = prepare_masks(groups, detector, args.learn_mask, args.mask_ref, args.consensus, args.mask_cache)
+        file_detectors = {filename: masks[size] for size, group in groups.items() if size in masks for filename in group}
+        print()
+    # 重复给出的同一个文件只处理一次, 否则两个进程会同时写同一个输出
+    return [
+        (filename, os.path.join(os.path.abspath(args.outputdir), f'{shotname(filename)}_new{extname(filename)}'),
+         file_detectors.get(filename, detector))
+        for filename in dict.fromkeys(files)
+    ]
+
+
+def task_settings(rgbNew, detector):
+    """影响输出内容的参数, 变了就要重新处理"""
+    return f'{rgbNew}|{detector.key()}'
+
+
+def run_batch(rgbNew, files, args, detector, manifest):
+    """处理一批文件, 跳过 manifest 里记录过且没有变化的输入, 返回 (处理的文件数, 失败的 [(文件, 错误)])"""
+    tasks = build_tasks(files, args, detector)
+    if not args.force:
+        todo = [task for task in tasks if not manifest.unchanged(task[0], task[1], task_settings(rgbNew, task[2]))]
+        if len(todo) < len(tasks):
+            print(f'skipped {len(tasks) - len(todo)} unchanged file(s)', end='\n\n')
+        tasks = todo
+    if not tasks:
+        manifest.save()
+        return 0, []
+
+    jobs = args.jobs or os.cpu_count() or 1
+    if jobs > 1:
+        failed = run_parallel(rgbNew, tasks, jobs, args.silence, args.strip)
+    else:
+        failed = run_serial(rgbNew, tasks, args.silence, args.strip)
+    failed_files = {filename for filename, _ in failed}
+    for input, output, task_detector in tasks:
+        if input not in failed_files:
+            manifest.record(input, output, task_settings(rgbNew, task_detector))
+    manifest.save()
+    return len(tasks), failed
+
+
+def report_failed(failed, total):
+    print(f'failed: {len(failed)}/{total}')
+    for filename, error in failed:
+        print(f'  {filename}: {error}')
+
+
 def extname(filename):
     return os.path.splitext(filename)[1]
 
@@ -41,12 +724,47 @@ if __name__ == '__main__':
     argparser = argparse.ArgumentParser(description='dewater')
 
     argparser.add_argument(
-        '-i', '--inputfile', help='Input files', required=True, type=str, nargs='+')
+        '-i', '--inputfile', help='Input files', required=False, default=[], type=str, nargs='+')
     argparser.add_argument(
         '-o', '--outputdir', help='Output dir default current dir', required=False, default=os.getcwd(), type=str)
     argparser.add_argument(
         '-s', '--silence', help='Silence default True', required=False, default=True, type=bool)
+    argparser.add_argument(
+        '-j', '--jobs', help='Worker processes default 1, 0 for all cores', required=False, default=1, type=int)
+    argparser.add_argument(
+        '--strip', help='Process N rows at a time, default 0 (whole image). Memory is only bounded for uncompressed '
+        'BMP/PPM/TIFF input written as BMP/PPM/TIFF/PNG; PNG/JPEG input and JPEG output are still decoded or encoded '
+        'as a whole frame', required=False, default=0, type=int)
+    argparser.add_argument(
+        '--rgb', help='Watermark RGB range LO-HI for all channels or per channel R,G,B, default 220-255', required=False,
+        default=[(THRESHOLD, 255)] * 3, type=lambda text: parse_ranges(text, 3))
+    argparser.add_argument(
+        '--hsv', help='Also require HSV ranges H(0-360),S(0-100),V(0-100), e.g. 0-360,0-10,85-100', required=False,
+        default=None, type=lambda text: parse_ranges(text, 3))
+    argparser.add_argument(
+        '--roi', help='Only replace pixels inside x0,y0,x1,y1', required=False, default=None, type=parse_roi)
+    argparser.add_argument(
+        '--learn-mask', help='Learn a fixed mask from the first N pages of each size and fill detected pixels inside it',
+        required=False, default=0, type=int)
+    argparser.add_argument(
+        '--mask-ref', help='Learn the fixed mask from this reference page instead', required=False, default=None, type=str)
+    argparser.add_argument(
+        '--consensus', help='Fraction of learning pages a pixel must be detected in, default 1.0', required=False,
+        default=1.0, type=float)
+    argparser.add_argument(
+        '--mask-cache', help='Learned mask cache dir', required=False,
+        default=os.path.join(os.path.expanduser('~'), '.cache', 'dewater'), type=str)
+    argparser.add_argument(
+        '--watch', help='Process images in DIR, then keep processing new ones as they arrive', required=False,
+        default=None, type=str)
+    argparser.add_argument(
+        '--interval', help='Polling interval in seconds when inotify is unavailable, default 2', required=False,
+        default=2.0, type=float)
+    argparser.add_argument(
+        '--force', help='Reprocess inputs even if the manifest says they are unchanged', action='store_true')
     args = argparser.parse_args()
+    if not args.inputfile and not args.watch:
+        argparser.error('one of -i/--inputfile or --watch is required')
 
     isDir = os.path.isdir(args.outputdir)
     isExists = os.path.exists(args.outputdir)
@@ -59,12 +777,25 @@ if __name__ == '__main__':
         print(f'output dir: {args.outputdir} created')
 
     print(args, end='\n\n')
-    for filename in args.inputfile:
-        change(
-            (254, 254, 254),
-            filename,
-            os.path.join(os.path.abspath(args.outputdir),
-                         f'{shotname(filename)}_new{extname(filename)}'),
-            args.silence
-        )
+    rgbNew = (254, 254, 254)
+    detector = Detector(args.rgb, args.hsv, args.roi)
+    # 输出目录里记录处理过的输入, 再次运行时跳过没有变化的文件
+    manifest = Manifest(args.outputdir)
+    if args.watch:
+        def handle(files):
+            total, failed = run_batch(rgbNew, files, args, detector, manifest)
+            if failed:
+                report_failed(failed, total)
+
+        try:
+            watch(args.watch, handle, args.interval)
+        except KeyboardInterrupt:
+            pass
+        print('done')
+        exit(0)
+
+    total, failed = run_batch(rgbNew, args.inputfile, args, detector, manifest)
+    if failed:
+        report_failed(failed, total)
+        exit(1)
     print('done')
@@ -0,0 +1,299 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import dewater
+
+DEWATER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dewater.py")
+
+WIDTH, HEIGHT = 64, 48
+
+
+def make_page(green):
+    """白纸上一块浅灰水印; green 为 True 时水印区里混进一些绿色比例很高但不是灰色的像素"""
+    pixels = np.full((HEIGHT, WIDTH, 3), 250, dtype=np.uint8)
+    pixels[8:20, 10:50] = (228, 228, 228)
+    pixels[30:34, 5:60] = (20, 20, 20)
+    if green:
+        pixels[10:14, 12:30] = (100, 240, 100)
+        pixels[15:18, 20:45] = (200, 236, 200)
+        pixels[40:44, 10:20] = (90, 250, 90)
+    return pixels
+
+
+@pytest.mark.parametrize("detector", [
+    dewater.Detector(),
+    dewater.Detector(rgb=((225, 255), (225, 255), (225, 255))),
+    # 掩码只占上半部分, 走只换算掩码内像素的 HSV 分支
+    dewater.Detector(hsv=((0, 360), (0, 10), (85, 100)), roi=(0, 0, WIDTH, HEIGHT // 3)),
+], ids=["default", "rgb", "hsv-roi"])
+def test_learned_mask_matches_fresh_detection(tmp_path, detector):
+    reference = tmp_path / "ref.png"
+    Image.fromarray(make_page(green=False)).save(reference)
+    masks = dewater.prepare_masks({}, detector, 0, str(reference), 1.0, str(tmp_path / "masks"))
+    learned = masks[(WIDTH, HEIGHT)]
+
+    page = make_page(green=True)
+    fresh = page.copy()
+    cached = page.copy()
+    fresh_count = dewater.whiten(fresh, (255, 255, 255), detector)
+    cached_count = dewater.whiten(cached, (255, 255, 255), learned)
+
+    assert cached_count == fresh_count
+    assert np.array_equal(cached, fresh)
+    # 绿色像素不满足判定条件, 两种方式都不应该改动
+    assert tuple(cached[11, 13]) == (100, 240, 100)
+
+
+def test_learned_mask_limits_fill_to_learned_area(tmp_path):
+    detector = dewater.Detector()
+    reference = tmp_path / "ref.png"
+    page = np.full((HEIGHT, WIDTH, 3), 250, dtype=np.uint8)
+    page[:, :WIDTH // 2] = 0
+    Image.fromarray(page).save(reference)
+    learned = dewater.prepare_masks({}, detector, 0, str(reference), 1.0, str(tmp_path / "masks"))[(WIDTH, HEIGHT)]
+
+    blank = np.full((HEIGHT, WIDTH, 3), 240, dtype=np.uint8)
+    dewater.whiten(blank, (255, 255, 255), learned)
+    # 样张左半边没有判定为水印, 掩码之外的像素保持原样
+    assert (blank[:, :WIDTH // 2] == 240).all()
+    assert (blank[:, WIDTH // 2:] == 255).all()
+
+
+@pytest.mark.parametrize("ext", [".bmp", ".ppm", ".tif", ".png"])
+def test_strip_mode_matches_whole_image(tmp_path, ext):
+    source = tmp_path / f"page{ext}"
+    Image.fromarray(make_page(green=True)).save(source)
+    detector = dewater.Detector()
+    whole = dewater.process_file((255, 255, 255), str(source), str(tmp_path / f"whole{ext}"), 0, detector)
+    strips = dewater.process_file((255, 255, 255), str(source), str(tmp_path / f"strips{ext}"), 5, detector)
+
+    assert strips[2] == whole[2]
+    with Image.open(tmp_path / f"whole{ext}") as a, Image.open(tmp_path / f"strips{ext}") as b:
+        assert np.array_equal(np.array(a.convert("RGB")), np.array(b.convert("RGB")))
+    # 只有未压缩的输入是按条读取的
+    with Image.open(source) as img:
+        assert (dewater.raw_layout(img) is not None) == (ext != ".png")
+
+
+def test_parallel_results_follow_each_task(tmp_path):
+    source = tmp_path / "page.png"
+    Image.fromarray(make_page(green=False)).save(source)
+    detector = dewater.Detector()
+    # 同一个输入对应两个任务, 只有第二个的输出目录不存在
+    tasks = [
+        (str(source), str(tmp_path / "out.png"), detector),
+        (str(source), str(tmp_path / "missing" / "out.png"), detector),
+    ]
+    failed = dewater.run_parallel((255, 255, 255), tasks, 2, True)
+    assert [filename for filename, _ in failed] == [str(source)]
+    assert (tmp_path / "out.png").exists()
+
+
+def test_jobs_reports_failures(tmp_path):
+    good = tmp_path / "good.png"
+    Image.fromarray(make_page(green=False)).save(good)
+    bad = tmp_path / "bad.png"
+    bad.write_bytes(b"not an image")
+    out = tmp_path / "out"
+    result = subprocess.run(
+        [sys.executable, DEWATER, "-i", str(good), str(bad), str(good), "-o", str(out), "-j", "2"],
+        capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 1
+    assert "failed: 1/2" in result.stdout
+    assert f"  {bad}:" in result.stdout
+    assert (out / "good_new.png").exists()
+    assert not (out / "bad_new.png").exists()
+
+    # 失败的文件不记入 manifest, 再运行一次只会重试它
+    result = subprocess.run(
+        [sys.executable, DEWATER, "-i", str(good), str(bad), "-o", str(out), "-j", "2"],
+        capture_output=True, text=True, timeout=120,
+    )
+    assert "skipped 1 unchanged file(s)" in result.stdout
+    assert "failed: 1/1" in result.stdout
+
+
+def reference_whiten(pixels, rgbNew, detector):
+    """逐像素的参考实现 (与改写前的 getpixel/putpixel 循环相同的判定)"""
+    import colorsys
+    out = pixels.copy()
+    hits = 0
+    height, width, _ = pixels.shape
+    for y in range(height):
+        for x in range(width):
+            rgb = [int(v) for v in pixels[y, x]]
+            hit = all(lo <= v <= hi for v, (lo, hi) in zip(rgb, detector.rgb))
+            if hit and detector.hsv:
+                h, s, v = colorsys.rgb_to_hsv(*(c / 255 for c in rgb))
+                hit = all(lo <= value <= hi for value, (lo, hi) in zip((h * 360, s * 100, v * 100), detector.hsv))
+            if hit and detector.roi:
+                left, top, right, bottom = detector.roi
+                hit = left <= x < right and top <= y < bottom
+            if hit:
+                out[y, x] = rgbNew
+                hits += 1
+    return out, hits
+
+
+@pytest.mark.parametrize("detector", [
+    dewater.Detector(),
+    dewater.Detector(rgb=((200, 240), (0, 255), (210, 255))),
+    dewater.Detector(hsv=((0, 360), (0, 15), (80, 100))),
+    dewater.Detector(roi=(5, 7, 30, 20)),
+], ids=["default", "rgb", "hsv", "roi"])
+def test_whiten_matches_pixel_loop(detector):
+    rng = np.random.default_rng(21)
+    pixels = rng.integers(180, 256, size=(24, 32, 3), dtype=np.uint8)
+    pixels[::3] = rng.integers(0, 256, size=pixels[::3].shape, dtype=np.uint8)
+    expected, hits = reference_whiten(pixels, (254, 254, 254), detector)
+
+    whole = pixels.copy()
+    count = dewater.whiten(whole, (254, 254, 254), detector)
+    assert np.array_equal(whole, expected)
+    assert count == hits > 0
+
+    # 按条处理 (带起始行) 和整张处理结果相同
+    strips = pixels.copy()
+    for y in range(0, len(strips), 5):
+        dewater.whiten(strips[y:y + 5], (254, 254, 254), detector, y)
+    assert np.array_equal(strips, expected)
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L", "LA", "P", "1"])
+def test_load_rgb_modes(mode):
+    img = Image.fromarray(make_page(green=True)).convert(mode)
+    pixels = dewater.load_rgb(img)
+    assert pixels.dtype == np.uint8 and pixels.shape == (HEIGHT, WIDTH, 3)
+    assert np.array_equal(pixels, np.array(img.convert("RGB")))
+    pixels[0, 0] = 0  # 结果可写
+
+
+def test_banded_matches_whole_image(tmp_path, monkeypatch):
+    source = tmp_path / "page.png"
+    Image.fromarray(make_page(green=True)).save(source)
+    detector = dewater.Detector()
+    whole = dewater.process_file((254, 254, 254), str(source), str(tmp_path / "whole.png"), 0, detector)
+    # 所有图片都按大图处理, 切成横条交给进程池
+    monkeypatch.setattr(dewater, "BAND_MIN_PIXELS", 1)
+    failed = dewater.run_parallel((254, 254, 254), [(str(source), str(tmp_path / "banded.png"), detector)], 3, True)
+    assert failed == []
+    with Image.open(tmp_path / "whole.png") as a, Image.open(tmp_path / "banded.png") as b:
+        assert np.array_equal(np.array(a), np.array(b))
+    assert whole[2] > 0
+
+
+def test_manifest_skip_rules(tmp_path):
+    source = tmp_path / "page.png"
+    Image.fromarray(make_page(green=False)).save(source)
+    output = tmp_path / "out" / "page_new.png"
+    output.parent.mkdir()
+    output.write_bytes(b"")
+    manifest = dewater.Manifest(str(output.parent))
+    assert not manifest.unchanged(str(source), str(output), "s")
+    manifest.record(str(source), str(output), "s")
+    manifest.save()
+
+    manifest = dewater.Manifest(str(output.parent))
+    assert manifest.unchanged(str(source), str(output), "s")
+    # 参数或输出路径变了
+    assert not manifest.unchanged(str(source), str(output), "other")
+    assert not manifest.unchanged(str(source), str(tmp_path / "elsewhere.png"), "s")
+
+    # 只是 touch 过: 内容哈希相同, 仍然跳过并记下新的修改时间
+    st = os.stat(source)
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert manifest.unchanged(str(source), str(output), "s")
+    assert manifest.dirty
+
+    # 大小不变但内容变了
+    data = bytearray(source.read_bytes())
+    data[-20] ^= 0xFF
+    source.write_bytes(bytes(data))
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 2 * 10**9))
+    assert not manifest.unchanged(str(source), str(output), "s")
+
+    # 输出被删掉了
+    manifest.record(str(source), str(output), "s")
+    output.unlink()
+    assert not manifest.unchanged(str(source), str(output), "s")
+
+
+def run_args(tmp_path, force=False):
+    import argparse
+    return argparse.Namespace(
+        outputdir=str(tmp_path / "out"), learn_mask=0, mask_ref=None, consensus=1.0,
+        mask_cache=str(tmp_path / "masks"), jobs=1, silence=True, strip=0, force=force,
+    )
+
+
+def test_run_batch_skips_unchanged(tmp_path, capsys):
+    (tmp_path / "out").mkdir()
+    files = []
+    for name in ("a.png", "b.png"):
+        Image.fromarray(make_page(green=False)).save(tmp_path / name)
+        files.append(str(tmp_path / name))
+    detector = dewater.Detector()
+
+    def run(force=False, rgb=(254, 254, 254)):
+        manifest = dewater.Manifest(str(tmp_path / "out"))
+        return dewater.run_batch(rgb, files, run_args(tmp_path, force), detector, manifest)
+
+    assert run() == (2, [])
+    assert run() == (0, [])
+    assert "skipped 2 unchanged file(s)" in capsys.readouterr().out
+    Image.fromarray(make_page(green=True)).save(tmp_path / "b.png")
+    assert run() == (1, [])
+    # 换了替换颜色或者 --force 都会重新处理
+    assert run(rgb=(255, 255, 255)) == (2, [])
+    assert run(force=True, rgb=(255, 255, 255)) == (2, [])
+
+
+def test_poll_waits_for_stable_files(tmp_path):
+    known = dewater.scan_images(str(tmp_path))
+    batches = dewater.poll_batches(str(tmp_path), 0.05, known)
+    Image.fromarray(make_page(green=False)).save(tmp_path / "a.png")
+    (tmp_path / "a_new.png").write_bytes(b"")  # 本工具的输出不算
+    (tmp_path / "notes.txt").write_text("x")
+    assert next(batches) == [str(tmp_path / "a.png")]
+    # 同一个文件内容变了以后再次产出
+    Image.fromarray(make_page(green=True)).save(tmp_path / "a.png")
+    assert next(batches) == [str(tmp_path / "a.png")]
+
+
+class StopWatch(Exception):
+    pass
+
+
+@pytest.mark.parametrize("inotify", [True, False], ids=["inotify", "poll"])
+def test_watch_picks_up_new_files(tmp_path, monkeypatch, capsys, inotify):
+    if inotify:
+        try:
+            os.close(dewater.open_inotify(str(tmp_path)))
+        except OSError:
+            pytest.skip("inotify is not available")
+    else:
+        def unavailable(directory):
+            raise OSError("inotify is not available")
+        monkeypatch.setattr(dewater, "open_inotify", unavailable)
+    monkeypatch.setattr(dewater, "SETTLE_SECONDS", 0.05)
+    Image.fromarray(make_page(green=False)).save(tmp_path / "old.png")
+    batches = []
+
+    def handle(files):
+        batches.append(files)
+        if len(batches) == 1:
+            # 处理已有文件期间新来的文件也不能漏掉
+            Image.fromarray(make_page(green=False)).save(tmp_path / "new.png")
+        else:
+            raise StopWatch
+
+    with pytest.raises(StopWatch):
+        dewater.watch(str(tmp_path), handle, 0.05)
+    assert batches == [[str(tmp_path / "old.png")], [str(tmp_path / "new.png")]]
+    assert ("(inotify)" if inotify else "(polling every 0.05s)") in capsys.readouterr().out
@@ -0,0 +1,178 @@
+"""批量执行变更 (wl batch)
+
+每行一条操作, 时间都写成 YYYY-MM-DDTHH:MM[:SS], 空行和 # 开头的行忽略:
+    start <时间> <任务描述>          开始任务 (如果有进行中的 session, 先在同一时间结束它)
+    stop  <时间>                      结束进行中的 session
+    retro <开始> <结束> <任务描述>    补录一个已经结束的 session
+    note  <时间> <备注>               给覆盖该时间点的 session 添加备注
+
+所有操作先在内存里执行, 全部通过解析和冲突检查后, 每个改动过的日期只写一次。
+任何一行出错或者新 session 与已有 session 重叠时, 什么都不写。
+"""
+from typing import Dict, Iterable, List, Optional
+
+from commands import append_note
+from intervals import overlapping_pairs
+from model import Session, Task, fmt_ts, load_active, load_tasks, to_iso, to_ts
+from storage import save_colors, search_tasks, write_tasks
+from utils import gen_id
+
+DAY = 24 * 3600
+
+
+class BatchError(ValueError):
+    """某一行无法执行, 消息里带行号"""
+
+
+def parse_time(text: str) -> int:
+    if "T" not in text:
+        raise ValueError(f"时间格式应为 YYYY-MM-DDTHH:MM: {text}")
+    return to_ts(text)
+
+
+class Batch:
+    def __init__(self, now: int):
+        self.now = now
+        self.days: Dict[str, List[Task]] = {}
+        self.touched = set()
+        # 本次新增的 session: (日期, 任务, session)
+        self.added = []
+        self.current = None  # 进行中的 (日期, 任务, session)
+        active = load_active()
+        if active is not None:
+            date_str, tasks, task, index = active
+            self.days[date_str] = tasks
+            self.current = (date_str, task, task.sessions[index])
+
+    def tasks(self, date_str: str) -> List[Task]:
+        if date_str not in self.days:
+            self.days[date_str] = load_tasks(date_str)
+        return self.days[date_str]
+
+    def task_for(self, date_str: str, description: str) -> Task:
+        """当天同名的任务; 没有时沿用同名任务的 id 新建"""
+        tasks = self.tasks(date_str)
+        for task in tasks:
+            if task.description == description:
+                return task
+        # 本次批量里其它日期新建的任务还没进索引, 先在内存里找
+        known = [t.id for day in self.days.values() for t in day if t.description == description]
+        known += [d["id"] for d in search_tasks(description, "") if d["description"] == description]
+        task = Task(known[0] if known else gen_id(), description)
+        tasks.append(task)
+        return task
+
+    def add_session(self, start: int, end: Optional[int], description: str) -> Session:
+        if end is not None and end <= start:
+            raise ValueError("开始时间必须早于结束时间")
+        if end is not None and end > self.now:
+            raise ValueError("结束时间不能晚于现在")
+        date_str = fmt_ts(start, "%Y-%m-%d")
+        task = self.task_for(date_str, description)
+        sess = Session(start, end)
+        task.sessions.append(sess)
+        task.sessions.sort(key=lambda s: s.start)
+        self.touched.add(date_str)
+        self.added.append((date_str, task, sess))
+        return sess
+
+    def start(self, at: int, description: str):
+        if at > self.now:
+            raise ValueError("开始时间不能晚于现在")
+        if self.current is not None:
+            self.stop(at)
+        sess = self.add_session(at, None, description)
+        self.current = (fmt_ts(at, "%Y-%m-%d"), self.added[-1][1], sess)
+
+    def stop(self, at: int):
+        if self.current is None:
+            raise ValueError("没有正在进行中的任务")
+        date_str, _, sess = self.current
+        if at <= sess.start:
+            raise ValueError("结束时间必须晚于开始时间")
+        if at > self.now:
+            raise ValueError("结束时间不能晚于现在")
+        sess.end = at
+        self.touched.add(date_str)
+        self.current = None
+
+    def retro(self, start: int, end: int, description: str):
+        self.add_session(start, end, description)
+
+    def note(self, at: int, content: str):
+        date_str = fmt_ts(at, "%Y-%m-%d")
+        # 跨过零点的 session 在前一天的文件里
+        for day in (date_str, fmt_ts(at - DAY, "%Y-%m-%d")):
+            for task in self.tasks(day):
+                for sess in task.sessions:
+                    if sess.start <= at < sess.end_or(self.now):
+                        sess.note = append_note(sess.note, content, at)
+                        self.touched.add(day)
+                        return
+        raise ValueError(f"{fmt_ts(at, '%Y-%m-%d %H:%M')} 没有对应的 session")
+
+    def conflicts(self):
+        """新增 session 与其它 session 的重叠: [((开始, 结束, 描述), (开始, 结束, 描述)), ...]"""
+        for date_str in list(self.touched):
+            # 跨过零点的 session 可能和前后一天的数据重叠
+            for offset in (-DAY, DAY):
+                self.tasks(fmt_ts(to_ts(date_str) + offset, "%Y-%m-%d"))
+        added = {id(sess) for _, _, sess in self.added}
+        intervals = [
+            (sess.start, sess.end_or(self.now), (task.description, id(sess) in added))
+            for tasks in self.days.values()
+            for task in tasks
+            for sess in task.sessions
+        ]
+        return [
+            ((a[0], a[1], a[2][0]), (b[0], b[1], b[2][0]))
+            for a, b in overlapping_pairs(intervals)
+            if a[2][1] or b[2][1]
+        ]
+
+    def commit(self) -> List[str]:
+        """把改动过的日期各写一次, 返回写入的日期"""
+        # 进行中的 session 所在的天放在最后写, 活跃指针以它为准
+        active_date = self.current[0] if self.current else None
+        dates = sorted(self.touched, key=lambda d: (d == active_date, d))
+        for date_str in dates:
+            added = [(task.description, to_iso(sess.start)) for day, task, sess in self.added if day == date_str]
+            write_tasks(date_str, [task.to_dict() for task in self.days[date_str]], added)
+        save_colors(task.description for _, task, _ in self.added)
+        return dates
+
+
+def apply_lines(lines: Iterable[str], now: int) -> Batch:
+    """解析并在内存里执行全部操作, 出错时抛出 BatchError"""
+    batch = Batch(now)
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        op, _, rest = line.partition(" ")
+        try:
+            if op == "start":
+                at, description = _split(rest, 2)
+                batch.start(parse_time(at), description)
+            elif op == "stop":
+                (at,) = _split(rest, 1)
+                batch.stop(parse_time(at))
+            elif op == "retro":
+                start, end, description = _split(rest, 3)
+                batch.retro(parse_time(start), parse_time(end), description)
+            elif op == "note":
+                at, content = _split(rest, 2)
+                batch.note(parse_time(at), content)
+            else:
+                raise ValueError(f"未知操作: {op}")
+        except ValueError as e:
+            raise BatchError(f"第 {lineno} 行: {e}") from None
+    return batch
+
+
+def _split(rest: str, n: int) -> List[str]:
+    # 最后一个字段 (描述或备注) 可以带空格
+    parts = rest.strip().split(None, n - 1)
+    if len(parts) != n:
+        raise ValueError("参数个数不对")
+    return parts
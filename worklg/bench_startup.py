@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""测量写命令的冷启动耗时: wl.py 快速路径 vs 直接走 main.py (typer)
+
+在临时 HOME 下生成若干天的样例数据, 每个命令各跑若干次取中位数 (毫秒)。
+用法: python bench_startup.py [-n 次数] [--days 天数]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# 每一轮按顺序执行, 保证 start/push/pop 等命令都有合理的前置状态
+ROUND = [
+    ["start", "bench task"],
+    ["curr"],
+    ["note", "bench note"],
+    ["push", "other task"],
+    ["pop"],
+    ["stop"],
+]
+
+
+def seed(home: str, days: int):
+    """生成 days 天的历史数据, 每天 8 个任务各 2 个 session"""
+    data_dir = os.path.join(home, ".worklog_cli")
+    os.makedirs(data_dir, exist_ok=True)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    for d in range(1, days + 1):
+        day = today - timedelta(days=d)
+        tasks = []
+        for i in range(8):
+            sessions = []
+            for j in range(2):
+                start = day + timedelta(hours=9 + i, minutes=j * 30)
+                sessions.append({
+                    "start_time": start.isoformat(timespec='seconds'),
+                    "end_time": (start + timedelta(minutes=25)).isoformat(timespec='seconds'),
+                })
+            tasks.append({"id": f"{d:04d}{i:04d}", "description": f"task {i} day {d}", "sessions": sessions})
+        with open(os.path.join(data_dir, day.strftime('%Y-%m-%d') + '.json'), 'w') as f:
+            json.dump(tasks, f, ensure_ascii=False)
+
+
+def run(script: str, args, env) -> float:
+    begin = time.perf_counter()
+    subprocess.run(
+        [sys.executable, os.path.join(HERE, script)] + args,
+        env=env, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, check=True,
+    )
+    return (time.perf_counter() - begin) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量 wl 写命令的启动耗时")
+    parser.add_argument("-n", type=int, default=5, help="每个命令重复的轮数")
+    parser.add_argument("--days", type=int, default=90, help="样例历史的天数")
+    args = parser.parse_args()
+
+    timings = {}
+    for script in ("main.py", "wl.py"):
+        with tempfile.TemporaryDirectory() as home:
+            seed(home, args.days)
+            env = dict(os.environ, HOME=home)
+            for _ in range(args.n):
+                for cmd in ROUND:
+                    timings.setdefault(cmd[0], {}).setdefault(script, []).append(run(script, cmd, env))
+
+    print(f"{'命令':<8}{'main.py':>10}{'wl.py':>10}")
+    for name, by_script in timings.items():
+        main_ms = statistics.median(by_script["main.py"])
+        fast_ms = statistics.median(by_script["wl.py"])
+        print(f"{name:<8}{main_ms:>8.1f}ms{fast_ms:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
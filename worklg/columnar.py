@@ -0,0 +1,228 @@
+"""全部 session 的只读列式快照
+
+按日期顺序把所有 session 摊平成三列: 开始/结束时间 (int64, 与 model 相同的整数秒, 进行中为 RUNNING)
+和描述编号 (int32, 指向字符串表)。文件用 mmap 映射, 聚合时直接在映射的内存上读, 不做拷贝。
+
+文件格式:
+    MAGIC | 头部长度 (uint32, little endian) | 头部 JSON | 补齐到 8 字节 | starts | ends | desc_ids
+头部 JSON 为 {"rows": 行数, "days": [[date, signature, 起始行, 行数], ...], "descriptions": [...]},
+days 按日期升序, 每天的行是连续的。重建时签名没变的天直接复制原来的行, 只重新解析变化的天。
+"""
+import json
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+MAGIC = b"WLCOL1\n"
+_HEADER = struct.Struct("<I")
+RUNNING = -1
+# 行数达到这个量级才用 NumPy 聚合, 行数少时导入 NumPy 本身比逐行累加还慢
+NUMPY_MIN_ROWS = 50000
+# 与 model.to_ts 相同的零点 (model 依赖 storage, 这里不能反过来导入)
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_ts(iso: str) -> int:
+    return int((datetime.fromisoformat(iso) - EPOCH).total_seconds())
+
+
+class Snapshot:
+    __slots__ = ("path", "key", "days", "dates", "descriptions", "starts", "ends", "desc_ids", "_mmap")
+
+    def __init__(self, path: str, key, header: dict, mm, data_start: int):
+        self.path = path
+        self.key = key
+        self.days = header["days"]
+        self.dates = [day[0] for day in self.days]
+        self.descriptions = header["descriptions"]
+        self._mmap = mm
+        rows = header["rows"]
+        if mm is None:
+            self.starts = self.ends = memoryview(array("q"))
+            self.desc_ids = memoryview(array("i"))
+            return
+        view = memoryview(mm)
+        offset = data_start
+        self.starts = view[offset:offset + 8 * rows].cast("q")
+        offset += 8 * rows
+        self.ends = view[offset:offset + 8 * rows].cast("q")
+        offset += 8 * rows
+        self.desc_ids = view[offset:offset + 4 * rows].cast("i")
+
+    def day(self, date_str: str) -> Optional[list]:
+        i = bisect_left(self.dates, date_str)
+        if i < len(self.dates) and self.dates[i] == date_str:
+            return self.days[i]
+        return None
+
+    def row_range(self, from_date: str, to_date: str):
+        """[from_date, to_date] 内各天的行是连续的一段, 返回 (lo, hi)"""
+        first = bisect_left(self.dates, from_date)
+        last = bisect_right(self.dates, to_date)
+        if first >= last:
+            return 0, 0
+        lo = self.days[first][2]
+        hi = self.days[last - 1][2] + self.days[last - 1][3]
+        return lo, hi
+
+    def close(self):
+        if self._mmap is not None:
+            # 先释放 memoryview, 否则 mmap 无法关闭
+            self.starts.release()
+            self.ends.release()
+            self.desc_ids.release()
+            self._mmap.close()
+            self._mmap = None
+
+
+def file_key(path: str):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def load(path: str) -> Optional[Snapshot]:
+    """映射已有的快照文件, 不存在、格式不对或被截断时返回 None (调用方会重建)"""
+    try:
+        key = file_key(path)
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            (header_len,) = _HEADER.unpack(f.read(_HEADER.size))
+            header = json.loads(f.read(header_len))
+            data_start = _aligned(len(MAGIC) + _HEADER.size + header_len)
+            if key[1] < data_start + 20 * header["rows"]:
+                # 每行 starts/ends 各 8 字节, desc_ids 4 字节
+                return None
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if header["rows"] else None
+    except (FileNotFoundError, ValueError, KeyError, TypeError, struct.error):
+        return None
+    return Snapshot(path, key, header, mm, data_start)
+
+
+def _aligned(n: int) -> int:
+    return (n + 7) // 8 * 8
+
+
+def rebuild(
+    path: str,
+    old: Optional[Snapshot],
+    signatures: Dict[str, Optional[list]],
+    read_tasks: Callable[[str], List[dict]],
+) -> Snapshot:
+    """按 signatures ({date: 签名, None 表示已删除}) 更新快照并重新映射
+
+    不在 signatures 里的天原样保留, 签名相同的天直接复制原来的行, 其余的天调用 read_tasks 重新解析。
+    """
+    descriptions = list(old.descriptions) if old else []
+    desc_index = {desc: i for i, desc in enumerate(descriptions)}
+    starts, ends, desc_ids = array("q"), array("q"), array("i")
+    days = []
+
+    old_days = {day[0]: day for day in old.days} if old else {}
+    for date_str in sorted(set(old_days) | {d for d, sig in signatures.items() if sig is not None}):
+        day = old_days.get(date_str)
+        signature = signatures.get(date_str, day[1] if day else None)
+        if signature is None:
+            continue
+        lo = len(starts)
+        if day is not None and day[1] == signature:
+            rows = slice(day[2], day[2] + day[3])
+            starts.frombytes(old.starts[rows].cast("B"))
+            ends.frombytes(old.ends[rows].cast("B"))
+            desc_ids.frombytes(old.desc_ids[rows].cast("B"))
+        else:
+            for task in read_tasks(date_str):
+                desc_id = desc_index.get(task["description"])
+                if desc_id is None:
+                    desc_id = desc_index[task["description"]] = len(descriptions)
+                    descriptions.append(task["description"])
+                for sess in task["sessions"]:
+                    starts.append(to_ts(sess["start_time"]))
+                    ends.append(to_ts(sess["end_time"]) if sess["end_time"] else RUNNING)
+                    desc_ids.append(desc_id)
+        # 没有 session 的天也要记下签名, 否则每次查询都会当成新数据
+        days.append([date_str, signature, lo, len(starts) - lo])
+
+    header = json.dumps(
+        {"rows": len(starts), "days": days, "descriptions": descriptions},
+        ensure_ascii=False, separators=(",", ":"),
+    ).encode()
+    prefix_len = len(MAGIC) + _HEADER.size + len(header)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(_HEADER.pack(len(header)))
+        f.write(header)
+        f.write(b"\0" * (_aligned(prefix_len) - prefix_len))
+        f.write(starts.tobytes())
+        f.write(ends.tobytes())
+        f.write(desc_ids.tobytes())
+    if old is not None:
+        old.close()
+    os.replace(tmp_path, path)
+    return load(path)
+
+
+def totals_by_description(snapshot: Snapshot, lo: int, hi: int, wanted: List[bool], now: int) -> Dict[int, list]:
+    """按描述编号汇总 [lo, hi) 行: {desc_id: [秒数, 最早开始, 最晚结束, 是否进行中]}
+
+    只统计 wanted[desc_id] 为真的行, 进行中的 session 以 now 作为结束时间; 结果按描述在范围内首次出现的顺序排列。
+    """
+    if hi - lo >= NUMPY_MIN_ROWS:
+        try:
+            import numpy
+        except ImportError:
+            pass
+        else:
+            return _totals_numpy(numpy, snapshot, lo, hi, wanted, now)
+
+    totals = {}
+    for start, end, desc_id in zip(snapshot.starts[lo:hi], snapshot.ends[lo:hi], snapshot.desc_ids[lo:hi]):
+        if not wanted[desc_id]:
+            continue
+        running = end == RUNNING
+        if running:
+            end = now
+        info = totals.get(desc_id)
+        if info is None:
+            totals[desc_id] = [end - start, start, end, running]
+            continue
+        info[0] += end - start
+        if start < info[1]:
+            info[1] = start
+        if end > info[2]:
+            info[2] = end
+        info[3] |= running
+    return totals
+
+
+def _totals_numpy(np, snapshot: Snapshot, lo: int, hi: int, wanted: List[bool], now: int) -> Dict[int, list]:
+    # frombuffer 直接引用 mmap 的内存, 不拷贝
+    starts = np.frombuffer(snapshot.starts, dtype=np.int64)[lo:hi]
+    ends = np.frombuffer(snapshot.ends, dtype=np.int64)[lo:hi]
+    ids = np.frombuffer(snapshot.desc_ids, dtype=np.int32)[lo:hi]
+
+    mask = np.asarray(wanted, dtype=bool)[ids]
+    starts, ends, ids = starts[mask], ends[mask], ids[mask]
+    running = ends == RUNNING
+    ends = np.where(running, now, ends)
+
+    n = len(snapshot.descriptions)
+    seconds = np.bincount(ids, weights=ends - starts, minlength=n)
+    first_start = np.full(n, np.iinfo(np.int64).max)
+    np.minimum.at(first_start, ids, starts)
+    last_end = np.full(n, np.iinfo(np.int64).min)
+    np.maximum.at(last_end, ids, ends)
+    any_running = np.bincount(ids, weights=running, minlength=n) > 0
+
+    first_row = np.full(n, len(ids))
+    np.minimum.at(first_row, ids, np.arange(len(ids)))
+    present = np.flatnonzero(first_row < len(ids))
+    return {
+        int(desc_id): [int(seconds[desc_id]), int(first_start[desc_id]), int(last_end[desc_id]), bool(any_running[desc_id])]
+        for desc_id in present[np.argsort(first_row[present])]
+    }
@@ -0,0 +1,290 @@
+"""写命令 (start/stop/push/pop/note/curr) 的实现
+
+不依赖 typer/rich, 既供 main.py 的 typer 命令调用, 也供 wl.py 的轻量分发直接调用。
+输出经过 echo: 默认把 rich 风格的简单标记转成 ANSI 颜色, main.py 会换成 rich.print。
+"""
+import re
+import sys
+from typing import List, Optional
+
+from model import (
+    Session,
+    Task,
+    delete_session,
+    fmt_ts,
+    load_active,
+    load_tasks,
+    now_ts,
+    save_session,
+    to_ts,
+)
+from storage import auto_pack, recent_tasks, save_colors, search_tasks
+from utils import a_month_ago, format_duration, gen_id, today_date
+
+
+class Abort(SystemExit):
+    """中止当前命令, 与 typer.Exit() 一样以 0 退出"""
+
+    def __init__(self):
+        super().__init__(0)
+
+
+ANSI_STYLES = {
+    "bold": "1", "dim": "2", "underline": "4",
+    "red": "31", "green": "32", "yellow": "33", "blue": "34", "cyan": "36", "white": "37",
+}
+MARKUP_RE = re.compile(r"\[(/?)([a-z ]*)\]")
+
+# 关键词匹配到多条时, 第一名的常用程度分数至少是第二名的这么多倍、并且至少高出这么多分才自动选择
+AUTO_PICK_RATIO = 2.0
+AUTO_PICK_MIN_GAP = 1.0
+
+
+def render_markup(text: str, color: bool) -> str:
+    """把 [green]...[/green] 这类标记转成 ANSI 转义 (color=False 时直接去掉)，不认识的方括号原样保留"""
+    def replace(m):
+        closing, names = m.group(1), m.group(2).split()
+        if closing:
+            return "\033[0m" if color else ""
+        if not names or any(name not in ANSI_STYLES for name in names):
+            return m.group(0)
+        return f"\033[{';'.join(ANSI_STYLES[name] for name in names)}m" if color else ""
+    return MARKUP_RE.sub(replace, text)
+
+
+def plain_echo(text: str):
+    print(render_markup(text, sys.stdout.isatty()))
+
+
+_output = plain_echo
+
+
+def set_output(fn):
+    """替换输出函数 (main.py 用 rich.print)"""
+    global _output
+    _output = fn
+
+
+def echo(text: str):
+    _output(text)
+
+
+def select_history_task(selector: str, since: str):
+    """通过描述索引在 since 之后的历史中选择任务，如果没有匹配，返回 None"""
+    if selector.isdigit():
+        return pick_by_number([Task.from_dict(d) for d in recent_tasks(since)], selector)
+    else:
+        matched = search_tasks(selector, since)
+        return pick_matched([Task.from_dict(d) for d in matched], [d["score"] for d in matched])
+
+def pick_by_number(tasks, selector: str):
+    """按最后结束时间升序排列的任务中选第 selector 个"""
+    index = int(selector) - 1
+    if 0 <= index < len(tasks):
+        return tasks[index]
+    else:
+        echo("[red]编号超出范围[/red]")
+        raise Abort()
+
+def pick_matched(matched, scores: List[float]):
+    """从关键词匹配结果中选择: 按常用程度分数从高到低排列, 第一名明显领先时直接选中，否则交互选择"""
+    if len(matched) == 0:
+        return None
+    elif len(matched) == 1:
+        return matched[0]
+
+    now = now_ts()
+    # 分数相同时最近结束的在前
+    ranked = sorted(zip(matched, scores), key=lambda pair: (pair[1], pair[0].last_end(now)), reverse=True)
+    (best, best_score), (_, second_score) = ranked[0], ranked[1]
+    if best_score >= AUTO_PICK_RATIO * second_score and best_score - second_score >= AUTO_PICK_MIN_GAP:
+        echo(f"[dim]匹配到 {len(matched)} 条，自动选择最常用的一条[/dim]")
+        return best
+
+    echo("匹配到多条，请选择：")
+    for idx, (task, _) in enumerate(ranked, 1):
+        echo(f"[{idx}] ({fmt_ts(task.last_end(now), '%a %Y-%m-%d %H:%M')}) {task.description}")
+    choice = int(input("请输入编号: ")) - 1
+    if 0 <= choice < len(ranked):
+        return ranked[choice][0]
+    else:
+        echo("[red]选择无效[/red]")
+        raise Abort()
+
+
+def start(
+    selector: str,
+    at: Optional[str] = None,
+    search_from: Optional[str] = None,
+):
+    """开始或继续一个任务 (支持编号/关键词，新建任务也可以；智能连接最近session)"""
+    # 检查是否已有活跃任务
+    if load_active() is not None:
+        echo("[red]已有正在进行中的任务，请先 stop 或 push[/red]")
+        raise Abort()
+
+    date_str = today_date()
+    tasks = load_tasks(date_str)
+
+    if not search_from:
+        search_from = date_str
+    task = select_history_task(selector, search_from[:10])
+    created = task is None
+    if created:
+        # 没有匹配，创建新的任务
+        task = Task(gen_id(), selector)
+        tasks.append(task)
+        echo(f"[green]新建任务:[/green] {selector}")
+    elif task is not None:
+        echo(f"[green]找到任务:[/green] {task.description} ({fmt_ts(task.last_end(now_ts()), '%Y-%m-%d')})")
+
+        exists_task = [candidate for candidate in tasks if candidate.description == task.description]
+        exists_task = exists_task[0] if len(exists_task) > 0 else None
+        if exists_task:
+            task = exists_task
+        else:
+            task.sessions = []
+            tasks.append(task)
+
+    start_at = now_ts() if at == None else to_ts(f"{date_str}T{at}:00")
+
+    # 查找最后一个 session
+    last_session = task.sessions[-1] if task.sessions else None
+
+    if last_session and last_session.end is not None:
+        diff_sec = start_at - last_session.end
+
+        if diff_sec <= 60:
+            # 恢复上一个 session
+            last_session.end = None
+            echo(f"[green]继续上一个session (距上次结束{diff_sec}秒内)[/green]")
+        else:
+            # 新开session
+            task.sessions.append(Session(start_at))
+            echo(f"[green]开始新的session (与上次间隔超过1分钟)[/green]")
+    else:
+        # 没有历史session，正常新建
+        task.sessions.append(Session(start_at))
+
+    save_session(date_str, tasks, task, len(task.sessions) - 1)
+    if created:
+        # 新建的任务在这里分配颜色并保存, 之后各个视图里都用同一个颜色
+        save_colors([selector])
+    echo(f"[green]已开始任务:[/green] {task.description}")
+    # 每月第一次 start 时顺带打包已结束的月份, 其余时候只读一个标记文件
+    auto_pack()
+
+
+def stop(
+    at: Optional[str] = None,
+    from_cmd: bool = False,
+):
+    """停止当前任务"""
+    active = load_active()
+    if active is None:
+        if not from_cmd:
+            echo("[red]没有正在进行中的任务[/red]")
+        return
+
+    date_str, tasks, task, idx = active
+    if at != None:
+        end_time = to_ts(f"{today_date()}T{at}:00")
+        if end_time > now_ts():
+            echo("[red]结束时间不能晚于现在[/red]")
+            raise Abort()
+    else:
+        end_time = now_ts()
+    task.sessions[idx].end = end_time
+    save_session(date_str, tasks, task, idx)
+    if not from_cmd:
+        echo(f"[green]已结束当前任务:[/green] {task.description}")
+
+
+def push(
+    selector: str,
+    start_at: Optional[str] = None,
+):
+    """切换到新的任务 (支持编号/关键词)"""
+    stop(from_cmd=True, at=start_at)
+    start(selector, at=start_at, search_from=a_month_ago().isoformat())
+
+def pop(
+    delete: bool = False,
+):
+    """结束当前任务并恢复上一个任务"""
+    active = load_active()
+    if delete:
+        if active is not None:
+            active_date, active_tasks, task, idx = active
+            delete_session(active_date, active_tasks, task, idx)
+            echo(f"[green]已删除当前 session:[/green] {task.description}")
+            return
+        echo("[red]没有正在进行中的任务[/red]")
+    date_str = today_date()
+
+    now = now_ts()
+
+    active_task = None
+    if active is not None:
+        active_date, active_tasks, active_task, active_index = active
+        active_task.sessions[active_index].end = now
+        # 跨天时进行中的 session 在前一天的文件里
+        tasks = active_tasks if active_date == date_str else load_tasks(date_str)
+    else:
+        tasks = load_tasks(date_str)
+
+    # 找最近一个已经结束的session
+    latest_end_time = None
+    latest_task = None
+    for task in tasks:
+        if task is active_task:
+            continue
+        for sess in task.sessions:
+            if sess.end is not None and (latest_end_time is None or sess.end > latest_end_time):
+                latest_end_time = sess.end
+                latest_task = task
+
+    if latest_task:
+        latest_task.sessions.append(Session(now))
+        if active_task:
+            save_session(active_date, active_tasks, active_task, active_index)
+        save_session(date_str, tasks, latest_task, len(latest_task.sessions) - 1)
+
+        if active_task:
+            echo(f"[green]已结束当前任务:[/green] {active_task.description}")
+        echo(f"[green]恢复上一个任务:[/green] {latest_task.description}")
+    else:
+        echo("[yellow]没有找到可以恢复的上一个任务[/yellow]")
+
+def curr():
+    """查看当前正在进行的任务"""
+    active = load_active()
+    if active is None:
+        echo("[yellow]当前没有正在进行的任务[/yellow]")
+        return
+
+    _, _, task, idx = active
+    dur_min = task.sessions[idx].minutes(now_ts())
+    echo(
+        f"[green]正在进行:[/green] {task.description}，已持续 {format_duration(dur_min)}"
+    )
+
+
+def note(content: str):
+    """给当前进行中的 session 添加备注"""
+    active = load_active()
+    if active is None:
+        echo("[red]当前没有正在进行的任务，无法添加备注[/red]")
+        return
+
+    date_str, tasks, task, idx = active
+    sess = task.sessions[idx]
+    sess.note = append_note(sess.note, content)
+    save_session(date_str, tasks, task, idx)
+    echo(f"[green]已为当前session添加备注:[/green] {content}")
+
+
+def append_note(note: Optional[str], content: str, at: Optional[int] = None) -> str:
+    """在已有备注后追加一条带时间的备注 (默认为当前时间)"""
+    return (note + "\n\n" if note is not None else "") + f"[{fmt_ts(now_ts() if at is None else at)}] {content}"
+
@@ -0,0 +1,21 @@
+import pytest
+
+import storage
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """把 storage 指向一个空的临时数据目录, 并清掉进程内的缓存状态"""
+    path = str(tmp_path / ".worklog_cli")
+    monkeypatch.setattr(storage, "DATA_DIR", path)
+    monkeypatch.setattr(storage, "_resident", None)
+    monkeypatch.setattr(storage, "_dirty", set())
+    monkeypatch.setattr(storage, "_snapshot", None)
+    monkeypatch.setattr(storage, "_palette", None)
+    return path
+
+
+@pytest.fixture
+def journal(data_dir, monkeypatch):
+    monkeypatch.setattr(storage, "STORAGE_MODE", "journal")
+    return data_dir
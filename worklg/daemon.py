@@ -0,0 +1,222 @@
+"""常驻进程 (wl daemon) 和它的客户端
+
+daemon 把数据留在内存里 (storage 的常驻模式), 通过 DATA_DIR/daemon.sock 接收命令,
+在进程内调用 main.app 执行; 写入先留在内存, 空闲 FLUSH_DELAY 秒、执行查询类命令前或退出时落盘。
+查询、导入、导出这类可能涉及整段历史的命令不经过常驻缓存, 执行期间直接读写磁盘。
+
+协议是每行一个 JSON:
+    客户端 -> daemon  {"argv": [...], "color": bool, "width": int | null}
+    daemon -> 客户端  {"out": 文本} / {"err": 文本} / {"read": true} / {"exit": 退出码}
+    客户端 -> daemon  {"line": 一行输入}   (回应 {"read": true}, 用于交互选择)
+
+客户端部分只依赖标准库和 storage, 保持 wl.py 的启动速度。
+"""
+import io
+import json
+import os
+import socket
+import sys
+from typing import Optional
+
+import storage
+
+FLUSH_DELAY = 2.0
+# 这些命令只改动当天数据, 可以使用常驻缓存并延后落盘;
+# 其它命令执行前先 flush 并关闭常驻模式, 读到的是最新的文件, 读写的天数也不会留在内存里
+WRITE_BEHIND_COMMANDS = {"start", "stop", "push", "pop", "note", "curr"}
+
+
+def _send(f, message: dict):
+    f.write((json.dumps(message, ensure_ascii=False) + "\n").encode())
+    f.flush()
+
+
+def run_remote(argv) -> Optional[int]:
+    """把命令交给正在运行的 daemon 执行, 返回退出码; 没有 daemon 时返回 None"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(storage.get_socket_path())
+    except OSError:
+        sock.close()
+        return None
+    import shutil
+
+    with sock, sock.makefile("rwb") as f:
+        color = sys.stdout.isatty()
+        _send(f, {
+            "argv": argv,
+            "color": color,
+            "width": shutil.get_terminal_size().columns if color else None,
+        })
+        for line in f:
+            message = json.loads(line)
+            if "out" in message:
+                try:
+                    sys.stdout.write(message["out"])
+                    sys.stdout.flush()
+                except BrokenPipeError:
+                    # 下游 (比如 head) 提前关闭了管道; stdout 指向 devnull, 退出时的 flush 也不会再报错
+                    os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+                    return 1
+            elif "err" in message:
+                sys.stderr.write(message["err"])
+                sys.stderr.flush()
+            elif "read" in message:
+                _send(f, {"line": sys.stdin.readline()})
+            elif "exit" in message:
+                return message["exit"]
+    # daemon 中途退出
+    print("daemon 连接中断", file=sys.stderr)
+    return 1
+
+
+def shutdown() -> bool:
+    """通知 daemon 落盘并退出, 没有运行中的 daemon 时返回 False"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(storage.get_socket_path())
+    except OSError:
+        sock.close()
+        return False
+    with sock, sock.makefile("rwb") as f:
+        _send(f, {"shutdown": True})
+        f.readline()
+    return True
+
+
+class _Writer(io.TextIOBase):
+    """把 stdout/stderr 的写入转发给客户端"""
+
+    def __init__(self, f, key: str, color: bool):
+        self.f = f
+        self.key = key
+        self.color = color
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return self.color
+
+    def write(self, s):
+        if s:
+            _send(self.f, {self.key: s})
+        return len(s)
+
+
+class _Reader(io.TextIOBase):
+    """input() 读 stdin 时向客户端要一行输入"""
+
+    def __init__(self, f):
+        self.f = f
+
+    def readable(self):
+        return True
+
+    def readline(self, size=-1):
+        # 用户可能在提示处停留很久, 先把已有的修改落盘
+        storage.flush()
+        _send(self.f, {"read": True})
+        line = self.f.readline()
+        # 客户端已经断开, 当作 EOF
+        return json.loads(line).get("line", "") if line else ""
+
+
+def serve():
+    """在前台运行 daemon, 直到收到 shutdown 请求或 SIGTERM/SIGINT"""
+    import signal
+
+    path = storage.get_socket_path()
+    storage.ensure_data_dir()
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+            probe.close()
+            print("daemon 已经在运行", file=sys.stderr)
+            return
+        except OSError:
+            # 上次异常退出留下的 socket 文件
+            probe.close()
+            os.remove(path)
+
+    import main
+
+    storage.enable_resident()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen()
+    server.settimeout(FLUSH_DELAY)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"daemon 已启动: {path}")
+    try:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                storage.flush()
+                continue
+            conn.settimeout(None)
+            try:
+                with conn, conn.makefile("rwb") as f:
+                    request = json.loads(f.readline() or "{}")
+                    if request.get("shutdown"):
+                        _send(f, {"exit": 0})
+                        break
+                    if "argv" in request:
+                        _send(f, {"exit": _handle(main, f, request)})
+            except (OSError, ValueError) as e:
+                # 客户端中途断开 (比如 wl tl | head) 或者发来的不是 JSON, 只影响这一个连接;
+                # 错误记在 daemon 自己的输出里, 不再写给已经断开的 socket
+                print(f"连接中断: {e!r}", file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        storage.flush()
+        server.close()
+        os.remove(path)
+        print("daemon 已退出")
+
+
+def _handle(main, f, request: dict) -> int:
+    """在进程内执行一条命令, 输出转发给客户端, 返回退出码"""
+    import contextlib
+    import traceback
+
+    import rich
+    from rich.console import Console
+
+    argv = request["argv"]
+    if argv and argv[0] == "daemon":
+        _send(f, {"err": "不能通过 daemon 执行 daemon 命令\n"})
+        return 1
+
+    color = request.get("color", False)
+    stdout = _Writer(f, "out", color)
+    stderr = _Writer(f, "err", color)
+    # 颜色和宽度按客户端终端重新配置; 配色表常驻, 只在其它进程改过文件时重新读入
+    rich.reconfigure(file=stdout, force_terminal=color, width=request.get("width"))
+    main.console = Console(file=stdout, force_terminal=color, width=request.get("width"))
+    storage.get_palette().refresh()
+
+    resident = bool(argv) and argv[0] in WRITE_BEHIND_COMMANDS
+    if not resident:
+        storage.disable_resident()
+    stdin = sys.stdin
+    sys.stdin = _Reader(f)
+    try:
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            main.app(args=argv, prog_name="wl")
+        return 0
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except (BrokenPipeError, ConnectionResetError):
+        # 客户端已经断开, 交给 serve 记录
+        raise
+    except Exception:
+        stderr.write(traceback.format_exc())
+        return 1
+    finally:
+        sys.stdin = stdin
+        if not resident:
+            storage.enable_resident()
@@ -0,0 +1,173 @@
+import os
+import sqlite3
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS descs (
+    description TEXT PRIMARY KEY,
+    id TEXT NOT NULL,
+    last_start TEXT NOT NULL,
+    last_end TEXT NOT NULL,
+    last_date TEXT NOT NULL,
+    score REAL NOT NULL,
+    score_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_descs_last_date ON descs(last_date);
+CREATE TABLE IF NOT EXISTS grams (
+    gram TEXT NOT NULL,
+    description TEXT NOT NULL,
+    PRIMARY KEY (gram, description)
+) WITHOUT ROWID;
+"""
+
+# 表结构变化时加一, 旧版本的索引会被丢弃并从历史数据重建
+SCHEMA_VERSION = 1
+# 常用程度: 每开始一个 session 加 1 分, 分数按半衰期随时间衰减
+SCORE_HALF_LIFE_DAYS = 7
+
+# 描述末尾补两个占位符, 这样长度 1~2 的子串一定是某个 trigram 的前缀, 可以走范围查询
+PAD = "\u0001\u0001"
+MAX_CHAR = "\U0010ffff"
+
+# 按路径缓存的连接, DATA_DIR 变了 (测试、换了 HOME) 不会继续用旧的库
+_conns = {}
+
+
+def connect(db_path: str):
+    """打开 (或创建) 索引库，返回 (连接, 是否新建)"""
+    created = not os.path.exists(db_path)
+    conn = _conns.get(db_path)
+    if conn is None:
+        conn = _conns[db_path] = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        # 索引可以随时从原始数据重建, 不需要每次提交都落盘
+        conn.execute("PRAGMA synchronous = OFF")
+        if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            conn.executescript("DROP TABLE IF EXISTS descs; DROP TABLE IF EXISTS grams;")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            created = True
+        conn.executescript(SCHEMA)
+    return conn, created
+
+
+def trigrams(text: str) -> set:
+    padded = text + PAD
+    return {padded[i:i + 3] for i in range(len(text))}
+
+
+def update(conn, date_str: str, tasks: List[dict]):
+    """把一天内若干任务的最新状态写入索引, 新开始的 session 计入常用程度"""
+    with conn:
+        for task in tasks:
+            if not task["sessions"]:
+                continue
+            desc = task["description"]
+            last = max(task["sessions"], key=lambda s: s["end_time"] or s["start_time"])
+            last_end = last["end_time"] or last["start_time"]
+            row = conn.execute("SELECT last_end, score, score_at FROM descs WHERE description = ?", (desc,)).fetchone()
+            if row is None:
+                score, score_at = _add_sessions(0.0, "", task["sessions"])
+                conn.execute(
+                    "INSERT INTO descs (description, id, last_start, last_end, last_date, score, score_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (desc, task["id"], last["start_time"], last_end, date_str, score, score_at),
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO grams (gram, description) VALUES (?, ?)",
+                    [(gram, desc) for gram in trigrams(desc)],
+                )
+                continue
+            score, score_at = _add_sessions(row["score"], row["score_at"], task["sessions"])
+            if row["last_end"] <= last_end:
+                conn.execute(
+                    "UPDATE descs SET id = ?, last_start = ?, last_end = ?, last_date = ?, score = ?, score_at = ? "
+                    "WHERE description = ?",
+                    (task["id"], last["start_time"], last_end, date_str, score, score_at, desc),
+                )
+            elif score_at != row["score_at"]:
+                conn.execute(
+                    "UPDATE descs SET score = ?, score_at = ? WHERE description = ?", (score, score_at, desc)
+                )
+
+
+def backfill(conn, sessions: Iterable[Tuple[str, str]]):
+    """把新写入、但开始时间不晚于 score_at 的 session (导入、补录的历史) 计入常用程度
+
+    update 只统计晚于 score_at 的 session (同一个 session 会随任务反复传进来, 不能重复计分),
+    更早的在这里按衰减到 score_at 的权重补上; 必须在同一批数据的 update 之前调用。
+    sessions 是 (描述, 开始时间) 的列表, 索引里还没有的描述由 update 统一计分。
+    """
+    with conn:
+        for desc, start in sessions:
+            row = conn.execute("SELECT score, score_at FROM descs WHERE description = ?", (desc,)).fetchone()
+            if row is None or start > row["score_at"]:
+                continue
+            conn.execute(
+                "UPDATE descs SET score = ? WHERE description = ?",
+                (row["score"] + _decay(1.0, start, row["score_at"]), desc),
+            )
+
+
+def _add_sessions(score: float, score_at: str, sessions: List[dict]):
+    """把开始时间晚于 score_at 的 session 计入分数, 返回新的 (score, score_at)"""
+    for start in sorted(s["start_time"] for s in sessions if s["start_time"] > score_at):
+        score = _decay(score, score_at, start) + 1
+        score_at = start
+    return score, score_at
+
+
+def _decay(score: float, since: str, until: str) -> float:
+    if not score:
+        return 0.0
+    days = (datetime.fromisoformat(until) - datetime.fromisoformat(since)).total_seconds() / 86400
+    return score * 0.5 ** (max(days, 0) / SCORE_HALF_LIFE_DAYS)
+
+
+def scores(conn, descriptions: Iterable[str], now: str) -> Dict[str, float]:
+    """给定描述当前 (衰减到 now) 的常用程度分数, 索引里没有的描述不出现在结果中"""
+    descriptions = list(descriptions)
+    if not descriptions:
+        return {}
+    placeholders = ", ".join("?" for _ in descriptions)
+    rows = conn.execute(
+        f"SELECT description, score, score_at FROM descs WHERE description IN ({placeholders})", descriptions
+    )
+    return {row["description"]: _decay(row["score"], row["score_at"], now) for row in rows}
+
+
+def search(conn, selector: str, since: str) -> List[dict]:
+    """描述中包含 selector 且 since 之后出现过的任务, 按最后结束时间升序"""
+    if len(selector) >= 3:
+        grams = sorted({selector[i:i + 3] for i in range(len(selector) - 2)})
+        placeholders = ", ".join("?" for _ in grams)
+        candidates = (
+            f"SELECT description FROM grams WHERE gram IN ({placeholders}) "
+            f"GROUP BY description HAVING COUNT(*) = {len(grams)}"
+        )
+        params = grams
+    else:
+        candidates = "SELECT description FROM grams WHERE gram >= ? AND gram < ?"
+        params = [selector, selector + MAX_CHAR]
+    rows = conn.execute(
+        f"SELECT * FROM descs WHERE description IN ({candidates}) AND last_date >= ? ORDER BY last_end",
+        [*params, since],
+    )
+    # trigram 全部命中不代表连续出现, 最后再确认一次子串
+    return [_as_task(row) for row in rows if selector in row["description"]]
+
+
+def recent(conn, since: str) -> List[dict]:
+    """since 之后出现过的全部任务, 按最后结束时间升序"""
+    rows = conn.execute("SELECT * FROM descs WHERE last_date >= ? ORDER BY last_end", (since,))
+    return [_as_task(row) for row in rows]
+
+
+def _as_task(row) -> dict:
+    # 只携带最后一个 session, 供选择列表展示和排序; score 为衰减到当前时间的常用程度
+    return {
+        "id": row["id"],
+        "description": row["description"],
+        "sessions": [{"start_time": row["last_start"], "end_time": row["last_end"]}],
+        "score": _decay(row["score"], row["score_at"], datetime.now().isoformat(timespec='seconds')),
+    }
@@ -0,0 +1,66 @@
+"""导出历史数据
+
+整条链路都是生成器: storage.iter_sessions 逐天读取 -> export_rows 逐条展开成导出行 -> 各格式逐行写出,
+导出多少年的数据内存占用都只有一天的量, 可以直接用管道接给别的工具。
+"""
+import csv
+import json
+from typing import Iterable, Iterator, TextIO
+
+from model import to_ts
+from storage import iter_sessions
+
+FIELDS = ["date", "task_id", "description", "start_time", "end_time", "minutes", "note"]
+FORMATS = ("csv", "jsonl", "columnar")
+# columnar 格式每个块的最大行数
+COLUMN_BLOCK_ROWS = 1024
+
+
+def export_rows(from_date: str, to_date: str, filter_str=None) -> Iterator[dict]:
+    """逐条产出导出行; 进行中的 session 没有 end_time, minutes 为 None"""
+    for sess in iter_sessions(from_date, to_date, filter_str):
+        end = sess["end_time"]
+        yield {
+            "date": sess["date"],
+            "task_id": sess["task_id"],
+            "description": sess["description"],
+            "start_time": sess["start_time"],
+            "end_time": end,
+            "minutes": int((to_ts(end) - to_ts(sess["start_time"])) / 60) if end else None,
+            "note": sess["note"],
+        }
+
+
+def write_csv(rows: Iterable[dict], out: TextIO):
+    writer = csv.DictWriter(out, fieldnames=FIELDS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+
+
+def write_jsonl(rows: Iterable[dict], out: TextIO):
+    for row in rows:
+        out.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def write_columnar(rows: Iterable[dict], out: TextIO, block_rows: int = COLUMN_BLOCK_ROWS):
+    """按列分块: 每行一个 JSON 对象 {字段: [该块内这一列的值...]}, 每块最多 block_rows 行"""
+    block = {field: [] for field in FIELDS}
+    count = 0
+    for row in rows:
+        for field in FIELDS:
+            block[field].append(row[field])
+        count += 1
+        if count == block_rows:
+            out.write(json.dumps(block, ensure_ascii=False) + "\n")
+            block = {field: [] for field in FIELDS}
+            count = 0
+    if count:
+        out.write(json.dumps(block, ensure_ascii=False) + "\n")
+
+
+WRITERS = {
+    "csv": write_csv,
+    "jsonl": write_jsonl,
+    "columnar": write_columnar,
+}
@@ -0,0 +1,35 @@
+import heapq
+from typing import Iterable, List
+
+from model import Session, Task
+
+
+def merge_history(tasks: Iterable[Task], now: int) -> List[Task]:
+    """按描述合并多天的任务
+
+    每个 Task 的 sessions 是一天内的一段有序序列, 同描述的多段用堆做 k 路归并,
+    不再反复整体排序。返回的列表已按最后结束时间升序排好 (进行中的 session 视为 now 结束)。
+    """
+    groups = {}
+    for task in tasks:
+        groups.setdefault(task.description, []).append(task)
+
+    merged = []
+    for desc, group in groups.items():
+        runs = [_sorted_by_end(task.sessions, now) for task in group if task.sessions]
+        if len(runs) > 1:
+            sessions = list(heapq.merge(*runs, key=lambda s: s.end_or(now)))
+        else:
+            sessions = runs[0] if runs else []
+        merged.append(Task(group[0].id, desc, sessions))
+
+    merged.sort(key=lambda t: t.last_end(now) if t.sessions else 0)
+    return merged
+
+
+def _sorted_by_end(sessions: List[Session], now: int) -> List[Session]:
+    # 单天内通常已经有序, 先线性检查一遍, 只有乱序 (比如补录) 时才排序
+    ends = [s.end_or(now) for s in sessions]
+    if all(a <= b for a, b in zip(ends, ends[1:])):
+        return list(sessions)
+    return sorted(sessions, key=lambda s: s.end_or(now))
@@ -0,0 +1,271 @@
+"""从其它工具的导出数据批量导入 (wl import)
+
+支持 CSV (带表头) 和 JSON (JSON Lines, 或者由对象组成的 JSON 数组)。数据逐行读取后先写进一个临时 sqlite
+库, 同一个 (描述, 开始, 结束) 只保留一条; 然后按日期逐天取出, 和已有数据去重后合并, 每天只写一次。
+内存里同时只有一天的数据, 几十万行的导出也不会占用多少内存。
+"""
+import csv
+import json
+import os
+import re
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, Optional
+
+import storage
+from utils import gen_id
+
+# 各字段可能的列名 (不区分大小写), 本项目 wl export 的列名排在最前
+COLUMN_ALIASES = {
+    "description": ["description", "desc", "task", "activity", "title", "name"],
+    "start": ["start_time", "start", "started", "started_at", "start_at", "from"],
+    "end": ["end_time", "end", "stopped", "stopped_at", "end_at", "to"],
+    "duration": ["duration", "minutes"],
+    "note": ["note", "notes", "comment", "comments"],
+    # 归属日期, 没有时取开始时间的日期 (wl export 里跨零点的 session 归在开始的那天, 两者一致)
+    "date": ["date", "day"],
+}
+# 日期和时间分成两列的导出 (例如 Toggl 的 Start date / Start time)
+SPLIT_COLUMNS = {
+    "start": ("start date", "start time"),
+    "end": ("end date", "end time"),
+}
+JSON_CHUNK = 64 * 1024
+# JSON 数组里元素之间的空白和逗号
+_SEPARATORS = re.compile(r"[\s,]*")
+_ELEMENT_END = " \t\r\n,]"
+
+
+class ImportStats:
+    __slots__ = ("rows", "invalid", "duplicates", "sessions", "days")
+
+    def __init__(self):
+        self.rows = 0
+        self.invalid = 0
+        self.duplicates = 0
+        self.sessions = 0
+        self.days = 0
+
+
+def read_csv(f) -> Iterator[dict]:
+    yield from csv.DictReader(f)
+
+
+def read_json(f) -> Iterator[dict]:
+    """逐个产出 JSON Lines 的每一行, 或者顶层 JSON 数组里的每个对象 (分块解析, 不整体读入)"""
+    decoder = json.JSONDecoder()
+    buf = f.read(JSON_CHUNK)
+    while buf.isspace():
+        # 开头的空白正好占满一块时继续读, 才能判断是不是数组
+        chunk = f.read(JSON_CHUNK)
+        if not chunk:
+            break
+        buf += chunk
+    buf = buf.lstrip()
+    if not buf.startswith("["):
+        for line in _chain_lines(buf, f):
+            if line.strip():
+                yield json.loads(line)
+        return
+
+    # 在 buf 上移动下标解析, 只有读入新的一块时才丢掉已经解析过的部分, 避免每个元素都复制一次剩余内容
+    buf = buf[1:]
+    idx = 0
+    eof = False
+    while True:
+        idx = _SEPARATORS.match(buf, idx).end()
+        if buf.startswith("]", idx):
+            return
+        try:
+            obj, end = decoder.raw_decode(buf, idx)
+            # 数字可能被块边界截断 ("-1." 会先解析成 -1), 后面紧跟分隔符才算完整
+            complete = eof or (end < len(buf) and buf[end] in _ELEMENT_END)
+        except ValueError:
+            if eof:
+                raise
+            complete = False
+        if not complete:
+            chunk = f.read(JSON_CHUNK)
+            eof = not chunk
+            buf = buf[idx:] + chunk
+            idx = 0
+            continue
+        yield obj
+        idx = end
+
+
+def _chain_lines(head: str, f) -> Iterator[str]:
+    # 已经读出的开头可能截断在一行中间, 接上文件剩下的部分再按行切
+    rest = f.readline()
+    yield from (head + rest).splitlines()
+    yield from f
+
+
+class ColumnMap:
+    """把一行原始数据转成 (日期, 描述, 开始 ISO, 结束 ISO, 备注), 列名在第一行时解析一次"""
+
+    def __init__(self, keys: Iterable[str], overrides: Dict[str, Optional[str]]):
+        lowered = {key.strip().lower(): key for key in keys}
+        self.columns = {}
+        for field, aliases in COLUMN_ALIASES.items():
+            override = overrides.get(field)
+            if override:
+                if override.strip().lower() not in lowered:
+                    raise ValueError(f"找不到列: {override}")
+                self.columns[field] = lowered[override.strip().lower()]
+                continue
+            self.columns[field] = next((lowered[a] for a in aliases if a in lowered), None)
+        self.split = {
+            field: (lowered[date_col], lowered[time_col])
+            for field, (date_col, time_col) in SPLIT_COLUMNS.items()
+            if not overrides.get(field) and date_col in lowered and time_col in lowered
+        }
+        if not self.columns["description"]:
+            raise ValueError("找不到任务描述列, 请用 --desc-col 指定")
+        if not self.columns["start"] and "start" not in self.split:
+            raise ValueError("找不到开始时间列, 请用 --start-col 指定")
+        if not self.columns["end"] and "end" not in self.split and not self.columns["duration"]:
+            raise ValueError("找不到结束时间或时长列, 请用 --end-col 指定")
+
+    def _time(self, row: dict, field: str) -> Optional[datetime]:
+        if field in self.split:
+            date_col, time_col = self.split[field]
+            text = f"{row.get(date_col) or ''}T{row.get(time_col) or ''}"
+        else:
+            text = row.get(self.columns[field]) if self.columns[field] else None
+        if not text or text == "T":
+            return None
+        value = datetime.fromisoformat(str(text).strip().replace(" ", "T", 1))
+        if value.tzinfo is not None:
+            # 带时区的时间换算成本地时间后去掉时区, 和本地数据保持一致
+            value = value.astimezone().replace(tzinfo=None)
+        return value.replace(microsecond=0)
+
+    def convert(self, row: dict):
+        description = (row.get(self.columns["description"]) or "").strip()
+        start = self._time(row, "start")
+        end = self._time(row, "end")
+        if end is None and self.columns["duration"]:
+            end = start + _parse_duration(row.get(self.columns["duration"])) if start else None
+        note = row.get(self.columns["note"]) if self.columns["note"] else None
+        if not description or start is None or end is None or end <= start:
+            raise ValueError("缺少字段或时间不合法")
+        date_str = start.strftime("%Y-%m-%d")
+        if self.columns["date"] and row.get(self.columns["date"]):
+            date_str = datetime.strptime(str(row[self.columns["date"]]).strip(), "%Y-%m-%d").strftime("%Y-%m-%d")
+        return (
+            date_str,
+            description,
+            start.isoformat(timespec="seconds"),
+            end.isoformat(timespec="seconds"),
+            str(note) if note not in (None, "") else None,
+        )
+
+
+def _parse_duration(value) -> timedelta:
+    """时长: 分钟数, 或者 H:MM:SS / H:MM"""
+    text = str(value).strip()
+    if ":" in text:
+        parts = [int(p) for p in text.split(":")]
+        seconds = sum(p * 60 ** i for i, p in enumerate(reversed(parts))) if len(parts) == 3 \
+            else parts[0] * 3600 + parts[1] * 60
+        return timedelta(seconds=seconds)
+    return timedelta(minutes=float(text))
+
+
+def stage_rows(rows: Iterable[dict], overrides: Dict[str, Optional[str]], conn, stats: ImportStats):
+    """把原始数据规整后写进临时库, 重复的 (描述, 开始, 结束) 只保留一条"""
+    conn.execute(
+        "CREATE TABLE rows (date TEXT, description TEXT, start_time TEXT, end_time TEXT, note TEXT, "
+        "PRIMARY KEY (date, description, start_time, end_time)) WITHOUT ROWID"
+    )
+    columns = None
+    batch = []
+    for row in rows:
+        stats.rows += 1
+        if not isinstance(row, dict):
+            # JSON 里混进来的数字、字符串或数组
+            stats.invalid += 1
+            continue
+        if columns is None:
+            columns = ColumnMap(row.keys(), overrides)
+        try:
+            batch.append(columns.convert(row))
+        except (ValueError, TypeError):
+            stats.invalid += 1
+            continue
+        if len(batch) >= 10000:
+            stats.duplicates += _insert(conn, batch)
+            batch = []
+    if batch:
+        stats.duplicates += _insert(conn, batch)
+
+
+def _insert(conn, batch) -> int:
+    before = conn.total_changes
+    conn.executemany("INSERT OR IGNORE INTO rows VALUES (?, ?, ?, ?, ?)", batch)
+    return len(batch) - (conn.total_changes - before)
+
+
+def merge_days(conn, stats: ImportStats, dry_run: bool = False):
+    """逐天合并进已有数据, 已经存在的 session 跳过, 每天只写一次"""
+    # 描述 -> 任务 id, 沿用已有的 id 让同一个任务在各天保持一致
+    ids = {}
+    dates = [row[0] for row in conn.execute("SELECT DISTINCT date FROM rows ORDER BY date")]
+    for date_str in dates:
+        tasks = storage.read_tasks(date_str)
+        by_desc = {task["description"]: task for task in tasks}
+        existing = {
+            (task["description"], sess["start_time"], sess["end_time"])
+            for task in tasks for sess in task["sessions"]
+        }
+        added = []
+        for description, start, end, note in conn.execute(
+            "SELECT description, start_time, end_time, note FROM rows WHERE date = ? ORDER BY start_time",
+            (date_str,),
+        ):
+            if (description, start, end) in existing:
+                stats.duplicates += 1
+                continue
+            task = by_desc.get(description)
+            if task is None:
+                task = by_desc[description] = {"id": _task_id(ids, description), "description": description, "sessions": []}
+                tasks.append(task)
+            sess = {"start_time": start, "end_time": end}
+            if note is not None:
+                sess["note"] = note
+            task["sessions"].append(sess)
+            added.append((description, start))
+        if added:
+            for task in tasks:
+                task["sessions"].sort(key=lambda s: s["start_time"])
+            if not dry_run:
+                storage.write_tasks(date_str, tasks, added)
+            stats.sessions += len(added)
+            stats.days += 1
+    if not dry_run:
+        storage.save_colors(ids)
+        storage.auto_pack(force=True)
+
+
+def _task_id(ids: dict, description: str) -> str:
+    if description not in ids:
+        known = [d["id"] for d in storage.search_tasks(description, "") if d["description"] == description]
+        ids[description] = known[0] if known else gen_id()
+    return ids[description]
+
+
+def import_file(f, fmt: str, overrides: Dict[str, Optional[str]], dry_run: bool = False) -> ImportStats:
+    stats = ImportStats()
+    rows = read_csv(f) if fmt == "csv" else read_json(f)
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "import.db"))
+        try:
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.execute("PRAGMA journal_mode = OFF")
+            stage_rows(rows, overrides, conn, stats)
+            merge_days(conn, stats, dry_run)
+        finally:
+            conn.close()
+    return stats
@@ -0,0 +1,52 @@
+import heapq
+from bisect import bisect_left
+from typing import Iterable, List, Optional, Tuple
+
+
+class IntervalIndex:
+    """按开始时间排序的半开区间 [start, end)，附带前缀最大结束时间
+
+    starts 有序, 所以与 [start, end) 可能重叠的只有 starts < end 的那段前缀;
+    前缀里结束得最晚的那个区间如果都没越过 start, 就一定没有冲突。一次二分即可判断。
+    """
+    __slots__ = ("starts", "ends", "items", "prefix_max")
+
+    def __init__(self, intervals: Iterable[Tuple[int, int, object]]):
+        ordered = sorted(intervals, key=lambda iv: iv[0])
+        self.starts = [iv[0] for iv in ordered]
+        self.ends = [iv[1] for iv in ordered]
+        self.items = [iv[2] for iv in ordered]
+        # prefix_max[i]: [0, i] 中结束时间最晚的区间下标
+        self.prefix_max = []
+        best = -1
+        for i, end in enumerate(self.ends):
+            if best < 0 or end > self.ends[best]:
+                best = i
+            self.prefix_max.append(best)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def find_overlap(self, start: int, end: int) -> Optional[Tuple[int, int, object]]:
+        """返回任意一个与 [start, end) 重叠的区间 (start, end, item)，没有则返回 None"""
+        k = bisect_left(self.starts, end)
+        if k == 0:
+            return None
+        i = self.prefix_max[k - 1]
+        if self.ends[i] <= start:
+            return None
+        return self.starts[i], self.ends[i], self.items[i]
+
+
+def overlapping_pairs(intervals: Iterable[Tuple[int, int, object]]) -> List[Tuple[tuple, tuple]]:
+    """一次扫描找出所有两两重叠的区间, O(n log n + 结果数)"""
+    pairs = []
+    active = []  # (end, seq, interval) 的小顶堆
+    for seq, iv in enumerate(sorted(intervals, key=lambda iv: (iv[0], iv[1]))):
+        start = iv[0]
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        for _, _, other in active:
+            pairs.append((other, iv))
+        heapq.heappush(active, (iv[1], seq, iv))
+    return pairs
@@ -1,4 +1,6 @@
 #!/usr/bin/env python3
+import os
+import sys
 import typer
 from rich import print
 from rich.console import Console
@@ -6,19 +8,38 @@ from rich.table import Table
 from datetime import datetime, timedelta
 from typing import Optional
 
-from storage import read_tasks, write_tasks
+from history import merge_history
+from intervals import IntervalIndex, overlapping_pairs
+import commands
+from commands import append_note, pick_by_number, pick_matched
+from model import (
+    Session,
+    Task,
+    fmt_ts,
+    load_tasks,
+    now_ts,
+    save_session,
+    to_ts,
+)
+from storage import (
+    get_palette,
+    list_dates,
+    summarize_days,
+    read_sessions,
+    save_colors,
+    summarize_tasks,
+    task_scores,
+)
 from utils import (
     a_month_ago,
     now_iso,
     percent,
     today_date,
+    smart_fit,
     smart_ljust,
-    smart_truncate,
     gen_id,
-    duration_minutes,
     format_duration,
     pick_color_rgb,
-    weekday,
 )
 
 app = typer.Typer()
@@ -26,53 +47,28 @@ view_app = typer.Typer()
 app.add_typer(view_app, name="view")
 
 console = Console()
+commands.set_output(print)
+
+
+def task_color(description):
+    """显示用的任务颜色; 只读命令新分配的颜色不写回配色表"""
+    return pick_color_rgb(description, get_palette())
 
 
 def select_task(tasks, selector: str):
     """根据编号或者关键词选择已有任务，如果没有匹配，返回 None"""
-    # sort by staot_time
-
+    # merge_history 返回的任务已经按最后结束时间升序排列, 编号直接对应这个顺序
     tasks = merged_by_description(tasks)
-    tasks.sort(key=lambda t: datetime.fromisoformat(t["sessions"][-1]["end_time"]))
     if selector.isdigit():
-        index = int(selector) - 1
-        if 0 <= index < len(tasks):
-            return tasks[index]
-        else:
-            print("[red]编号超出范围[/red]")
-            raise typer.Exit()
+        return pick_by_number(tasks, selector)
     else:
-        matched = [task for task in reversed(tasks) if selector in task["description"]]
-        if len(matched) == 0:
-            return None
-        elif len(matched) == 1:
-            return matched[0]
-        else:
-            print("匹配到多条，请选择：")
-            for idx, task in enumerate(matched, 1):
-                print(f"[{idx}] ({weekday(task['sessions'][-1]['end_time'][:10])[:3]} {task['sessions'][-1]['end_time'][:10]} {task['sessions'][-1]['end_time'][11:16]}) {task['description']}")
-            choice = int(input("请输入编号: ")) - 1
-            if 0 <= choice < len(matched):
-                return matched[choice]
-            else:
-                print("[red]选择无效[/red]")
-                raise typer.Exit()
+        matched = [task for task in reversed(tasks) if selector in task.description]
+        scores = task_scores(task.description for task in matched)
+        return pick_matched(matched, [scores.get(task.description, 0.0) for task in matched])
 
 def merged_by_description(tasks):
-    """合并相同描述的任务"""
-    merged = {}
-    for task in tasks:
-        desc = task["description"]
-        if desc not in merged:
-            merged[desc] = {
-                "id": task["id"],
-                "description": desc,
-                "sessions": []
-            }
-        merged[desc]["sessions"].extend(task["sessions"])
-        merged[desc]["sessions"].sort(key=lambda s: s["end_time"])
-    
-    return list(merged.values())
+    """合并相同描述的任务，按最后结束时间升序返回"""
+    return merge_history(tasks, now_ts())
 
 @app.command()
 def start(
@@ -81,70 +77,7 @@ def start(
     search_from: Optional[str] = typer.Option(None, "--search-from", help="回溯直到这个时间点 (格式 YYYY-MM-DD), 默认仅搜索当天任务"),
 ):
     """开始或继续一个任务 (支持编号/关键词，新建任务也可以；智能连接最近session)"""
-    date_str = today_date()
-    tasks = read_tasks(date_str)
-
-    # 检查是否已有活跃任务
-    for task in tasks:
-        for sess in task["sessions"]:
-            if sess["end_time"] is None:
-                print("[red]已有正在进行中的任务，请先 stop 或 push[/red]")
-                raise typer.Exit()
-
-    search_date = datetime.fromisoformat(date_str)
-    history_tasks = []
-    if not search_from:
-        search_from = date_str
-    while search_date >= datetime.fromisoformat(search_from):
-        history_tasks.extend(read_tasks(search_date.strftime("%Y-%m-%d")))
-        search_date = search_date - timedelta(days=1)
-
-    task = select_task(history_tasks, selector)
-    if task is None:
-        # 没有匹配，创建新的任务
-        task = {"id": gen_id(), "description": selector, "sessions": []}
-        tasks.append(task)
-        print(f"[green]新建任务:[/green] {selector}")
-    elif task is not None:
-        print(f"[green]找到任务:[/green] {task['description']} ({task['sessions'][-1]['end_time'][:10]})")
-
-        exists_task = [candidate for candidate in tasks if candidate["description"] == task["description"]]
-        exists_task = exists_task[0] if len(exists_task) > 0 else None
-        if exists_task:
-            task = exists_task
-        else:
-            task['sessions'] = []
-            tasks.append(task)
-
-    start_at = datetime.now() if at == None else datetime.fromisoformat(f"{date_str}T{at}:00")
-
-    # 查找最后一个 session
-    last_session = task["sessions"][-1] if task["sessions"] else None
-
-    if last_session and last_session["end_time"]:
-        end_time = datetime.fromisoformat(last_session["end_time"])
-        diff_sec = (start_at - end_time).total_seconds()
-
-        if diff_sec <= 60:
-            # 恢复上一个 session
-            last_session["end_time"] = None
-            print(f"[green]继续上一个session (距上次结束{int(diff_sec)}秒内)[/green]")
-        else:
-            # 新开session
-            task["sessions"].append({
-                "start_time": start_at.isoformat(timespec="seconds"),
-                "end_time": None
-            })
-            print(f"[green]开始新的session (与上次间隔超过1分钟)[/green]")
-    else:
-        # 没有历史session，正常新建
-        task["sessions"].append({
-            "start_time": start_at.isoformat(timespec="seconds"),
-            "end_time": None
-        })
-
-    write_tasks(date_str, tasks)
-    print(f"[green]已开始任务:[/green] {task['description']}")
+    commands.start(selector, at=at, search_from=search_from)
 
 
 @app.command()
@@ -153,25 +86,7 @@ def stop(
     from_cmd: bool = False, 
 ):
     """停止当前任务"""
-    date_str = today_date()
-    tasks = read_tasks(date_str)
-    for task in tasks:
-        for session in task["sessions"]:
-            if session["end_time"] is None:
-                if at != None:
-                    end_time = datetime.fromisoformat(f"{date_str}T{at}:00")
-                    if end_time > datetime.now():
-                        print("[red]结束时间不能晚于现在[/red]")
-                        raise typer.Exit()
-                else:
-                    end_time = datetime.now()
-                session["end_time"] = end_time.isoformat(timespec="seconds")
-                write_tasks(date_str, tasks)
-                if not from_cmd:
-                    print(f"[green]已结束当前任务:[/green] {task['description']}")
-                return
-    if not from_cmd:
-        print("[red]没有正在进行中的任务[/red]")
+    commands.stop(at=at, from_cmd=from_cmd)
 
 
 @app.command()
@@ -180,81 +95,19 @@ def push(
     start_at: Optional[str] = typer.Option(None, "--at", help="起始时间 hh:mm"),
 ):
     """切换到新的任务 (支持编号/关键词)"""
-    stop(from_cmd=True, at=start_at)
-    start(selector, at=start_at, search_from=a_month_ago().isoformat())
+    commands.push(selector, start_at=start_at)
 
 @app.command()
 def pop(
     delete: bool = typer.Option(False, "--delete", help="删除当前任务"),
 ):
     """结束当前任务并恢复上一个任务"""
-    if delete:
-        date_str = today_date()
-        tasks = read_tasks(date_str)
-        for task in tasks:
-            for sess in task['sessions']:
-                if sess['end_time'] is None:
-                    task['sessions'].remove(sess)
-                    write_tasks(date_str, tasks)
-                    print(f"[green]已删除当前 session:[/green] {task['description']}")
-                    return
-        print("[red]没有正在进行中的任务[/red]")
-    date_str = today_date()
-    tasks = read_tasks(date_str)
-
-    now = now_iso()
-
-    active_task = None
-    for task in tasks:
-        for sess in task['sessions']:
-            if sess['end_time'] is None:
-                active_task = task
-                sess['end_time'] = now
-                break
-        if active_task:
-            break
-
-    # 找最近一个已经结束的session
-    latest_end_time = None
-    latest_task = None
-    for task in tasks:
-        for sess in task['sessions']:
-            if sess['end_time'] is not None and task != active_task:
-                sess_end = datetime.fromisoformat(sess['end_time'])
-                if latest_end_time is None or sess_end > latest_end_time:
-                    latest_end_time = sess_end
-                    latest_task = task
-
-    if latest_task:
-        latest_task['sessions'].append({
-            "start_time": now,
-            "end_time": None
-        })
-        write_tasks(date_str, tasks)
-
-        if active_task:
-            print(f"[green]已结束当前任务:[/green] {active_task['description']}")
-        print(f"[green]恢复上一个任务:[/green] {latest_task['description']}")
-    else:
-        print("[yellow]没有找到可以恢复的上一个任务[/yellow]")
+    commands.pop(delete=delete)
 
 @app.command()
 def curr():
     """查看当前正在进行的任务"""
-    date_str = today_date()
-    tasks = read_tasks(date_str)
-
-    for task in tasks:
-        for sess in task["sessions"]:
-            if sess["end_time"] is None:
-                start = datetime.fromisoformat(sess["start_time"])
-                now = datetime.now()
-                dur_min = int((now - start).total_seconds() / 60)
-                print(
-                    f"[green]正在进行:[/green] {task['description']}，已持续 {format_duration(dur_min)}"
-                )
-                return
-    print("[yellow]当前没有正在进行的任务[/yellow]")
+    commands.curr()
 
 
 @app.command("tl")
@@ -276,84 +129,69 @@ def view_timeline(
         print("[red]起始时间不能晚于结束时间[/red]")
         raise typer.Exit()
 
-    # 收集所有 session
-    sessions = []
-    current_day = from_dt
-    while current_day <= to_dt:
-        day_str = current_day.strftime("%Y-%m-%d")
-        tasks = read_tasks(day_str)
-        for task in tasks:
-            if filter_str and filter_str not in task["description"]:
-                continue
-            for sess in task["sessions"]:
-                sessions.append(
-                    {
-                        "date": day_str,
-                        "task_id": task["id"],
-                        "description": task["description"],
-                        "start_time": sess["start_time"],
-                        "end_time": sess["end_time"] or now_iso() if sess["end_time"] is None else sess["end_time"],
-                        "is_running": sess["end_time"] is None,
-                        "note": sess.get("note", None),
-                    }
-                )
-        current_day += timedelta(days=1)
-
-
-    if not sessions:
-        print("[yellow]指定日期范围内没有任务记录[/yellow]")
-        return
+    # 单天 vs 跨天分支
+    if from_date == to_date:
+        # 收集所有 session (已按开始时间排序)，时间只在这里解析一次
+        now = now_ts()
+        sessions = []
+        for row in read_sessions(from_dt.strftime("%Y-%m-%d"), to_dt.strftime("%Y-%m-%d"), filter_str):
+            sess = Session.from_dict(row)
+            sessions.append((row["description"], sess.is_running, Session(sess.start, sess.end_or(now), sess.note)))
+
+        if not sessions:
+            print("[yellow]指定日期范围内没有任务记录[/yellow]")
+            return
 
+        console.print(f"[bold underline green]Timeline View[/bold underline green] {format_duration(calc_total_minutes((s for _, _, s in sessions), now))}\n")
+        render_single_day_timeline(sessions, now)
+    else:
+        # 已结束的日期直接读汇总缓存, 只有进行中的 session 需要现算
+        day_task_info = summarize_days(from_dt.strftime("%Y-%m-%d"), to_dt.strftime("%Y-%m-%d"), filter_str, now_iso())
 
-    sessions = sorted(sessions, key=lambda s: s["start_time"])
+        if not day_task_info:
+            print("[yellow]指定日期范围内没有任务记录[/yellow]")
+            return
 
-    console.print(f"[bold underline green]Timeline View[/bold underline green] {format_duration(calc_total_minutes(sessions))}\n")
+        # 先累加秒数, 展示时只取整一次
+        total_seconds = sum(info["seconds"] for task_infos in day_task_info.values() for info in task_infos.values())
+        console.print(f"[bold underline green]Timeline View[/bold underline green] {format_duration(int(total_seconds / 60))}\n")
+        render_multi_day_timeline(day_task_info)
 
-    # 单天 vs 跨天分支
-    if from_date == to_date:
-        render_single_day_timeline(sessions)
-    else:
-        render_multi_day_timeline(sessions)
 
+def render_single_day_timeline(sessions, now):
+    """渲染单天 session 粒度 timeline
 
-def render_single_day_timeline(sessions):
-    """渲染单天 session 粒度 timeline"""
-    max_duration = min(60, max(
-        duration_minutes(s["start_time"], s["end_time"]) for s in sessions
-    ))
+    sessions: 按开始时间排序的 (description, is_running, Session)，进行中的 session 已用 now 补齐结束时间
+    """
+    max_duration = min(60, max(s.minutes(now) for _, _, s in sessions))
 
-    first_start = datetime.fromisoformat(sessions[0]["start_time"]).replace(
-        minute=0, second=0
-    )
-    last_end = datetime.fromisoformat(sessions[-1]["end_time"]).replace(
-        minute=0, second=0
-    ) + timedelta(hours=1)
+    first_start = sessions[0][2].start // 3600 * 3600
+    last_end = sessions[-1][2].end // 3600 * 3600 + 3600
 
     current_hour = first_start
     idx = 0
     session_count = len(sessions)
-    total_minutes = calc_total_minutes(sessions)
+    total_minutes = calc_total_minutes((s for _, _, s in sessions), now)
 
     while current_hour < last_end:
-        console.print(f"[bold cyan]{current_hour.strftime('%H:%M')}[/bold cyan]")
+        console.print(f"[bold cyan]{fmt_ts(current_hour)}[/bold cyan]")
 
-        next_hour = current_hour + timedelta(hours=1)
+        next_hour = current_hour + 3600
         while idx < session_count:
-            sess = sessions[idx]
-            start = datetime.fromisoformat(sess["start_time"])
-            end = datetime.fromisoformat(sess["end_time"])
-            desc = sess["description"]
-            note = sess["note"]
-            color = pick_color_rgb(desc)
+            desc, is_running, sess = sessions[idx]
+            start = sess.start
+            end = sess.end
+            note = sess.note
+            color = task_color(desc)
 
             if current_hour <= start < next_hour and end <= next_hour:
                 render_session(
-                    start, end, desc, color, sess["is_running"], max_duration, total_minutes
+                    start, end, desc, color, is_running, max_duration, total_minutes
                 )
                 idx += 1
             elif current_hour <= start < next_hour and end > next_hour:
                 render_session(start, next_hour, desc, color, False, max_duration, total_minutes, note)
-                sessions[idx]["start_time"] = next_hour.isoformat()
+                sess.start = next_hour
                 break
             else:
                 break
@@ -362,62 +200,29 @@ def render_single_day_timeline(sessions):
         current_hour = next_hour
 
 
-from collections import defaultdict
-
-def render_multi_day_timeline(sessions):
-    """渲染多天 task 聚合粒度 timeline，带跨天session分割和起止时间"""
-    # 每天 {task -> {"minutes":总分钟数, "start":最早start, "end":最晚end}}
-    day_task_info = defaultdict(lambda: defaultdict(lambda: {"minutes": 0, "start": None, "end": None}))
-
-    now_dt = datetime.now()
-
-    for sess in sessions:
-        desc = sess['description']
-        start_dt = datetime.fromisoformat(sess['start_time'])
-        end_dt = datetime.fromisoformat(sess['end_time']) if sess['end_time'] else now_dt
-
-        current_day = start_dt.date()
-
-        while current_day <= end_dt.date():
-            day_start = datetime.combine(current_day, datetime.min.time())
-            day_end = datetime.combine(current_day, datetime.max.time())
-
-            seg_start = max(start_dt, day_start)
-            seg_end = min(end_dt, day_end)
-
-            if seg_start < seg_end:
-                duration = (seg_end - seg_start).total_seconds() / 60
-                date_str = current_day.strftime('%Y-%m-%d')
-                task_info = day_task_info[date_str][desc]
-                task_info["minutes"] += int(duration)
-
-                if task_info["start"] is None or seg_start < task_info["start"]:
-                    task_info["start"] = seg_start
-                if task_info["end"] is None or seg_end > task_info["end"]:
-                    task_info["end"] = seg_end
+def render_multi_day_timeline(day_task_info):
+    """渲染多天 task 聚合粒度 timeline，带跨天session分割和起止时间
 
-            current_day += timedelta(days=1)
-
-    # 渲染
+    day_task_info: 每天 {task -> {"seconds":总秒数, "start":最早start, "end":最晚end}}
+    """
     for date, task_infos in sorted(day_task_info.items()):
 
-        max_task_minutes = max(info["minutes"] for info in task_infos.values())
-        total_minutes = sum(info["minutes"] for info in task_infos.values())
+        max_task_seconds = max(info["seconds"] for info in task_infos.values())
+        total_seconds = sum(info["seconds"] for info in task_infos.values())
 
-        console.print(f"[bold cyan]{date}[/bold cyan] {format_duration(total_minutes)}")
+        console.print(f"[bold cyan]{date}[/bold cyan] {format_duration(int(total_seconds / 60))}")
 
-        for desc, info in sorted(task_infos.items(), key=lambda x: -x[1]["minutes"]):
-            dur_min = info["minutes"]
-            start_str = info["start"].strftime('%H:%M') if info["start"] else "--:--"
-            end_str = info["end"].strftime('%H:%M') if info["end"] else "--:--"
+        for desc, info in sorted(task_infos.items(), key=lambda x: -x[1]["seconds"]):
+            dur_sec = info["seconds"]
+            start_str = info["start"][11:16] if info["start"] else "--:--"
+            end_str = info["end"][11:16] if info["end"] else "--:--"
             time_range = f"[{start_str} -> {end_str}]"
 
-            color = pick_color_rgb(desc)
-            bar_len = max(1, int(dur_min / max_task_minutes * 10))
-            bar = '[green]' + "▄" * bar_len + '[/]' + "▁" * (10 - bar_len) + f" {percent(dur_min / total_minutes)}"
-            dur_fmt = smart_ljust(format_duration(dur_min), 5)
-            desc = smart_truncate(desc, 50)  # 为了加 time_range留空间
-            desc = smart_ljust(desc, 50)
+            color = task_color(desc)
+            bar_len = max(1, int(dur_sec / max_task_seconds * 10))
+            bar = '[green]' + "▄" * bar_len + '[/]' + "▁" * (10 - bar_len) + f" {percent(dur_sec / total_seconds)}"
+            dur_fmt = smart_ljust(format_duration(int(dur_sec / 60)), 5)
+            desc = smart_fit(desc, 50)  # 为了加 time_range留空间
 
             line = f"  {time_range} [{color}]{desc}[/] {dur_fmt} {bar}"
             console.print(line)
@@ -428,16 +233,15 @@ def render_multi_day_timeline(sessions):
 
 def render_session(start, end, desc, color, is_running, max_duration, total_minutes, note=None):
     """渲染单个session块，兼容中文、自动截断、自动对齐，加上轻量note"""
-    start_str = start.strftime("%H:%M")
-    end_str = end.strftime("%H:%M") if not is_running else "--:--"
+    start_str = fmt_ts(start)
+    end_str = fmt_ts(end) if not is_running else "--:--"
     time_range = smart_ljust(f"[{start_str} -> {end_str}]", 12)
 
     if note:
         desc = f"{desc} ({note})"
-    desc = smart_truncate(desc, 50)
-    desc = smart_ljust(desc, 50)
+    desc = smart_fit(desc, 50)
 
-    dur_min = int((end - start).total_seconds() / 60)
+    dur_min = int((end - start) / 60)
     dur_fmt = smart_ljust(format_duration(dur_min), 5)
 
     bar_len = max(1, int((dur_min / max_duration) * 10))
@@ -455,7 +259,7 @@ def view_task(
 ):
     """查看单个任务的所有 session 详细信息 (带Time Bar)"""
     date_str = today_date() if at is None else at
-    tasks = read_tasks(date_str)
+    tasks = load_tasks(date_str)
 
     task = select_task(tasks, selector)
 
@@ -463,9 +267,10 @@ def view_task(
         print("[red]没有找到符合条件的任务[/red]")
         raise typer.Exit()
 
-    sessions = task["sessions"]
-    sessions.sort(key=lambda s: s["start_time"])
-    total_minutes = calc_total_minutes(sessions)
+    now = now_ts()
+    sessions = task.sessions
+    sessions.sort(key=lambda s: s.start)
+    total_minutes = calc_total_minutes(sessions, now)
 
     table = Table(show_header=True, header_style="bold blue")
     table.add_column("No.", width=3)
@@ -476,21 +281,14 @@ def view_task(
     table.add_column("Note", overflow="fold")
 
     # 计算最大session时长
-    max_session_minutes = max(
-        duration_minutes(sess["start_time"], sess["end_time"] or now_iso())
-        for sess in sessions
-    )
+    max_session_minutes = max(sess.minutes(now) for sess in sessions)
 
     for idx, sess in enumerate(sessions, 1):
-        start = datetime.fromisoformat(sess["start_time"]).strftime("%H:%M")
-        end = (
-            datetime.fromisoformat(sess["end_time"]).strftime("%H:%M")
-            if sess["end_time"]
-            else "--:--"
-        )
-        dur_min = duration_minutes(sess["start_time"], sess["end_time"] or now_iso())
+        start = fmt_ts(sess.start)
+        end = fmt_ts(sess.end) if sess.end is not None else "--:--"
+        dur_min = sess.minutes(now)
         dur_fmt = format_duration(dur_min)
-        note = sess.get("note", "")
+        note = sess.note or ""
 
         bar_len = max(1, int(dur_min / max_session_minutes * 10))
         bar = '[green]' + "▄" * bar_len + '[/]' + "▁" * (10 - bar_len) + f" {percent(dur_min / total_minutes)}"
@@ -498,15 +296,12 @@ def view_task(
         table.add_row(str(idx), start, end, dur_fmt, bar, note)
 
     console.print(
-        f"[bold underline green]Task Detail:[/bold underline green] {task['description']}\n"
+        f"[bold underline green]Task Detail:[/bold underline green] {task.description}\n"
     )
     console.print(table)
 
-def calc_total_minutes(sessions):
-    return sum(
-        duration_minutes(s["start_time"], s["end_time"] or now_iso())
-        for s in sessions
-    )
+def calc_total_minutes(sessions, now):
+    return sum(s.minutes(now) for s in sessions)
 
 @app.command("ls")
 def view_tasks(
@@ -534,31 +329,7 @@ def view_tasks(
             print("[red]起始日期不能晚于结束日期[/red]")
             raise typer.Exit()
 
-        from collections import defaultdict
-        grouped = defaultdict(lambda: {
-            "duration": 0,
-            "start_time": None,
-            "end_time": None,
-            "is_running": False
-        })
-
-        current = from_dt
-        while current <= to_dt:
-            date_str = current.strftime("%Y-%m-%d")
-            tasks = read_tasks(date_str)
-            for task in tasks:
-                for sess in task["sessions"]:
-                    start = datetime.fromisoformat(sess["start_time"])
-                    end = datetime.fromisoformat(sess["end_time"] or now_iso())
-                    dur = (end - start).total_seconds() / 60
-                    desc = task["description"]
-                    if filter_str and filter_str not in desc:
-                        continue
-                    grouped[desc]["duration"] += dur
-                    grouped[desc]["is_running"] |= (sess["end_time"] is None)
-                    grouped[desc]["start_time"] = min(grouped[desc]["start_time"], start) if grouped[desc]["start_time"] else start
-                    grouped[desc]["end_time"] = max(grouped[desc]["end_time"], end) if grouped[desc]["end_time"] else end
-            current += timedelta(days=1)
+        grouped = summarize_tasks(from_dt.strftime("%Y-%m-%d"), to_dt.strftime("%Y-%m-%d"), filter_str, now_iso())
 
         if not grouped:
             print("[yellow]指定日期范围内没有任务记录[/yellow]")
@@ -576,8 +347,8 @@ def view_tasks(
         table.add_column(f"{format_duration(total_minutes)}", width=18)
 
         for idx, (desc, g) in enumerate(sorted(grouped.items(), key=lambda x: -x[1]["duration"]), 1):
-            start_str = g["start_time"].strftime("%m-%d")
-            end_str = "[yellow]进行中[/yellow]" if g["is_running"] else g["end_time"].strftime("%m-%d")
+            start_str = g["start_time"][5:10]
+            end_str = "[yellow]进行中[/yellow]" if g["is_running"] else g["end_time"][5:10]
             dur_fmt = format_duration(int(g["duration"]))
             bar_len = max(1, int(g["duration"] / top_minutes * 10))
             bar = '[green]' + "▄" * bar_len + '[/]' + "▁" * (10 - bar_len) + f" {percent(g['duration'] / total_minutes)}"
@@ -595,38 +366,33 @@ def view_tasks(
         return
 
     date_str = today_date() if at is None else at
-    tasks = read_tasks(date_str)
+    tasks = load_tasks(date_str)
 
     if not tasks:
         print("[yellow]当天没有任务记录[/yellow]")
         return
 
+    now = now_ts()
     top_minutes = 0
     total_minutes = 0
     task_infos = []
 
     for task in tasks:
-        sessions = task["sessions"]
-        start_time = datetime.fromisoformat(sessions[0]["start_time"])
+        sessions = task.sessions
         end_session = sessions[-1]
-        is_running = end_session["end_time"] is None
-        end_time = datetime.fromisoformat(end_session["end_time"] or now_iso())
 
-        dur = sum(
-            duration_minutes(s["start_time"], s["end_time"] or now_iso())
-            for s in sessions
-        )
+        dur = task.total_minutes(now)
         total_minutes += dur
         top_minutes = max(top_minutes, dur)
 
         task_infos.append(
             {
-                "description": task["description"],
-                "start_time": start_time,
-                "end_time": end_time,
+                "description": task.description,
+                "start_time": sessions[0].start,
+                "end_time": end_session.end_or(now),
                 "duration": dur,
-                "is_running": is_running,
-                "task_id": task["id"],
+                "is_running": end_session.is_running,
+                "task_id": task.id,
             }
         )
 
@@ -654,11 +420,11 @@ def view_tasks(
         description_str = info["description"]
         if info['task_id'] == top_task_id:
             description_str = f"[blue](top)[/]" + description_str
-        start_str = info["start_time"].strftime("%H:%M")
+        start_str = fmt_ts(info["start_time"])
         end_str = (
             "[yellow]进行中[/yellow]"
             if info["is_running"]
-            else info["end_time"].strftime("%H:%M")
+            else fmt_ts(info["end_time"])
         )
         dur_fmt = format_duration(info["duration"])
 
@@ -670,15 +436,20 @@ def view_tasks(
     console.print(table)
 
 
-def has_conflict(tasks, new_start: datetime, new_end: datetime):
-    """检查新的时间段是否与现有session冲突"""
-    for task in tasks:
-        for sess in task["sessions"]:
-            sess_start = datetime.fromisoformat(sess["start_time"])
-            sess_end = datetime.fromisoformat(sess["end_time"] or now_iso())
+def session_intervals(from_date: str, to_date: str, now: int):
+    """日期范围内所有 session 的区间 (start, end, description)，进行中的 session 以 now 结束"""
+    for row in read_sessions(from_date, to_date):
+        sess = Session.from_dict(row)
+        yield sess.start, sess.end_or(now), row["description"]
 
-            if new_end != None and sess_start < new_end and new_start < sess_end:
-                return True, task["description"], sess_start, sess_end
+
+def has_conflict(index: IntervalIndex, new_start: int, new_end: Optional[int]):
+    """检查新的时间段是否与现有session冲突"""
+    if new_end != None:
+        hit = index.find_overlap(new_start, new_end)
+        if hit is not None:
+            sess_start, sess_end, desc = hit
+            return True, desc, sess_start, sess_end
 
     return False, None, None, None
 
@@ -687,20 +458,20 @@ def has_conflict(tasks, new_start: datetime, new_end: datetime):
 def retro(description: str):
     """补录一个已经发生但忘记start的任务 (带冲突检测)"""
     date_str = today_date()
-    tasks = read_tasks(date_str)
+    tasks = load_tasks(date_str)
 
     start_input = input("请输入任务开始时间 (格式 HH:MM): ").strip()
     end_input = input("请输入任务结束时间 (格式 HH:MM): ").strip()
 
     try:
         today = datetime.now().strftime("%Y-%m-%d")
-        start_dt = datetime.fromisoformat(f"{today}T{start_input}:00")
-        end_dt = datetime.fromisoformat(f"{today}T{end_input}:00") if len(end_input) != 0 else None
+        start_dt = to_ts(f"{today}T{start_input}:00")
+        end_dt = to_ts(f"{today}T{end_input}:00") if len(end_input) != 0 else None
 
         if end_dt != None and start_dt >= end_dt:
             print("[red]开始时间必须早于结束时间[/red]")
             raise typer.Exit()
-        if end_dt != None and end_dt > datetime.now():
+        if end_dt != None and end_dt > now_ts():
             print("[red]结束时间不能晚于现在[/red]")
             raise typer.Exit()
 
@@ -708,29 +479,31 @@ def retro(description: str):
         print(f"[red]输入时间格式错误: {e}[/red]")
         raise typer.Exit()
 
-    # 冲突检测
-    conflict, desc, s, e = has_conflict(tasks, start_dt, end_dt)
+    # 冲突检测 (连同昨天跨过零点的 session 一起检查)
+    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    index = IntervalIndex(session_intervals(yesterday, date_str, now_ts()))
+    conflict, desc, s, e = has_conflict(index, start_dt, end_dt)
     if conflict:
         print(
-            f"[red]时间段与任务 [{desc}] 的 {s.strftime('%H:%M')}~{e.strftime('%H:%M')} 冲突，无法补录[/red]"
+            f"[red]时间段与任务 [{desc}] 的 {fmt_ts(s)}~{fmt_ts(e)} 冲突，无法补录[/red]"
         )
         raise typer.Exit()
 
     # 查找任务
-    matched_tasks = [task for task in tasks if description in task["description"]]
+    matched_tasks = [task for task in tasks if description in task.description]
 
     if not matched_tasks:
         # 新建任务
-        task = {"id": gen_id(), "description": description, "sessions": []}
+        task = Task(gen_id(), description)
         tasks.append(task)
         print(f"[green]新建任务:[/green] {description}")
     elif len(matched_tasks) == 1:
         task = matched_tasks[0]
-        print(f"[green]找到已存在任务:[/green] {task['description']}")
+        print(f"[green]找到已存在任务:[/green] {task.description}")
     else:
         print("匹配到多条，请选择：")
         for idx, task in enumerate(matched_tasks, 1):
-            print(f"[{idx}] {task['description']}")
+            print(f"[{idx}] {task.description}")
         choice = int(input("请输入编号: ")) - 1
         if 0 <= choice < len(matched_tasks):
             task = matched_tasks[choice]
@@ -739,50 +512,280 @@ def retro(description: str):
             raise typer.Exit()
 
     # 补session
-    task["sessions"].append(
-        {
-            "start_time": start_dt.isoformat(timespec="seconds"),
-            "end_time": end_dt.isoformat(timespec="seconds") if end_dt != None else None,
-        }
+    task.sessions.append(Session(start_dt, end_dt))
+
+    save_session(date_str, tasks, task, len(task.sessions) - 1)
+    if not matched_tasks:
+        save_colors([description])
+    print(f"[green]已补录session:[/green] {start_input} -> {end_input}  {task.description}")
+
+
+@app.command()
+def audit(
+    from_date: Optional[str] = typer.Option(None, "--from", help="起始日期 YYYY-MM-DD"),
+    to_date: Optional[str] = typer.Option(None, "--to", help="结束日期 YYYY-MM-DD"),
+):
+    """检查日期范围内互相重叠的 session (包括跨天的)"""
+    if not from_date:
+        from_date = today_date()
+    if not to_date:
+        to_date = from_date
+
+    if datetime.fromisoformat(from_date) > datetime.fromisoformat(to_date):
+        print("[red]起始日期不能晚于结束日期[/red]")
+        raise typer.Exit()
+
+    pairs = overlapping_pairs(session_intervals(from_date, to_date, now_ts()))
+    if not pairs:
+        print("[green]没有发现重叠的 session[/green]")
+        return
+
+    console.print(f"[bold underline red]Overlaps[/bold underline red] {len(pairs)}\n")
+    for (a_start, a_end, a_desc), (b_start, b_end, b_desc) in pairs:
+        # b 开始得不早于 a
+        overlap_min = int((min(a_end, b_end) - b_start) / 60)
+        console.print(
+            f"[bold cyan]{fmt_ts(b_start, '%Y-%m-%d')}[/bold cyan] "
+            f"[{fmt_ts(a_start)} -> {fmt_ts(a_end)}] [{task_color(a_desc)}]{a_desc}[/]  ⇄  "
+            f"[{fmt_ts(b_start)} -> {fmt_ts(b_end)}] [{task_color(b_desc)}]{b_desc}[/]  "
+            f"[red]重叠 {format_duration(overlap_min)}[/red]"
+        )
+
+
+HEAT_LEVELS = " ░▒▓█"
+WEEKDAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+@app.command("stats")
+def view_stats(
+    from_date: Optional[str] = typer.Option(None, "--from", help="起始日期 YYYY-MM-DD, 默认 30 天前"),
+    to_date: Optional[str] = typer.Option(None, "--to", help="结束日期 YYYY-MM-DD, 默认今天"),
+    filter_str: Optional[str] = typer.Option(None, "--filter", help="只统计任务描述中包含该字符串的任务"),
+):
+    """工作习惯统计: 星期×小时热力图、session 时长分布、每天切换次数、最长专注时段"""
+    import numpy as np
+    import stats
+
+    if not from_date:
+        from_date = a_month_ago().strftime("%Y-%m-%d")
+    if not to_date:
+        to_date = today_date()
+    if datetime.fromisoformat(from_date) > datetime.fromisoformat(to_date):
+        print("[red]起始日期不能晚于结束日期[/red]")
+        raise typer.Exit()
+
+    sessions = stats.load_sessions(from_date, to_date, filter_str, now_ts())
+    if len(sessions) == 0:
+        print("[yellow]指定日期范围内没有任务记录[/yellow]")
+        return
+
+    console.print(f"[bold underline green]Stats:[/bold underline green] {from_date} ~ {to_date}  {len(sessions)} sessions\n")
+
+    # 星期 × 小时热力图
+    heatmap = stats.weekday_hour_minutes(sessions)
+    peak = heatmap.max()
+    console.print("[bold cyan]Weekday × Hour[/bold cyan]")
+    console.print("     " + "".join(f"{h:<3d}" for h in range(0, 24, 3)) + "  Total")
+    for weekday, row in enumerate(heatmap):
+        cells = "".join(
+            HEAT_LEVELS[min(len(HEAT_LEVELS) - 1, int(minutes / peak * (len(HEAT_LEVELS) - 1) + 0.999))] if peak else " "
+            for minutes in row
+        )
+        console.print(f"{WEEKDAY_NAMES[weekday]}  [green]{cells}[/green]  {format_duration(row.sum())}")
+
+    # session 时长分布
+    buckets, median, p90 = stats.length_distribution(sessions)
+    top_count = max(count for _, _, count in buckets)
+    console.print(f"\n[bold cyan]Session Length[/bold cyan] 中位数 {format_duration(median)}  90% {format_duration(p90)}")
+    for low, high, count in buckets:
+        label = f"{low}-{high}m" if high is not None else f"{low}m+"
+        bar_len = int(count / top_count * 30) if top_count else 0
+        console.print(f"{label:>9} [green]{'▄' * bar_len}[/green] {count}")
+
+    # 每天的任务切换次数
+    days, switches = stats.context_switches(sessions)
+    busiest = int(switches.argmax())
+    console.print(
+        f"\n[bold cyan]Context Switches[/bold cyan] {len(days)} 天, 平均每天 {switches.mean():.1f} 次, "
+        f"中位数 {np.median(switches):.0f} 次, "
+        f"最多 {int(switches[busiest])} 次 ({fmt_ts(int(days[busiest]) * stats.DAY, '%Y-%m-%d')})"
     )
 
-    write_tasks(date_str, tasks)
-    print(f"[green]已补录session:[/green] {start_input} -> {end_input}  {task['description']}")
+    # 最长专注时段
+    console.print("\n[bold cyan]Longest Focus Blocks[/bold cyan]")
+    for desc, start, end in stats.focus_blocks(sessions):
+        console.print(
+            f"{fmt_ts(start, '%Y-%m-%d')} {fmt_ts(start)} -> {fmt_ts(end)}  "
+            f"[{task_color(desc)}]{desc}[/]  {format_duration((end - start) / 60)}"
+        )
+
+
+@app.command()
+def batch(
+    path: Optional[str] = typer.Argument(None, help="操作文件, 不指定或为 - 时从标准输入读取"),
+    dry_run: bool = typer.Option(False, "--dry-run", help="只检查, 不写入"),
+):
+    """批量执行 start/stop/retro/note 操作 (带明确时间), 检查冲突后每个日期只写一次"""
+    import batch as worklg_batch
+
+    lines = None
+    try:
+        lines = sys.stdin if path in (None, "-") else open(path, encoding="utf-8")
+        result = worklg_batch.apply_lines(lines, now_ts())
+    except OSError as e:
+        print(f"[red]无法读取 {path}: {e.strerror}[/red]")
+        raise typer.Exit(1)
+    except worklg_batch.BatchError as e:
+        print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+    finally:
+        if lines is not None and lines is not sys.stdin:
+            lines.close()
+
+    conflicts = result.conflicts()
+    if conflicts:
+        print(f"[red]有 {len(conflicts)} 处时间段重叠, 没有写入任何数据[/red]")
+        for (a_start, a_end, a_desc), (b_start, b_end, b_desc) in conflicts:
+            print(
+                f"  {fmt_ts(a_start, '%Y-%m-%d %H:%M')}~{fmt_ts(a_end)} {a_desc}  ⇄  "
+                f"{fmt_ts(b_start, '%Y-%m-%d %H:%M')}~{fmt_ts(b_end)} {b_desc}"
+            )
+        raise typer.Exit(1)
+
+    if dry_run:
+        print(f"[green]检查通过:[/green] {len(result.added)} 个新 session, 涉及 {len(result.touched)} 天")
+        return
+    dates = result.commit()
+    print(f"[green]已写入:[/green] {len(result.added)} 个新 session, {len(dates)} 天")
+
+
+@app.command()
+def export(
+    from_date: Optional[str] = typer.Option(None, "--from", help="起始日期 YYYY-MM-DD, 默认最早的记录"),
+    to_date: Optional[str] = typer.Option(None, "--to", help="结束日期 YYYY-MM-DD, 默认今天"),
+    fmt: str = typer.Option("csv", "--format", help="输出格式: csv / jsonl / columnar"),
+    filter_str: Optional[str] = typer.Option(None, "--filter", help="只导出任务描述中包含该字符串的任务"),
+):
+    """把 session 逐条导出到标准输出 (流式, 可以直接接管道)"""
+    import export as exporter
+    if fmt not in exporter.FORMATS:
+        print(f"[red]不支持的格式: {fmt}[/red]")
+        raise typer.Exit(1)
+
+    if not from_date:
+        dates = list_dates()
+        if not dates:
+            return
+        from_date = dates[0]
+    if not to_date:
+        to_date = today_date()
+    if datetime.fromisoformat(from_date) > datetime.fromisoformat(to_date):
+        print("[red]起始日期不能晚于结束日期[/red]")
+        raise typer.Exit()
+
+    try:
+        exporter.WRITERS[fmt](exporter.export_rows(from_date, to_date, filter_str), sys.stdout)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # 下游 (比如 head) 提前关闭了管道
+        sys.stdout = open(os.devnull, 'w')
+
+
+@app.command("import")
+def import_sessions(
+    path: Optional[str] = typer.Argument(None, help="导入文件, 不指定或为 - 时从标准输入读取"),
+    fmt: Optional[str] = typer.Option(None, "--format", help="csv / json (JSON Lines 或 JSON 数组), 默认按扩展名判断"),
+    desc_col: Optional[str] = typer.Option(None, "--desc-col", help="任务描述所在的列"),
+    start_col: Optional[str] = typer.Option(None, "--start-col", help="开始时间所在的列"),
+    end_col: Optional[str] = typer.Option(None, "--end-col", help="结束时间所在的列"),
+    note_col: Optional[str] = typer.Option(None, "--note-col", help="备注所在的列"),
+    dry_run: bool = typer.Option(False, "--dry-run", help="只统计, 不写入"),
+):
+    """从 CSV/JSON 导出批量导入 session, 与已有数据去重后每天只写一次"""
+    import importer
+    from_stdin = path in (None, "-")
+    if fmt is None:
+        ext = "" if from_stdin else os.path.splitext(path)[1].lower()
+        fmt = "csv" if ext == ".csv" else "json" if ext in (".json", ".jsonl") else None
+    if fmt not in ("csv", "json"):
+        print("[red]无法判断文件格式, 请用 --format 指定 csv 或 json[/red]")
+        raise typer.Exit(1)
+
+    f = None
+    try:
+        f = sys.stdin if from_stdin else open(path, encoding="utf-8-sig", newline="")
+        result = importer.import_file(f, fmt, {
+            "description": desc_col, "start": start_col, "end": end_col, "note": note_col,
+        }, dry_run)
+    except OSError as e:
+        print(f"[red]无法读取 {path}: {e.strerror}[/red]")
+        raise typer.Exit(1)
+    except ValueError as e:
+        print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+    finally:
+        if f is not None and not from_stdin:
+            f.close()
+
+    verb = "可导入" if dry_run else "已导入"
+    print(
+        f"[green]{verb}:[/green] {result.sessions} 个 session, {result.days} 天 "
+        f"(共读取 {result.rows} 行, 重复 {result.duplicates} 行, 无效 {result.invalid} 行)"
+    )
+
+
+@app.command("pack")
+def pack_history(
+    month: Optional[str] = typer.Argument(None, help="只打包指定月份 YYYY-MM, 默认全部已结束的月份"),
+):
+    """把已结束月份的 day file 压缩打包成每月一个文件 (当前月份保持可写)"""
+    import storage
+    if storage.STORAGE_MODE == 'sqlite':
+        print("[yellow]sqlite 模式的数据在数据库里, 不需要打包[/yellow]")
+        return
+    if month is not None and month >= today_date()[:7]:
+        print("[red]只能打包已经结束的月份[/red]")
+        raise typer.Exit()
+
+    months = storage.packable_months() if month is None else [month]
+    if not months:
+        print("[yellow]没有需要打包的月份[/yellow]")
+        return
+    for m in months:
+        days = storage.pack_month(m)
+        print(f"[green]已打包[/green] {m}: {days} 天")
+
+
+@app.command("daemon")
+def run_daemon(
+    stop: bool = typer.Option(False, "--stop", help="通知正在运行的 daemon 落盘并退出"),
+):
+    """在前台运行常驻进程, 之后的 wl 命令通过 unix socket 交给它执行"""
+    import daemon
+    if not stop:
+        daemon.serve()
+    elif not daemon.shutdown():
+        print("[yellow]没有正在运行的 daemon[/yellow]")
 
 
 @app.command()
 def note(content: str):
     """给当前进行中的 session 添加备注"""
-    date_str = today_date()
-    tasks = read_tasks(date_str)
-    for task in tasks:
-        for sess in task["sessions"]:
-            if sess["end_time"] is None:
-                record_time_str = datetime.fromisoformat(now_iso()).strftime("%H:%M")
-                sess["note"] = sess.get("note", "") +  ("\n\n" if "note" in sess else "") + f"[{record_time_str}] {content}"
-                write_tasks(date_str, tasks)
-                print(f"[green]已为当前session添加备注:[/green] {content}")
-                return
-
-    print("[red]当前没有正在进行的任务，无法添加备注[/red]")
+    commands.note(content)
 
 
 @app.command()
 def note_select():
     """选择历史 session 添加备注"""
     date_str = today_date()
-    tasks = read_tasks(date_str)
+    tasks = load_tasks(date_str)
 
     sessions = []
     for task in tasks:
-        for idx, sess in enumerate(task["sessions"]):
-            start = datetime.fromisoformat(sess["start_time"]).strftime("%H:%M")
-            end = (
-                datetime.fromisoformat(sess["end_time"]).strftime("%H:%M")
-                if sess["end_time"]
-                else "进行中"
-            )
-            sessions.append((task, idx, f"{task['description']} {start} - {end}"))
+        for idx, sess in enumerate(task.sessions):
+            start = fmt_ts(sess.start)
+            end = fmt_ts(sess.end) if sess.end is not None else "进行中"
+            sessions.append((task, idx, f"{task.description} {start} - {end}"))
 
     if not sessions:
         print("[yellow]当天没有任何session记录[/yellow]")
@@ -800,10 +803,9 @@ def note_select():
 
     task, idx, _ = sessions[choice]
 
-    record_time_str = datetime.fromisoformat(now_iso()).strftime("%H:%M")
-    task["sessions"][idx]["note"] = task["sessions"][idx].get("note", "") +  ("\n\n" if "note" in task["sessions"][idx] else "") + f"[{record_time_str}] {note_content}"
+    task.sessions[idx].note = append_note(task.sessions[idx].note, note_content)
 
-    write_tasks(date_str, tasks)
+    save_session(date_str, tasks, task, idx)
 
     print(f"[green]已添加备注:[/green] {note_content}")
 
@@ -0,0 +1,135 @@
+"""内存中的任务模型
+
+时间统一存成整数秒: 以 1970-01-01 00:00:00 为零点的本地挂钟时间 (不做时区换算),
+与原来直接相减 naive datetime 的语义一致。ISO 字符串只在读取时解析一次、写入时格式化一次。
+"""
+import time
+from datetime import datetime
+from typing import List, Optional
+
+import storage
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_ts(iso: str) -> int:
+    return int((datetime.fromisoformat(iso) - EPOCH).total_seconds())
+
+
+def to_iso(ts: int) -> str:
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(ts))
+
+
+def fmt_ts(ts: int, fmt: str = '%H:%M') -> str:
+    return time.strftime(fmt, time.gmtime(ts))
+
+
+def now_ts() -> int:
+    return to_ts(datetime.now().isoformat(timespec='seconds'))
+
+
+def day_start_ts(date_str: str) -> int:
+    return to_ts(date_str[:10])
+
+
+class Session:
+    __slots__ = ("start", "end", "note", "saved")
+
+    def __init__(self, start: int, end: Optional[int] = None, note: Optional[str] = None):
+        self.start = start
+        self.end = end
+        self.note = note
+        # 读入或上次保存时的 dict (只读), 新建的 session 为 None; journal 模式据此只记录变化的字段
+        self.saved = None
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Session":
+        sess = cls(
+            to_ts(d["start_time"]),
+            to_ts(d["end_time"]) if d["end_time"] else None,
+            d.get("note"),
+        )
+        sess.saved = d
+        return sess
+
+    def to_dict(self) -> dict:
+        d = {
+            "start_time": to_iso(self.start),
+            "end_time": to_iso(self.end) if self.end is not None else None,
+        }
+        if self.note is not None:
+            d["note"] = self.note
+        return d
+
+    @property
+    def is_running(self) -> bool:
+        return self.end is None
+
+    def end_or(self, now: int) -> int:
+        return now if self.end is None else self.end
+
+    def minutes(self, now: int) -> int:
+        return int((self.end_or(now) - self.start) / 60)
+
+
+class Task:
+    __slots__ = ("id", "description", "sessions")
+
+    def __init__(self, id: str, description: str, sessions: Optional[List[Session]] = None):
+        self.id = id
+        self.description = description
+        self.sessions = sessions if sessions is not None else []
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Task":
+        return cls(d["id"], d["description"], [Session.from_dict(s) for s in d["sessions"]])
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "description": self.description,
+            "sessions": [s.to_dict() for s in self.sessions],
+        }
+
+    def last_end(self, now: int) -> int:
+        return self.sessions[-1].end_or(now)
+
+    def total_minutes(self, now: int) -> int:
+        return sum(s.minutes(now) for s in self.sessions)
+
+
+def load_tasks(date_str: str) -> List[Task]:
+    return [Task.from_dict(d) for d in storage.read_tasks(date_str)]
+
+
+def _to_dicts(tasks: List[Task], task: Task):
+    """转换成 storage 用的 dict; 不需要整天数据时 (journal 模式) 只转换 task 本身"""
+    if not storage.writes_whole_day():
+        return None, task.to_dict()
+    dicts = [t.to_dict() for t in tasks]
+    return dicts, dicts[tasks.index(task)]
+
+
+def save_session(date_str: str, tasks: List[Task], task: Task, index: int):
+    """持久化 task 的第 index 个 session"""
+    dicts, task_dict = _to_dicts(tasks, task)
+    storage.write_session(date_str, dicts, task_dict, index, task.sessions[index].saved)
+    task.sessions[index].saved = task_dict["sessions"][index]
+
+
+def delete_session(date_str: str, tasks: List[Task], task: Task, index: int):
+    """删除 task 的第 index 个 session 并持久化"""
+    dicts, task_dict = _to_dicts(tasks, task)
+    storage.remove_session(date_str, dicts, task_dict, index)
+    task.sessions.pop(index)
+
+
+def load_active():
+    """进行中的 session, 返回 (date_str, tasks, task, index), 没有则返回 None"""
+    active = storage.load_active()
+    if active is None:
+        return None
+    date_str, dicts, task_dict, index = active
+    tasks = [Task.from_dict(d) for d in dicts]
+    position = next(i for i, d in enumerate(dicts) if d is task_dict)
+    return date_str, tasks, tasks[position], index
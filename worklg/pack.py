@@ -0,0 +1,91 @@
+"""按月打包的历史数据
+
+一个月的 day file 合并成一个 YYYY-MM.pack: 每天的任务列表单独 zlib 压缩, 文件头部带一张
+{date: [offset, length]} 的偏移表, 读取某一天时只需要 seek 过去解压这一段。
+
+文件格式:
+    MAGIC | 偏移表长度 (uint32, little endian) | 偏移表 JSON | 各天的压缩数据
+偏移量相对于压缩数据的起点。
+"""
+import json
+import os
+import struct
+import zlib
+from typing import Dict, List, Optional
+
+MAGIC = b"WLPK1\n"
+_HEADER = struct.Struct("<I")
+
+# {path: ((mtime_ns, size), data_start, offsets)}, 避免每次读取都重新解析偏移表
+_index_cache = {}
+
+
+def read_index(path: str):
+    """返回 (data_start, {date: [offset, length]})
+
+    文件不存在时抛出 FileNotFoundError; 文件损坏或被截断时抛出 ValueError。
+    pack 是这些天唯一的一份数据, 不能当成空的继续写。
+    """
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _index_cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1], cached[2]
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"不是 worklog pack 文件: {path}")
+        try:
+            (table_len,) = _HEADER.unpack(f.read(_HEADER.size))
+            offsets = json.loads(f.read(table_len))
+        except (struct.error, ValueError) as e:
+            raise ValueError(f"pack 文件已损坏: {path}") from e
+    data_start = len(MAGIC) + _HEADER.size + table_len
+    if any(data_start + offset + length > st.st_size for offset, length in offsets.values()):
+        raise ValueError(f"pack 文件不完整: {path}")
+    _index_cache[path] = (key, data_start, offsets)
+    return data_start, offsets
+
+
+def dates(path: str) -> List[str]:
+    return sorted(read_index(path)[1])
+
+
+def read_day(path: str, date_str: str) -> Optional[List[dict]]:
+    """只解压 date_str 那一天, pack 里没有这一天时返回 None"""
+    try:
+        data_start, offsets = read_index(path)
+    except FileNotFoundError:
+        return None
+    entry = offsets.get(date_str)
+    if entry is None:
+        return None
+    offset, length = entry
+    with open(path, "rb") as f:
+        f.seek(data_start + offset)
+        blob = f.read(length)
+    try:
+        return json.loads(zlib.decompress(blob))
+    except (zlib.error, ValueError) as e:
+        raise ValueError(f"pack 文件已损坏: {path} ({date_str})") from e
+
+
+def write_pack(path: str, days: Dict[str, List[dict]]):
+    """把 {date: tasks} 写成一个 pack 文件 (先写临时文件再替换)"""
+    offsets = {}
+    blobs = []
+    position = 0
+    for date_str in sorted(days):
+        blob = zlib.compress(json.dumps(days[date_str], ensure_ascii=False, separators=(",", ":")).encode())
+        offsets[date_str] = [position, len(blob)]
+        blobs.append(blob)
+        position += len(blob)
+    table = json.dumps(offsets, separators=(",", ":")).encode()
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(_HEADER.pack(len(table)))
+        f.write(table)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, path)
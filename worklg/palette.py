@@ -0,0 +1,125 @@
+"""任务描述 -> 颜色的持久化配色表
+
+配色表保存在 palette.json ({描述: [r, g, b]}), 同一个任务在每次运行里颜色都相同。
+判断新颜色是否和已有颜色太接近时在 CIELAB 空间里比较 (距离接近人眼感受到的差异),
+已有颜色按 Lab 坐标放进边长为 CELL_SIZE 的网格, 只需要检查附近几个格子, 不用和所有颜色逐个比较。
+"""
+import json
+import math
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+CELL_SIZE = 20.0
+# D65 白点
+_WHITE = (0.95047, 1.0, 1.08883)
+
+
+def _linear(c: float) -> float:
+    c /= 255
+    return c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+
+
+def _f(t: float) -> float:
+    return t ** (1 / 3) if t > 216 / 24389 else (24389 / 27 * t + 16) / 116
+
+
+def rgb_to_lab(rgb) -> Tuple[float, float, float]:
+    """sRGB (0~255) 转 CIELAB"""
+    r, g, b = (_linear(c) for c in rgb)
+    x = (0.4124 * r + 0.3576 * g + 0.1805 * b) / _WHITE[0]
+    y = (0.2126 * r + 0.7152 * g + 0.0722 * b) / _WHITE[1]
+    z = (0.0193 * r + 0.1192 * g + 0.9505 * b) / _WHITE[2]
+    fx, fy, fz = _f(x), _f(y), _f(z)
+    return 116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz)
+
+
+class Palette:
+    def __init__(self, path: str):
+        self.path = path
+        self.key = None
+        self.colors: Dict[str, Tuple[int, int, int]] = {}
+        self.grid: Dict[Tuple[int, int, int], list] = {}
+        # 本进程新分配、还没写回文件的描述
+        self.added = set()
+        self.refresh()
+
+    def refresh(self):
+        """文件被其它进程改过时重新读入 (本进程未保存的颜色保留)"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        key = (st.st_mtime_ns, st.st_size)
+        if key == self.key:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                stored = json.load(f)
+        except ValueError:
+            stored = {}
+        self.key = key
+        pending = {desc: self.colors[desc] for desc in self.added}
+        self.colors = {}
+        self.grid = {}
+        for desc, rgb in stored.items():
+            self._put(desc, tuple(rgb))
+        for desc, rgb in pending.items():
+            if desc not in self.colors:
+                self._put(desc, rgb)
+        self.added = {desc for desc in pending if self.colors[desc] == pending[desc]}
+
+    def get(self, description: str) -> Optional[Tuple[int, int, int]]:
+        return self.colors.get(description)
+
+    def add(self, description: str, rgb):
+        self._put(description, tuple(rgb))
+        self.added.add(description)
+
+    def _put(self, description: str, rgb):
+        self.colors[description] = rgb
+        lab = rgb_to_lab(rgb)
+        self.grid.setdefault(_cell(lab), []).append(lab)
+
+    def nearest(self, rgb, within: float) -> float:
+        """rgb 到已有颜色的最小 Lab 距离; 只查 within 范围内的格子, 范围内没有颜色时返回 inf"""
+        lab = rgb_to_lab(rgb)
+        cx, cy, cz = _cell(lab)
+        reach = math.ceil(within / CELL_SIZE)
+        best = math.inf
+        for dx in range(-reach, reach + 1):
+            for dy in range(-reach, reach + 1):
+                for dz in range(-reach, reach + 1):
+                    for other in self.grid.get((cx + dx, cy + dy, cz + dz), ()):
+                        best = min(best, math.dist(lab, other))
+        return best
+
+    def save(self, descriptions: Iterable[str]):
+        """把 descriptions 中新分配的颜色合并进文件 (文件里已有的描述以文件为准), 先写临时文件再替换
+
+        只读命令也会分配颜色, 但只有写命令新建任务时才保存, 其余的留在内存里。
+        """
+        pending = self.added.intersection(descriptions)
+        if not pending:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                stored = json.load(f)
+        except (FileNotFoundError, ValueError):
+            stored = {}
+        for desc in pending:
+            stored.setdefault(desc, list(self.colors[desc]))
+        # 顺便收下其它进程在此期间分配的颜色
+        for desc, rgb in stored.items():
+            if desc not in self.colors:
+                self._put(desc, tuple(rgb))
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(stored, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+        self.added -= pending
+        st = os.stat(self.path)
+        self.key = (st.st_mtime_ns, st.st_size)
+
+
+def _cell(lab) -> Tuple[int, int, int]:
+    return tuple(int(math.floor(v / CELL_SIZE)) for v in lab)
@@ -0,0 +1,72 @@
+import json
+import os
+from datetime import datetime, timedelta
+from typing import List
+
+# 缓存条目的格式版本, 不一致的条目在读入时丢弃并重建
+VERSION = 2
+
+
+def split_by_day(start: datetime, end: datetime):
+    """把 [start, end) 按自然日切分, 产出 (YYYY-MM-DD, seg_start, seg_end); 跨零点的段在次日 00:00 切开, 不丢时间"""
+    current_day = start.date()
+    while current_day <= end.date():
+        day_start = datetime.combine(current_day, datetime.min.time())
+        next_day = day_start + timedelta(days=1)
+
+        seg_start = max(start, day_start)
+        seg_end = min(end, next_day)
+        if seg_start < seg_end:
+            yield current_day.strftime('%Y-%m-%d'), seg_start, seg_end
+
+        current_day += timedelta(days=1)
+
+
+def add_to_days(day_infos: dict, desc: str, start_iso: str, end_iso: str):
+    """按自然日切分后累加: {date: {desc: {seconds, start, end}}}
+
+    累加的是秒数, 展示时再取整到分钟; 每段各自取整会让跨天的 session 在合计里少算。
+    段结束在次日零点时 end 记成当天 23:59:59。
+    """
+    for date_str, seg_start, seg_end in split_by_day(
+        datetime.fromisoformat(start_iso), datetime.fromisoformat(end_iso)
+    ):
+        seg_start_iso = seg_start.isoformat(timespec='seconds')
+        seg_end_iso = min(seg_end, datetime.fromisoformat(date_str) + timedelta(days=1, seconds=-1)).isoformat(timespec='seconds')
+        info = day_infos.setdefault(date_str, {}).setdefault(
+            desc, {"seconds": 0, "start": seg_start_iso, "end": seg_end_iso}
+        )
+        info["seconds"] += (seg_end - seg_start).total_seconds()
+        info["start"] = min(info["start"], seg_start_iso)
+        info["end"] = max(info["end"], seg_end_iso)
+
+
+def build_entry(tasks: List[dict], signature) -> dict:
+    """按自然日汇总一天的已结束 session (按任务的汇总走列式快照); 进行中的 session 原样保留, 查询时再按当前时间计算"""
+    entry = {"version": VERSION, "sig": signature, "days": {}, "open": []}
+    for task in tasks:
+        desc = task["description"]
+        for sess in task["sessions"]:
+            if sess["end_time"] is None:
+                entry["open"].append({"description": desc, "start_time": sess["start_time"]})
+                continue
+            add_to_days(entry["days"], desc, sess["start_time"], sess["end_time"])
+    return entry
+
+
+def load(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            cache = json.load(f)
+    except ValueError:
+        # 缓存损坏直接丢弃, 下次查询会重建
+        return {}
+    return {date_str: entry for date_str, entry in cache.items() if entry.get("version") == VERSION}
+
+
+def save(path: str, cache: dict):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
@@ -0,0 +1,165 @@
+import os
+import sqlite3
+from typing import List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    date TEXT NOT NULL,
+    id TEXT NOT NULL,
+    description TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (date, id)
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_description ON tasks(description);
+CREATE TABLE IF NOT EXISTS sessions (
+    date TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT,
+    note TEXT,
+    PRIMARY KEY (date, task_id, idx)
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_start_time ON sessions(start_time);
+"""
+
+# 时长 (分钟)，进行中的 session 以 :now 作为结束时间
+DURATION_SQL = (
+    "(CAST(strftime('%s', COALESCE(s.end_time, :now)) AS INTEGER)"
+    " - CAST(strftime('%s', s.start_time) AS INTEGER)) / 60.0"
+)
+
+# 按路径缓存的连接, DATA_DIR 变了 (测试、换了 HOME) 不会继续用旧的库
+_conns = {}
+
+
+def connect(db_path: str):
+    """打开 (或创建) 数据库，返回 (连接, 是否新建)"""
+    created = not os.path.exists(db_path)
+    conn = _conns.get(db_path)
+    if conn is None:
+        conn = _conns[db_path] = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        conn.executescript(SCHEMA)
+    return conn, created
+
+
+def read_tasks(conn, date_str: str) -> List[dict]:
+    tasks = []
+    by_id = {}
+    for row in conn.execute(
+        "SELECT id, description FROM tasks WHERE date = ? ORDER BY position", (date_str,)
+    ):
+        task = {"id": row["id"], "description": row["description"], "sessions": []}
+        by_id[row["id"]] = task
+        tasks.append(task)
+    for row in conn.execute(
+        "SELECT task_id, start_time, end_time, note FROM sessions WHERE date = ? ORDER BY task_id, idx",
+        (date_str,),
+    ):
+        by_id[row["task_id"]]["sessions"].append(_session_dict(row))
+    return tasks
+
+
+def write_tasks(conn, date_str: str, tasks: List[dict]):
+    with conn:
+        conn.execute("DELETE FROM sessions WHERE date = ?", (date_str,))
+        conn.execute("DELETE FROM tasks WHERE date = ?", (date_str,))
+        for position, task in enumerate(tasks):
+            conn.execute(
+                "INSERT INTO tasks (date, id, description, position) VALUES (?, ?, ?, ?)",
+                (date_str, task["id"], task["description"], position),
+            )
+            for idx, sess in enumerate(task["sessions"]):
+                _insert_session(conn, date_str, task["id"], idx, sess)
+
+
+def write_session(conn, date_str: str, tasks: List[dict], task: dict, index: int):
+    with conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO tasks (date, id, description, position) VALUES (?, ?, ?, ?)",
+            (date_str, task["id"], task["description"], tasks.index(task)),
+        )
+        _insert_session(conn, date_str, task["id"], index, task["sessions"][index])
+
+
+def remove_session(conn, date_str: str, task: dict, index: int):
+    with conn:
+        conn.execute(
+            "DELETE FROM sessions WHERE date = ? AND task_id = ? AND idx = ?",
+            (date_str, task["id"], index),
+        )
+        # 后面的 session 依次前移，保持与 JSON 列表下标一致
+        for idx in range(index + 1, len(task["sessions"]) + 1):
+            conn.execute(
+                "UPDATE sessions SET idx = ? WHERE date = ? AND task_id = ? AND idx = ?",
+                (idx - 1, date_str, task["id"], idx),
+            )
+
+
+def read_sessions(conn, from_date: str, to_date: str, filter_str: Optional[str] = None) -> List[dict]:
+    """按 start_time 索引取出日期范围内的 session (已按开始时间排序)"""
+    sql = (
+        "SELECT s.date, s.task_id, t.description, s.start_time, s.end_time, s.note "
+        "FROM sessions s JOIN tasks t ON t.date = s.date AND t.id = s.task_id "
+        "WHERE s.start_time >= :from AND s.start_time < :to"
+    )
+    if filter_str:
+        sql += " AND instr(t.description, :filter) > 0"
+    sql += " ORDER BY s.start_time"
+    rows = conn.execute(sql, _range_params(from_date, to_date, filter_str))
+    return [
+        {
+            "date": row["date"],
+            "task_id": row["task_id"],
+            "description": row["description"],
+            "start_time": row["start_time"],
+            "end_time": row["end_time"],
+            "note": row["note"],
+        }
+        for row in rows
+    ]
+
+
+def summarize_tasks(conn, from_date: str, to_date: str, filter_str: Optional[str], now: str) -> dict:
+    """按任务描述聚合日期范围内的总时长、最早开始、最晚结束"""
+    sql = (
+        f"SELECT t.description, SUM({DURATION_SQL}) AS duration, MIN(s.start_time) AS start_time, "
+        "MAX(COALESCE(s.end_time, :now)) AS end_time, MAX(s.end_time IS NULL) AS is_running "
+        "FROM sessions s JOIN tasks t ON t.date = s.date AND t.id = s.task_id "
+        "WHERE s.start_time >= :from AND s.start_time < :to"
+    )
+    if filter_str:
+        sql += " AND instr(t.description, :filter) > 0"
+    sql += " GROUP BY t.description"
+    params = _range_params(from_date, to_date, filter_str)
+    params["now"] = now
+    return {
+        row["description"]: {
+            "duration": row["duration"],
+            "start_time": row["start_time"],
+            "end_time": row["end_time"],
+            "is_running": bool(row["is_running"]),
+        }
+        for row in conn.execute(sql, params)
+    }
+
+
+def _range_params(from_date: str, to_date: str, filter_str: Optional[str]) -> dict:
+    # "T99" 在字典序上大于当天任何时刻, 保证 to_date 当天全部包含在内
+    return {"from": from_date, "to": f"{to_date}T99", "filter": filter_str}
+
+
+def _insert_session(conn, date_str: str, task_id: str, idx: int, sess: dict):
+    conn.execute(
+        "INSERT OR REPLACE INTO sessions (date, task_id, idx, start_time, end_time, note) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (date_str, task_id, idx, sess["start_time"], sess["end_time"], sess.get("note")),
+    )
+
+
+def _session_dict(row) -> dict:
+    sess = {"start_time": row["start_time"], "end_time": row["end_time"]}
+    if row["note"] is not None:
+        sess["note"] = row["note"]
+    return sess
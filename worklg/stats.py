@@ -0,0 +1,122 @@
+"""工作习惯统计 (wl stats)
+
+session 一次性装进 NumPy 数组后整体计算, 不逐条循环。json/journal 模式直接引用列式快照的内存,
+sqlite 模式从 read_sessions 的结果构造数组。只在执行 stats 命令时才导入本模块 (以及 NumPy)。
+"""
+from typing import List, Optional
+
+import numpy as np
+
+import storage
+from columnar import RUNNING, to_ts
+
+HOUR = 3600
+DAY = 24 * HOUR
+# 1970-01-01 是星期四, 换算成周一为 0
+EPOCH_WEEKDAY = 3
+# 同一任务前后两个 session 间隔不超过这个秒数视为没有中断 (与 start 续接上一个 session 的规则一致)
+FOCUS_GAP = 60
+LENGTH_BINS = [0, 5, 15, 30, 60, 120, 240]
+
+
+class Sessions:
+    """按开始时间排序的 session 数组, 进行中的 session 已经以 now 作为结束时间"""
+    __slots__ = ("starts", "ends", "desc_ids", "descriptions")
+
+    def __init__(self, starts, ends, desc_ids, descriptions: List[str]):
+        order = np.argsort(starts, kind="stable")
+        self.starts = starts[order]
+        self.ends = ends[order]
+        self.desc_ids = desc_ids[order]
+        self.descriptions = descriptions
+
+    def __len__(self):
+        return len(self.starts)
+
+
+def load_sessions(from_date: str, to_date: str, filter_str: Optional[str], now: int) -> Sessions:
+    if storage.STORAGE_MODE == 'sqlite':
+        rows = storage.read_sessions(from_date, to_date, filter_str)
+        descriptions = sorted({row["description"] for row in rows})
+        index = {desc: i for i, desc in enumerate(descriptions)}
+        starts = np.fromiter((to_ts(row["start_time"]) for row in rows), dtype=np.int64, count=len(rows))
+        ends = np.fromiter(
+            (to_ts(row["end_time"]) if row["end_time"] else now for row in rows), dtype=np.int64, count=len(rows)
+        )
+        desc_ids = np.fromiter((index[row["description"]] for row in rows), dtype=np.int32, count=len(rows))
+        return Sessions(starts, ends, desc_ids, descriptions)
+
+    snapshot = storage.read_columns(from_date, to_date)
+    lo, hi = snapshot.row_range(from_date, to_date)
+    starts = np.frombuffer(snapshot.starts, dtype=np.int64)[lo:hi]
+    ends = np.frombuffer(snapshot.ends, dtype=np.int64)[lo:hi]
+    desc_ids = np.frombuffer(snapshot.desc_ids, dtype=np.int32)[lo:hi]
+    if filter_str:
+        wanted = np.array([filter_str in desc for desc in snapshot.descriptions], dtype=bool)
+        mask = wanted[desc_ids]
+        starts, ends, desc_ids = starts[mask], ends[mask], desc_ids[mask]
+    ends = np.where(ends == RUNNING, now, ends)
+    return Sessions(starts, ends, desc_ids, snapshot.descriptions)
+
+
+def weekday_hour_minutes(sessions: Sessions):
+    """7×24 的分钟数矩阵 (行: 周一到周日, 列: 0~23 点), 跨整点的 session 按实际时长分到各个小时"""
+    if len(sessions) == 0:
+        return np.zeros((7, 24))
+    starts = np.sort(sessions.starts)
+    ends = np.sort(sessions.ends)
+    first_hour = starts[0] // HOUR
+    boundaries = np.arange(first_hour, ends.max() // HOUR + 2) * HOUR
+
+    # covered(b) = 所有 session 在 b 之前覆盖的总秒数 = Σ_{s<b}(b-s) - Σ_{e<b}(b-e)
+    start_sums = np.concatenate(([0], np.cumsum(starts)))
+    end_sums = np.concatenate(([0], np.cumsum(ends)))
+    n_started = np.searchsorted(starts, boundaries)
+    n_ended = np.searchsorted(ends, boundaries)
+    covered = (n_started * boundaries - start_sums[n_started]) - (n_ended * boundaries - end_sums[n_ended])
+    per_hour = np.diff(covered)
+
+    hours = np.arange(first_hour, first_hour + len(per_hour))
+    cells = ((hours // 24 + EPOCH_WEEKDAY) % 7) * 24 + hours % 24
+    return np.bincount(cells, weights=per_hour, minlength=7 * 24).reshape(7, 24) / 60
+
+
+def length_distribution(sessions: Sessions):
+    """session 时长 (分钟) 的分布: (各区间的 [下限, 上限或 None, 个数], 中位数, 90 分位)"""
+    minutes = (sessions.ends - sessions.starts) // 60
+    counts = np.bincount(np.digitize(minutes, LENGTH_BINS[1:]), minlength=len(LENGTH_BINS))
+    buckets = [
+        [low, LENGTH_BINS[i + 1] if i + 1 < len(LENGTH_BINS) else None, int(counts[i])]
+        for i, low in enumerate(LENGTH_BINS)
+    ]
+    if len(minutes) == 0:
+        return buckets, 0, 0
+    median, p90 = np.percentile(minutes, [50, 90])
+    return buckets, float(median), float(p90)
+
+
+def context_switches(sessions: Sessions):
+    """每个工作日的任务切换次数: (日期编号数组, 切换次数数组), 同一天内相邻两个 session 的任务不同算一次"""
+    days = sessions.starts // DAY
+    worked_days = np.unique(days)
+    switched = (sessions.desc_ids[1:] != sessions.desc_ids[:-1]) & (days[1:] == days[:-1])
+    counts = np.bincount(np.searchsorted(worked_days, days[1:][switched]), minlength=len(worked_days))
+    return worked_days, counts
+
+
+def focus_blocks(sessions: Sessions, top: int = 5):
+    """最长的不间断专注时段: [(描述, 开始, 结束), ...], 同一任务间隔不超过 FOCUS_GAP 的 session 合并"""
+    if len(sessions) == 0:
+        return []
+    starts, ends, desc_ids = sessions.starts, sessions.ends, sessions.desc_ids
+    new_block = np.ones(len(starts), dtype=bool)
+    new_block[1:] = (desc_ids[1:] != desc_ids[:-1]) | (starts[1:] - ends[:-1] > FOCUS_GAP)
+    first = np.flatnonzero(new_block)
+    block_starts = starts[first]
+    block_ends = np.maximum.reduceat(ends, first)
+    lengths = block_ends - block_starts
+    best = np.argsort(-lengths, kind="stable")[:top]
+    return [
+        (sessions.descriptions[desc_ids[first[i]]], int(block_starts[i]), int(block_ends[i]))
+        for i in best
+    ]
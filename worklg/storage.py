@@ -1,9 +1,43 @@
 import json
 import os
-from typing import List
+import re
+import time
+from bisect import bisect_left, bisect_right
+from collections import deque
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Iterable, List, Optional, Tuple
+
+# columnar/desc_index/pack/palette/rollup 以及线程池都在用到的函数里再导入,
+# wl curr 这类只读当天 day file 的命令不需要为它们付出启动时间 (desc_index 还会带进 sqlite3)
+if TYPE_CHECKING:
+    import columnar
+    import palette
 
 DATA_DIR = os.path.expanduser('~/.worklog_cli')
 
+# json: 每次写入整天快照; journal: 每次变更追加一条记录, 超过阈值后压缩回快照;
+# sqlite: 所有数据存放在 DATA_DIR/worklog.db, 范围查询走索引
+STORAGE_MODE = os.environ.get('WORKLOG_STORAGE', 'json')
+JOURNAL_COMPACT_BYTES = 64 * 1024
+DB_FILE = 'worklog.db'
+ACTIVE_FILE = 'active.json'
+INDEX_FILE = 'desc_index.db'
+ROLLUP_FILE = 'rollup.json'
+SOCKET_FILE = 'daemon.sock'
+COLUMNS_FILE = 'columns.bin'
+PALETTE_FILE = 'palette.json'
+# 上次自动打包时所在的月份
+PACK_MARKER_FILE = 'packed_month'
+DAY_FILE_RE = re.compile(r'^(\d{4}-\d{2}-\d{2})\.(json|journal)$')
+PACK_FILE_RE = re.compile(r'^(\d{4}-\d{2})\.pack$')
+# 范围读取时并发解析 day file 的线程数, 以及最多提前读入的天数
+PREFETCH_WORKERS = 4
+PREFETCH_DAYS = 8
+RESIDENT_DAYS = 2
+
+if STORAGE_MODE == 'sqlite':
+    import sqlite_store
+
 def ensure_data_dir():
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
@@ -11,16 +45,606 @@ def ensure_data_dir():
 def get_file_path(date_str: str) -> str:
     return os.path.join(DATA_DIR, f"{date_str}.json")
 
+def get_journal_path(date_str: str) -> str:
+    return os.path.join(DATA_DIR, f"{date_str}.journal")
+
+def get_pack_path(date_str: str) -> str:
+    """date_str 所在月份的 pack 文件 (YYYY-MM.pack), 日期或月份都可以"""
+    return os.path.join(DATA_DIR, f"{date_str[:7]}.pack")
+
+def get_active_path() -> str:
+    return os.path.join(DATA_DIR, ACTIVE_FILE)
+
+def get_socket_path() -> str:
+    return os.path.join(DATA_DIR, SOCKET_FILE)
+
+# 常驻模式 (wl daemon): 每天的数据读过一次就留在内存里, 写入只更新内存并标记为脏,
+# 由 flush() 批量落盘。活跃指针和描述索引仍然立即更新。
+# 落盘后只保留最近 RESIDENT_DAYS 天, 常驻的只有高频写命令涉及的当天 (和跨零点时的前一天)。
+# {date: (读入时的 day_signature, tasks)}, 非常驻模式下为 None
+_resident = None
+_dirty = set()
+# 当前进程映射着的列式快照
+_snapshot = None
+# 任务配色表, 第一次取颜色时读入
+_palette = None
+
+def enable_resident():
+    global _resident
+    _resident = {}
+
+def disable_resident():
+    """落盘并丢掉常驻缓存, 之后的读写直接访问磁盘, 直到再次 enable_resident()"""
+    global _resident
+    flush()
+    _resident = None
+
+def flush():
+    """把常驻模式下积攒的脏数据写回磁盘, 并把缓存缩减到最近 RESIDENT_DAYS 天"""
+    while _dirty:
+        date_str = _dirty.pop()
+        tasks = _resident[date_str][1]
+        _persist_tasks(date_str, tasks)
+        _resident[date_str] = (_signature_of(date_str), tasks)
+    if _resident is not None and len(_resident) > RESIDENT_DAYS:
+        for date_str in sorted(_resident)[:-RESIDENT_DAYS]:
+            del _resident[date_str]
+
+def _signature_of(date_str: str):
+    # sqlite 模式下数据只会经由本进程修改, 不需要检查
+    return None if STORAGE_MODE == 'sqlite' else day_signature(date_str)
+
+def _keep_resident(date_str: str, tasks: List[dict]) -> bool:
+    """常驻模式下把 tasks 记为当天的最新状态, 返回 True 表示延后落盘"""
+    if _resident is None:
+        return False
+    _resident[date_str] = (None, tasks)
+    _dirty.add(date_str)
+    return True
+
+def get_db():
+    """sqlite 模式下的数据库连接, 首次创建时导入已有的 JSON 数据"""
+    ensure_data_dir()
+    conn, created = sqlite_store.connect(os.path.join(DATA_DIR, DB_FILE))
+    if created:
+        for date_str in _stored_dates():
+            sqlite_store.write_tasks(conn, date_str, _read_json_tasks(date_str))
+    return conn
+
+def get_index():
+    """任务描述的 trigram 索引, 不存在时从全部历史数据构建"""
+    import desc_index
+    ensure_data_dir()
+    conn, created = desc_index.connect(os.path.join(DATA_DIR, INDEX_FILE))
+    if created:
+        for date_str in list_dates():
+            desc_index.update(conn, date_str, read_tasks(date_str))
+    return conn
+
+def get_palette() -> "palette.Palette":
+    """描述 -> 颜色的配色表; 只读命令分配的新颜色只留在内存里"""
+    global _palette
+    if _palette is None:
+        import palette
+        ensure_data_dir()
+        _palette = palette.Palette(os.path.join(DATA_DIR, PALETTE_FILE))
+    return _palette
+
+def save_colors(descriptions: Iterable[str]):
+    """写命令新建任务后调用: 给这些描述分配颜色 (已经分配过的沿用) 并写回配色表"""
+    from utils import pick_color_rgb
+    descriptions = set(descriptions)
+    palette = get_palette()
+    for description in descriptions:
+        pick_color_rgb(description, palette)
+    palette.save(descriptions)
+
+def list_dates() -> List[str]:
+    """所有有数据的日期, 升序"""
+    if STORAGE_MODE == 'sqlite':
+        return [row[0] for row in get_db().execute("SELECT DISTINCT date FROM tasks ORDER BY date")]
+    return _stored_dates()
+
+def _stored_dates() -> List[str]:
+    """目录里 day file、journal 和 pack 中出现的全部日期, 升序"""
+    import pack
+    ensure_data_dir()
+    dates = set()
+    for name in os.listdir(DATA_DIR):
+        m = DAY_FILE_RE.match(name)
+        if m:
+            dates.add(m.group(1))
+            continue
+        m = PACK_FILE_RE.match(name)
+        if m:
+            dates.update(pack.dates(os.path.join(DATA_DIR, name)))
+    return sorted(dates)
+
 def read_tasks(date_str: str) -> List[dict]:
+    """读取一天的任务; 常驻模式下返回的是缓存本身, 调用方修改后必须写回"""
+    if _resident is not None:
+        cached = _resident.get(date_str)
+        # 不脏的缓存要和磁盘比对一下, 防止数据在 daemon 之外被修改过
+        if cached is None or (date_str not in _dirty and cached[0] != _signature_of(date_str)):
+            cached = _resident[date_str] = (_signature_of(date_str), _read_backend_tasks(date_str))
+        return cached[1]
+    return _read_backend_tasks(date_str)
+
+def _read_backend_tasks(date_str: str) -> List[dict]:
+    if STORAGE_MODE == 'sqlite':
+        return sqlite_store.read_tasks(get_db(), date_str)
+    return _read_json_tasks(date_str)
+
+def _read_json_tasks(date_str: str) -> List[dict]:
+    # 直接打开, 不存在再跳过, 省掉额外的 exists 检查;
+    # 打包后又被改过的日期会重新写出 day file, 它比 pack 里的旧版本优先
+    try:
+        with open(get_file_path(date_str), 'r') as f:
+            tasks = json.load(f)
+    except FileNotFoundError:
+        import pack
+        tasks = pack.read_day(get_pack_path(date_str), date_str) or []
+    try:
+        with open(get_journal_path(date_str), 'r') as f:
+            for line in f:
+                if line.strip():
+                    apply_event(tasks, json.loads(line))
+    except FileNotFoundError:
+        pass
+    return tasks
+
+def existing_dates(from_date: str, to_date: str) -> List[str]:
+    """[from_date, to_date] 内有数据的日期, 只扫描一次目录, 不逐天探测"""
+    dates = list_dates()
+    if _dirty:
+        # 常驻模式下还没落盘的日期
+        dates = sorted(set(dates) | _dirty)
+    return dates[bisect_left(dates, from_date):bisect_right(dates, to_date)]
+
+def prefetch_tasks(dates: List[str]):
+    """按顺序产出 (date, tasks), 后面最多 PREFETCH_DAYS 天交给线程池提前读取解析"""
+    # sqlite 连接不能跨线程使用
+    if STORAGE_MODE == 'sqlite' or len(dates) < 2:
+        for date_str in dates:
+            yield date_str, read_tasks(date_str)
+        return
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(PREFETCH_WORKERS) as pool:
+        pending = deque()
+        remaining = iter(dates)
+        for date_str in remaining:
+            pending.append((date_str, pool.submit(read_tasks, date_str)))
+            if len(pending) >= PREFETCH_DAYS:
+                break
+        while pending:
+            date_str, future = pending.popleft()
+            next_date = next(remaining, None)
+            if next_date is not None:
+                pending.append((next_date, pool.submit(read_tasks, next_date)))
+            yield date_str, future.result()
+
+def write_tasks(date_str: str, tasks: List[dict], added: Iterable[Tuple[str, str]] = ()):
+    """整天写入; added 是这次新增的 (描述, 开始时间), 导入或补录的历史也会计入常用程度"""
+    import desc_index
+    _sync_active(date_str, tasks)
+    desc_index.backfill(get_index(), added)
+    desc_index.update(get_index(), date_str, tasks)
+    if not _keep_resident(date_str, tasks):
+        _persist_tasks(date_str, tasks)
+
+def _persist_tasks(date_str: str, tasks: List[dict]):
+    if STORAGE_MODE == 'sqlite':
+        sqlite_store.write_tasks(get_db(), date_str, tasks)
+        return
     ensure_data_dir()
     file_path = get_file_path(date_str)
-    if not os.path.exists(file_path):
-        return []
-    with open(file_path, 'r') as f:
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(tasks, f, indent=2)
+    os.replace(tmp_path, file_path)
+    # 快照已经包含全部状态, journal 可以丢弃
+    journal_path = get_journal_path(date_str)
+    if os.path.exists(journal_path):
+        os.remove(journal_path)
+
+def apply_event(tasks: List[dict], event: dict):
+    """把一条 journal 记录回放到 tasks 上
+
+    put: 新增或整体替换一个 session; set: 只改变化的字段, 追加的备注只记新增的部分;
+    del: 删除一个 session。set/del 带着修改前的 start_time 校验, 压缩中途失败后重复回放也不会出错。
+    """
+    task = next((t for t in tasks if t["id"] == event["task_id"]), None)
+    if event["op"] == "put":
+        if task is None:
+            task = {"id": event["task_id"], "description": event["description"], "sessions": []}
+            tasks.append(task)
+        index = event["index"]
+        if index < len(task["sessions"]):
+            task["sessions"][index] = event["session"]
+        else:
+            task["sessions"].append(event["session"])
+    elif event["op"] == "set":
+        index = event["index"]
+        if task is None or index >= len(task["sessions"]):
+            return
+        sess = task["sessions"][index]
+        if sess["start_time"] != event["start_time"]:
+            return
+        if "note_append" in event:
+            note = sess.get("note") or ""
+            # 备注长度不等于追加前的长度, 说明这条已经回放过了
+            if len(note) == event["note_at"]:
+                sess["note"] = note + event["note_append"]
+        for key, value in event.get("fields", {}).items():
+            if key == "note" and value is None:
+                sess.pop("note", None)
+            else:
+                sess[key] = value
+    elif event["op"] == "del":
+        index = event["index"]
+        if task is not None and index < len(task["sessions"]) \
+                and task["sessions"][index]["start_time"] == event["start_time"]:
+            task["sessions"].pop(index)
+
+def _change_event(task: dict, index: int, previous: dict) -> Optional[dict]:
+    """session 相对 previous (上次保存的状态) 的 set 记录, 没有变化时返回 None"""
+    session = task["sessions"][index]
+    event = {"op": "set", "task_id": task["id"], "index": index, "start_time": previous["start_time"]}
+    fields = {key: session[key] for key in ("start_time", "end_time") if session[key] != previous[key]}
+    old_note, new_note = previous.get("note"), session.get("note")
+    if new_note != old_note:
+        if old_note is not None and new_note is not None and new_note.startswith(old_note):
+            event["note_at"] = len(old_note)
+            event["note_append"] = new_note[len(old_note):]
+        else:
+            fields["note"] = new_note
+    if fields:
+        event["fields"] = fields
+    return event if fields or "note_append" in event else None
+
+def append_event(date_str: str, event: dict):
+    """追加一条 journal 记录, 写入开销与当天数据量无关"""
+    ensure_data_dir()
+    journal_path = get_journal_path(date_str)
+    line = (json.dumps(event, ensure_ascii=False) + '\n').encode()
+    fd = os.open(journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+        size = os.fstat(fd).st_size
+    finally:
+        os.close(fd)
+    if size > JOURNAL_COMPACT_BYTES:
+        compact_tasks(date_str)
+
+def compact_tasks(date_str: str):
+    """把 journal 回放后写回快照"""
+    write_tasks(date_str, read_tasks(date_str))
+
+def writes_whole_day() -> bool:
+    """write_session/remove_session 是否需要整天的任务列表; journal 模式只追加一条记录, 只需要改动的任务"""
+    return _resident is not None or STORAGE_MODE != 'journal'
+
+def write_session(date_str: str, tasks: Optional[List[dict]], task: dict, index: int,
+                  previous: Optional[dict] = None):
+    """持久化 task 的第 index 个 session (新增或修改), previous 是它上次保存时的状态 (新建的为 None)
+
+    writes_whole_day() 为 False 时 tasks 可以是 None。
+    """
+    import desc_index
+    pointer = {"date": date_str, "task_id": task["id"], "index": index}
+    if task["sessions"][index]["end_time"] is None:
+        _write_active(pointer)
+    elif read_active() == pointer:
+        _write_active(None)
+    if previous is None:
+        # 补录的 session 可能早于这个任务已经计过分的 session
+        desc_index.backfill(get_index(), [(task["description"], task["sessions"][index]["start_time"])])
+    desc_index.update(get_index(), date_str, [task])
+    if _keep_resident(date_str, tasks):
+        return
+    if STORAGE_MODE == 'sqlite':
+        sqlite_store.write_session(get_db(), date_str, tasks, task, index)
+        return
+    if STORAGE_MODE != 'journal':
+        write_tasks(date_str, tasks)
+        return
+    if previous is not None:
+        # 已有的 session 只记录变化的字段, 记录大小和当天数据量、备注长度都无关
+        event = _change_event(task, index, previous)
+        if event is not None:
+            append_event(date_str, event)
+        return
+    append_event(date_str, {
+        "op": "put",
+        "task_id": task["id"],
+        "description": task["description"],
+        "index": index,
+        "session": task["sessions"][index],
+    })
+
+def remove_session(date_str: str, tasks: Optional[List[dict]], task: dict, index: int):
+    """删除 task 的第 index 个 session 并持久化"""
+    session = task["sessions"].pop(index)
+    active = read_active()
+    if active and active["date"] == date_str and active["task_id"] == task["id"]:
+        if active["index"] == index:
+            _write_active(None)
+        elif active["index"] > index:
+            _write_active(dict(active, index=active["index"] - 1))
+    if _keep_resident(date_str, tasks):
+        return
+    if STORAGE_MODE == 'sqlite':
+        sqlite_store.remove_session(get_db(), date_str, task, index)
+        return
+    if STORAGE_MODE != 'journal':
+        write_tasks(date_str, tasks)
+        return
+    append_event(date_str, {
+        "op": "del",
+        "task_id": task["id"],
+        "index": index,
+        "start_time": session["start_time"],
+    })
+
+def read_active() -> Optional[dict]:
+    """进行中 session 的指针 {date, task_id, index}, 没有则返回 None"""
+    path = get_active_path()
+    if not os.path.exists(path):
+        # 旧数据没有指针文件, 从昨天和当天的数据初始化一次
+        for days_ago in (1, 0):
+            date_str = (datetime.now() - timedelta(days=days_ago)).strftime("%Y-%m-%d")
+            _sync_active(date_str, read_tasks(date_str))
+    with open(path, 'r') as f:
         return json.load(f)
 
-def write_tasks(date_str: str, tasks: List[dict]):
+def load_active():
+    """按指针直接定位进行中的 session, 返回 (date_str, tasks, task, index), 没有则返回 None"""
+    active = read_active()
+    if active is None:
+        return None
+    tasks = read_tasks(active["date"])
+    for task in tasks:
+        if task["id"] == active["task_id"]:
+            index = active["index"]
+            if index < len(task["sessions"]) and task["sessions"][index]["end_time"] is None:
+                return active["date"], tasks, task, index
+    # 指针已过期 (数据被手动修改过)
+    _write_active(None)
+    return None
+
+def _write_active(pointer: Optional[dict]):
     ensure_data_dir()
-    file_path = get_file_path(date_str)
-    with open(file_path, 'w') as f:
-        json.dump(tasks, f, indent=2)
+    path = get_active_path()
+    with open(path + '.tmp', 'w') as f:
+        json.dump(pointer, f)
+    os.replace(path + '.tmp', path)
+
+def _sync_active(date_str: str, tasks: List[dict]):
+    """整天写入时根据内容更新指针"""
+    for task in tasks:
+        for index, sess in enumerate(task["sessions"]):
+            if sess["end_time"] is None:
+                _write_active({"date": date_str, "task_id": task["id"], "index": index})
+                return
+    path = get_active_path()
+    if not os.path.exists(path) or (read_active() or {}).get("date") == date_str:
+        _write_active(None)
+
+def search_tasks(selector: str, since: str) -> List[dict]:
+    """通过索引查找 since 之后出现过、描述包含 selector 的任务, 按最后结束时间升序"""
+    import desc_index
+    return desc_index.search(get_index(), selector, since)
+
+def task_scores(descriptions) -> dict:
+    """描述 -> 当前的常用程度分数 (兼顾最近使用和使用频率), 只查索引"""
+    import desc_index
+    return desc_index.scores(get_index(), descriptions, datetime.now().isoformat(timespec='seconds'))
+
+def recent_tasks(since: str) -> List[dict]:
+    """since 之后出现过的全部任务, 按最后结束时间升序"""
+    import desc_index
+    return desc_index.recent(get_index(), since)
+
+def read_sessions(from_date: str, to_date: str, filter_str: Optional[str] = None) -> List[dict]:
+    """取出日期范围内所有 session 的扁平记录, 按开始时间排序"""
+    if STORAGE_MODE == 'sqlite':
+        return sqlite_store.read_sessions(get_db(), from_date, to_date, filter_str)
+    sessions = list(iter_sessions(from_date, to_date, filter_str))
+    sessions.sort(key=lambda s: s["start_time"])
+    return sessions
+
+def iter_sessions(from_date: str, to_date: str, filter_str: Optional[str] = None):
+    """逐天读取, 逐条产出 session 的扁平记录; 同一天内按开始时间排序, 内存占用只有预读窗口内的几天"""
+    for day_str, tasks in prefetch_tasks(existing_dates(from_date, to_date)):
+        rows = []
+        for task in tasks:
+            if filter_str and filter_str not in task["description"]:
+                continue
+            for sess in task["sessions"]:
+                rows.append({
+                    "date": day_str,
+                    "task_id": task["id"],
+                    "description": task["description"],
+                    "start_time": sess["start_time"],
+                    "end_time": sess["end_time"],
+                    "note": sess.get("note", None),
+                })
+        rows.sort(key=lambda s: s["start_time"])
+        yield from rows
+
+def summarize_tasks(from_date: str, to_date: str, filter_str: Optional[str], now: str) -> dict:
+    """按任务描述聚合: {description: {duration, start_time, end_time, is_running}}
+
+    duration 为分钟数 (float), 进行中的 session 以 now 作为结束时间
+    """
+    import columnar
+    if STORAGE_MODE == 'sqlite':
+        return sqlite_store.summarize_tasks(get_db(), from_date, to_date, filter_str, now)
+    snapshot = read_columns(from_date, to_date)
+    lo, hi = snapshot.row_range(from_date, to_date)
+    # 过滤条件只对字符串表判断一次, 不逐行比较字符串, 聚合直接读映射的数组
+    wanted = [not filter_str or filter_str in desc for desc in snapshot.descriptions]
+    totals = columnar.totals_by_description(snapshot, lo, hi, wanted, columnar.to_ts(now))
+    return {
+        snapshot.descriptions[desc_id]: {
+            "duration": seconds / 60,
+            "start_time": _iso(start),
+            "end_time": _iso(end),
+            "is_running": running,
+        }
+        for desc_id, (seconds, start, end, running) in totals.items()
+    }
+
+def read_columns(from_date: str, to_date: str) -> "columnar.Snapshot":
+    """全部历史的列式快照; 先核对 [from_date, to_date] 内各天的签名, 有变化的天增量重建"""
+    import columnar
+    global _snapshot
+    ensure_data_dir()
+    path = os.path.join(DATA_DIR, COLUMNS_FILE)
+    try:
+        unchanged = _snapshot is not None and _snapshot.key == columnar.file_key(path)
+    except FileNotFoundError:
+        unchanged = False
+    if not unchanged:
+        if _snapshot is not None:
+            _snapshot.close()
+        _snapshot = columnar.load(path)
+
+    signatures = {date_str: day_signature(date_str) for date_str in existing_dates(from_date, to_date)}
+    if _snapshot is not None:
+        first = bisect_left(_snapshot.dates, from_date)
+        last = bisect_right(_snapshot.dates, to_date)
+        for date_str in _snapshot.dates[first:last]:
+            signatures.setdefault(date_str, None)
+        if all((_snapshot.day(d) or [None, None])[1] == sig for d, sig in signatures.items()):
+            return _snapshot
+    _snapshot = columnar.rebuild(path, _snapshot, signatures, read_tasks)
+    return _snapshot
+
+def _iso(ts: int) -> str:
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(ts))
+
+def summarize_days(from_date: str, to_date: str, filter_str: Optional[str], now: str) -> dict:
+    """按自然日和任务描述聚合: {date: {description: {seconds, start, end}}}
+
+    跨天的 session 会被切分到各自的日期, 秒数不取整, 由展示层统一换算成分钟
+    """
+    import rollup
+    day_infos = {}
+    if STORAGE_MODE == 'sqlite':
+        for sess in read_sessions(from_date, to_date, filter_str):
+            rollup.add_to_days(day_infos, sess["description"], sess["start_time"], sess["end_time"] or now)
+        return day_infos
+    for entry in read_rollups(from_date, to_date):
+        for date_str, task_infos in entry["days"].items():
+            for desc, info in task_infos.items():
+                if not filter_str or filter_str in desc:
+                    _merge_info(day_infos.setdefault(date_str, {}), desc, info)
+        for sess in entry["open"]:
+            if not filter_str or filter_str in sess["description"]:
+                rollup.add_to_days(day_infos, sess["description"], sess["start_time"], now)
+    return day_infos
+
+def read_rollups(from_date: str, to_date: str) -> List[dict]:
+    """日期范围内每个 day file 的汇总, 文件没有变化时直接使用缓存, 需要重建的天并发读取"""
+    import rollup
+    ensure_data_dir()
+    path = os.path.join(DATA_DIR, ROLLUP_FILE)
+    cache = rollup.load(path)
+    signatures = {}
+    for date_str in existing_dates(from_date, to_date):
+        signature = day_signature(date_str)
+        if signature is not None:
+            signatures[date_str] = signature
+    # 数据已经被删除的日期
+    removed = [date_str for date_str in cache if from_date <= date_str <= to_date and date_str not in signatures]
+    for date_str in removed:
+        del cache[date_str]
+    stale = [
+        date_str for date_str, signature in signatures.items()
+        if date_str not in cache or cache[date_str]["sig"] != signature
+    ]
+    for date_str, tasks in prefetch_tasks(stale):
+        cache[date_str] = rollup.build_entry(tasks, signatures[date_str])
+    if removed or stale:
+        rollup.save(path, cache)
+    return [cache[date_str] for date_str in signatures]
+
+def day_signature(date_str: str) -> Optional[list]:
+    """day file、journal 和 pack 的 [mtime_ns, size], 当天没有数据时返回 None"""
+    import pack
+    signature = []
+    for path in (get_file_path(date_str), get_journal_path(date_str)):
+        try:
+            st = os.stat(path)
+            signature += [st.st_mtime_ns, st.st_size]
+        except FileNotFoundError:
+            signature += [0, 0]
+    try:
+        if date_str in pack.read_index(get_pack_path(date_str))[1]:
+            st = os.stat(get_pack_path(date_str))
+            signature += [st.st_mtime_ns, st.st_size]
+    except FileNotFoundError:
+        pass
+    return signature if any(signature) else None
+
+def pack_month(month: str) -> int:
+    """把 month (YYYY-MM) 的 day file 和 journal 并入该月的 pack, 返回 pack 里的天数
+
+    先写好新的 pack 再删除零散文件, 中途失败时零散文件仍然优先, 数据不会丢。
+    """
+    import pack
+    path = get_pack_path(month)
+    loose = [name for name in os.listdir(DATA_DIR)
+             if name.startswith(month + '-') and DAY_FILE_RE.match(name)]
+    if not loose:
+        return len(pack.dates(path)) if os.path.exists(path) else 0
+    days = {}
+    for date_str in _stored_dates():
+        if date_str.startswith(month + '-'):
+            tasks = _read_json_tasks(date_str)
+            if tasks:
+                days[date_str] = tasks
+    pack.write_pack(path, days)
+    for name in loose:
+        os.remove(os.path.join(DATA_DIR, name))
+    return len(days)
+
+def packable_months() -> List[str]:
+    """还有零散 day file 的已结束月份 (当前月份保持可写的 day file)"""
+    ensure_data_dir()
+    current = datetime.now().strftime('%Y-%m')
+    months = {m.group(1)[:7] for m in map(DAY_FILE_RE.match, os.listdir(DATA_DIR)) if m}
+    return sorted(month for month in months if month < current)
+
+def auto_pack(force: bool = False):
+    """把已结束月份的零散文件打包; sqlite 模式不使用 day file
+
+    每个月只真正执行一次: 标记文件记着上次打包时所在的月份, 同一个月里只读这个小文件, 不列目录。
+    force=True 时忽略标记 (批量导入可能写进已经打包过的月份)。
+    """
+    if STORAGE_MODE == 'sqlite':
+        return
+    current = datetime.now().strftime('%Y-%m')
+    marker = os.path.join(DATA_DIR, PACK_MARKER_FILE)
+    if not force:
+        try:
+            with open(marker, 'r') as f:
+                if f.read().strip() == current:
+                    return
+        except FileNotFoundError:
+            pass
+    for month in packable_months():
+        pack_month(month)
+    with open(marker + '.tmp', 'w') as f:
+        f.write(current)
+    os.replace(marker + '.tmp', marker)
+
+def _merge_info(task_infos: dict, desc: str, info: dict):
+    merged = task_infos.get(desc)
+    if merged is None:
+        task_infos[desc] = dict(info)
+        return
+    merged["seconds"] += info["seconds"]
+    merged["start"] = min(merged["start"], info["start"])
+    merged["end"] = max(merged["end"], info["end"])
@@ -0,0 +1,83 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from typer.testing import CliRunner
+
+import main
+import storage
+from model import load_active, load_tasks
+
+runner = CliRunner()
+
+TODAY = datetime.now().strftime("%Y-%m-%d")
+YESTERDAY = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def running_day(date_str):
+    return [
+        {"id": "a", "description": "写周报", "sessions": [
+            {"start_time": f"{date_str}T09:00:00", "end_time": f"{date_str}T10:00:00"}]},
+        {"id": "b", "description": "值夜班", "sessions": [
+            {"start_time": f"{date_str}T22:00:00", "end_time": f"{date_str}T22:30:00"},
+            {"start_time": f"{date_str}T23:30:00", "end_time": None}]},
+    ]
+
+
+@pytest.fixture(params=["json", "journal"])
+def mode(request, data_dir, monkeypatch):
+    monkeypatch.setattr(storage, "STORAGE_MODE", request.param)
+    return request.param
+
+
+def test_pointer_survives_midnight(mode, data_dir):
+    storage.write_tasks(YESTERDAY, running_day(YESTERDAY))
+    assert storage.read_active() == {"date": YESTERDAY, "task_id": "b", "index": 1}
+
+    date_str, _, task, index = load_active()
+    assert (date_str, task.description, index) == (YESTERDAY, "值夜班", 1)
+
+    result = runner.invoke(main.app, ["start", "别的任务"])
+    assert "已有正在进行中的任务" in result.output
+
+    result = runner.invoke(main.app, ["stop"])
+    assert result.exit_code == 0, result.output
+    assert storage.read_active() is None
+    # 结束时间写回开始的那一天, 当天的数据不受影响
+    assert load_tasks(YESTERDAY)[1].sessions[1].end is not None
+    assert load_tasks(TODAY) == []
+
+
+def test_pointer_initialized_from_legacy_data(data_dir):
+    os.makedirs(data_dir, exist_ok=True)
+    with open(os.path.join(data_dir, f"{YESTERDAY}.json"), "w") as f:
+        json.dump(running_day(YESTERDAY), f)
+    assert not os.path.exists(storage.get_active_path())
+
+    assert storage.read_active() == {"date": YESTERDAY, "task_id": "b", "index": 1}
+    assert os.path.exists(storage.get_active_path())
+
+
+def test_stale_pointer_is_cleared(data_dir):
+    storage.write_tasks(YESTERDAY, running_day(YESTERDAY))
+    # 在 wl 之外把 session 改成已结束
+    tasks = running_day(YESTERDAY)
+    tasks[1]["sessions"][1]["end_time"] = f"{YESTERDAY}T23:45:00"
+    with open(storage.get_file_path(YESTERDAY), "w") as f:
+        json.dump(tasks, f)
+
+    assert load_active() is None
+    assert storage.read_active() is None
+
+
+def test_pointer_follows_removed_session(mode, data_dir):
+    storage.write_tasks(YESTERDAY, running_day(YESTERDAY))
+    tasks = storage.read_tasks(YESTERDAY)
+    storage.remove_session(YESTERDAY, tasks, tasks[1], 0)
+    assert storage.read_active() == {"date": YESTERDAY, "task_id": "b", "index": 0}
+    assert load_active()[2].sessions[0].end is None
+
+    tasks = storage.read_tasks(YESTERDAY)
+    storage.remove_session(YESTERDAY, tasks, tasks[1], 0)
+    assert storage.read_active() is None
@@ -0,0 +1,139 @@
+import json
+import os
+from collections import Counter
+
+import pytest
+from typer.testing import CliRunner
+
+import batch
+import main
+import storage
+from model import load_active, load_tasks
+
+runner = CliRunner()
+
+
+@pytest.fixture
+def writes(data_dir, monkeypatch):
+    """记录 batch 写入每一天的次数"""
+    counts = Counter()
+    write_tasks = batch.write_tasks
+
+    def counting(date_str, tasks, added=()):
+        counts[date_str] += 1
+        write_tasks(date_str, tasks, added)
+
+    monkeypatch.setattr(batch, "write_tasks", counting)
+    return counts
+
+
+def seed(data_dir, date_str, tasks):
+    os.makedirs(data_dir, exist_ok=True)
+    with open(os.path.join(data_dir, f"{date_str}.json"), "w") as f:
+        json.dump(tasks, f)
+
+
+def snapshot(data_dir):
+    if not os.path.exists(data_dir):
+        return {}
+    return {
+        name: open(os.path.join(data_dir, name), "rb").read()
+        for name in sorted(os.listdir(data_dir)) if storage.DAY_FILE_RE.match(name)
+    }
+
+
+def run(tmp_path, text, *args):
+    path = tmp_path / "ops.txt"
+    path.write_text(text, encoding="utf-8")
+    return runner.invoke(main.app, ["batch", str(path), *args])
+
+
+def test_each_day_written_once(tmp_path, data_dir, writes):
+    result = run(tmp_path, """
+# 两天的补录, 外加一次 start/stop 和备注
+retro 2025-04-27T09:00 2025-04-27T10:00 写周报
+retro 2025-04-27T10:00 2025-04-27T11:00 开会
+start 2025-04-27T13:00 写周报
+note  2025-04-27T13:30 初稿完成
+start 2025-04-27T14:00 review 代码
+stop  2025-04-27T15:00
+retro 2025-04-28T09:00 2025-04-28T09:30 写周报
+""")
+    assert result.exit_code == 0, result.output
+    assert "5 个新 session, 2 天" in result.output
+    assert writes == {"2025-04-27": 1, "2025-04-28": 1}
+
+    tasks = {t.description: t for t in load_tasks("2025-04-27")}
+    assert len(tasks["写周报"].sessions) == 2
+    assert "初稿完成" in tasks["写周报"].sessions[1].note
+    assert tasks["写周报"].id == load_tasks("2025-04-28")[0].id
+    assert load_active() is None
+
+
+def test_start_stops_running_session(tmp_path, data_dir, writes):
+    storage.write_tasks("2025-04-27", [{"id": "a", "description": "写周报", "sessions": [
+        {"start_time": "2025-04-27T09:00:00", "end_time": None}]}])
+    result = run(tmp_path, "start 2025-04-27T10:00 开会\n")
+    assert result.exit_code == 0, result.output
+    assert writes == {"2025-04-27": 1}
+
+    tasks = {t.description: t for t in load_tasks("2025-04-27")}
+    assert tasks["写周报"].sessions[0].end == tasks["开会"].sessions[0].start
+    assert load_active()[2].description == "开会"
+
+
+@pytest.mark.parametrize("text", [
+    # 与已有 session 重叠
+    "retro 2025-04-27T09:30 2025-04-27T10:30 开会\n",
+    # 与前一天跨过零点的 session 重叠
+    "retro 2025-04-28T00:30 2025-04-28T01:30 开会\n",
+    # 本次批量里的两条互相重叠
+    "retro 2025-04-28T09:00 2025-04-28T10:00 开会\nretro 2025-04-28T09:30 2025-04-28T11:00 写周报\n",
+], ids=["existing", "cross-midnight", "within-batch"])
+def test_conflicts_write_nothing(tmp_path, data_dir, writes, text):
+    seed(data_dir, "2025-04-27", [{"id": "a", "description": "写周报", "sessions": [
+        {"start_time": "2025-04-27T09:00:00", "end_time": "2025-04-27T10:00:00"},
+        {"start_time": "2025-04-27T23:00:00", "end_time": "2025-04-28T01:00:00"}]}])
+    before = snapshot(data_dir)
+
+    result = run(tmp_path, "retro 2025-04-26T09:00 2025-04-26T10:00 不冲突\n" + text)
+    assert result.exit_code == 1
+    assert "1 处时间段重叠" in result.output
+    assert writes == {}
+    assert snapshot(data_dir) == before
+
+
+def test_touching_sessions_are_not_conflicts(tmp_path, data_dir, writes):
+    seed(data_dir, "2025-04-27", [{"id": "a", "description": "写周报", "sessions": [
+        {"start_time": "2025-04-27T09:00:00", "end_time": "2025-04-27T10:00:00"}]}])
+    result = run(tmp_path, "retro 2025-04-27T10:00 2025-04-27T11:00 开会\n")
+    assert result.exit_code == 0, result.output
+
+
+@pytest.mark.parametrize("text, message", [
+    ("retro 2025-04-27T09:00 2025-04-27T10:00 写周报\nstop 2025-04-27T11:00\n", "第 2 行: 没有正在进行中的任务"),
+    ("retro 2025-04-27T10:00 2025-04-27T09:00 写周报\n", "第 1 行: 开始时间必须早于结束时间"),
+    ("retro 09:00 10:00 写周报\n", "第 1 行: 时间格式应为"),
+    ("\nrename 2025-04-27T09:00 写周报\n", "第 2 行: 未知操作: rename"),
+    ("note 2025-04-27T12:00 没有 session\n", "第 1 行: 2025-04-27 12:00 没有对应的 session"),
+])
+def test_bad_lines_write_nothing(tmp_path, data_dir, writes, text, message):
+    result = run(tmp_path, text)
+    assert result.exit_code == 1
+    assert message in result.output
+    assert writes == {}
+    assert snapshot(data_dir) == {}
+
+
+def test_dry_run(tmp_path, data_dir, writes):
+    result = run(tmp_path, "retro 2025-04-27T09:00 2025-04-27T10:00 写周报\n", "--dry-run")
+    assert result.exit_code == 0, result.output
+    assert "检查通过" in result.output
+    assert writes == {}
+    assert storage.list_dates() == []
+
+
+def test_unreadable_file(tmp_path, data_dir):
+    result = runner.invoke(main.app, ["batch", str(tmp_path / "missing.txt")])
+    assert result.exit_code == 1
+    assert "无法读取" in result.output
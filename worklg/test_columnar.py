@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+import columnar
+import storage
+from test_pack import day_tasks, seed
+
+NOW = "2025-05-01T12:00:00"
+
+
+def test_snapshot_follows_writes(data_dir):
+    seed(data_dir, {"2025-04-27": day_tasks("2025-04-27", "写周报")})
+    assert storage.summarize_tasks("2025-04-27", "2025-04-28", None, NOW)["写周报"]["duration"] == 60
+
+    storage.write_tasks("2025-04-27", day_tasks("2025-04-27", "写周报", hours=2))
+    storage.write_tasks("2025-04-28", day_tasks("2025-04-28", "开会"))
+    totals = storage.summarize_tasks("2025-04-27", "2025-04-28", None, NOW)
+    assert totals["写周报"]["duration"] == 120
+    assert totals["开会"]["duration"] == 60
+
+    os.remove(storage.get_file_path("2025-04-28"))
+    assert "开会" not in storage.summarize_tasks("2025-04-27", "2025-04-28", None, NOW)
+
+
+@pytest.mark.parametrize("keep", [0, 5, 20, -3])
+def test_truncated_snapshot_is_rebuilt(data_dir, keep):
+    seed(data_dir, {f"2025-04-{d:02d}": day_tasks(f"2025-04-{d:02d}", "写周报") for d in range(20, 28)})
+    storage.summarize_tasks("2025-04-20", "2025-04-27", None, NOW)
+    path = os.path.join(data_dir, storage.COLUMNS_FILE)
+    storage._snapshot.close()
+    storage._snapshot = None
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:keep])
+
+    assert columnar.load(path) is None
+    totals = storage.summarize_tasks("2025-04-20", "2025-04-27", None, NOW)
+    assert totals["写周报"]["duration"] == 8 * 60
+    assert columnar.load(path) is not None
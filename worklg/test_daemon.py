@@ -0,0 +1,83 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+import daemon
+import storage
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def seed_day(data_dir, date_str, count):
+    os.makedirs(data_dir, exist_ok=True)
+    sessions = [
+        {"start_time": f"{date_str}T{9 + i // 6:02d}:{i % 6 * 10:02d}:00",
+         "end_time": f"{date_str}T{9 + i // 6:02d}:{i % 6 * 10 + 5:02d}:00"}
+        for i in range(count)
+    ]
+    with open(os.path.join(data_dir, f"{date_str}.json"), "w") as f:
+        json.dump([{"id": "a", "description": "写周报", "sessions": sessions}], f)
+
+
+@pytest.fixture
+def running_daemon(tmp_path, monkeypatch):
+    data_dir = str(tmp_path / ".worklog_cli")
+    seed_day(data_dir, "2025-04-27", 30)
+    monkeypatch.setattr(storage, "DATA_DIR", data_dir)
+    env = dict(os.environ, HOME=str(tmp_path))
+    proc = subprocess.Popen(
+        [sys.executable, "wl.py", "daemon"], cwd=HERE, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    deadline = time.time() + 60
+    while not os.path.exists(storage.get_socket_path()):
+        assert proc.poll() is None, proc.stderr.read()
+        assert time.time() < deadline, "daemon 没有启动"
+        time.sleep(0.1)
+    yield proc, env
+    daemon.shutdown()
+    proc.wait(timeout=30)
+
+
+def open_request(argv):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(storage.get_socket_path())
+    f = sock.makefile("rwb")
+    daemon._send(f, {"argv": argv, "color": False, "width": None})
+    return sock, f
+
+
+def test_daemon_survives_client_closing_early(running_daemon, capsys):
+    proc, _ = running_daemon
+
+    # 不读输出直接断开
+    sock, f = open_request(["export"])
+    f.close()
+    sock.close()
+
+    # 在交互提示处断开, daemon 这边读到 EOF
+    sock, f = open_request(["retro", "补录"])
+    while "read" not in json.loads(f.readline()):
+        pass
+    f.close()
+    sock.close()
+
+    time.sleep(0.5)
+    assert proc.poll() is None
+    assert daemon.run_remote(["export"]) == 0
+    assert capsys.readouterr().out.count("写周报") == 30
+
+
+def test_client_quiet_on_closed_pipe(running_daemon):
+    _, env = running_daemon
+    result = subprocess.run(
+        f"{sys.executable} wl.py export | head -n 1", shell=True, cwd=HERE, env=env,
+        capture_output=True, text=True, timeout=60,
+    )
+    assert result.stdout.startswith("date,")
+    assert "Traceback" not in result.stderr
@@ -0,0 +1,130 @@
+import io
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import batch
+import commands
+import desc_index
+import importer
+import storage
+from model import Session, Task, load_tasks, save_session, to_ts
+
+NOW = "2025-05-01T12:00:00"
+
+
+def rebuilt_scores(tmp_path, descriptions):
+    """从全部历史数据重新构建一份索引, 作为增量维护的对照"""
+    conn, _ = desc_index.connect(str(tmp_path / "rebuilt.db"))
+    for date_str in storage.list_dates():
+        desc_index.update(conn, date_str, storage.read_tasks(date_str))
+    return desc_index.scores(conn, descriptions, NOW)
+
+
+def add_session(date_str, description, start, end):
+    tasks = load_tasks(date_str)
+    task = next((t for t in tasks if t.description == description), None)
+    if task is None:
+        task = Task(f"id-{description}", description)
+        tasks.append(task)
+    task.sessions.append(Session(to_ts(f"{date_str}T{start}"), to_ts(f"{date_str}T{end}")))
+    task.sessions.sort(key=lambda s: s.start)
+    save_session(date_str, tasks, task, [s.start for s in task.sessions].index(to_ts(f"{date_str}T{start}")))
+
+
+def test_connection_follows_data_dir(tmp_path, monkeypatch, data_dir):
+    add_session("2025-04-30", "写周报", "09:00:00", "10:00:00")
+    assert [t["description"] for t in storage.search_tasks("周报", "")] == ["写周报"]
+
+    monkeypatch.setattr(storage, "DATA_DIR", str(tmp_path / "other"))
+    assert storage.search_tasks("周报", "") == []
+    assert os.path.exists(os.path.join(str(tmp_path / "other"), storage.INDEX_FILE))
+
+
+def test_retro_counts_earlier_sessions(tmp_path, data_dir):
+    add_session("2025-04-30", "写周报", "09:00:00", "10:00:00")
+    before = desc_index.scores(storage.get_index(), ["写周报"], NOW)["写周报"]
+    # 补录一个比已计分的 session 更早的 session
+    add_session("2025-04-28", "写周报", "09:00:00", "10:00:00")
+    add_session("2025-04-30", "写周报", "07:00:00", "08:00:00")
+
+    scores = desc_index.scores(storage.get_index(), ["写周报"], NOW)
+    assert scores["写周报"] > before + 1
+    assert scores == pytest.approx(rebuilt_scores(tmp_path, ["写周报"]))
+
+
+def test_import_counts_older_history(tmp_path, data_dir):
+    add_session("2025-04-30", "写周报", "09:00:00", "10:00:00")
+    rows = "".join(
+        f"写周报,2025-04-{day:02d}T09:00:00,2025-04-{day:02d}T10:00:00\n" for day in range(20, 28)
+    )
+    stats = importer.import_file(io.StringIO("description,start_time,end_time\n" + rows), "csv", {})
+    assert stats.sessions == 8
+
+    scores = desc_index.scores(storage.get_index(), ["写周报"], NOW)
+    assert scores["写周报"] > 2
+    assert scores == pytest.approx(rebuilt_scores(tmp_path, ["写周报"]))
+
+
+def test_batch_retro_counts_older_history(tmp_path, data_dir):
+    add_session("2025-04-30", "写周报", "09:00:00", "10:00:00")
+    before = desc_index.scores(storage.get_index(), ["写周报"], NOW)["写周报"]
+    result = batch.apply_lines([
+        "retro 2025-04-25T09:00 2025-04-25T10:00 写周报",
+        "retro 2025-04-26T09:00 2025-04-26T10:00 写周报",
+    ], to_ts(NOW))
+    result.commit()
+
+    scores = desc_index.scores(storage.get_index(), ["写周报"], NOW)
+    assert scores["写周报"] > before + 1
+    assert scores == pytest.approx(rebuilt_scores(tmp_path, ["写周报"]))
+
+
+def test_search_matches_substrings_only(data_dir):
+    add_session("2025-04-28", "abcXbcd", "09:00:00", "10:00:00")
+    add_session("2025-04-29", "写abcd周报", "09:00:00", "10:00:00")
+    add_session("2025-04-30", "ab", "09:00:00", "10:00:00")
+
+    def found(selector, since=""):
+        return [t["description"] for t in storage.search_tasks(selector, since)]
+
+    # trigram 都命中但不连续的描述要排除
+    assert found("abcd") == ["写abcd周报"]
+    # 短于 3 个字符走前缀范围查询; 结果按最后结束时间升序
+    assert found("ab") == ["abcXbcd", "写abcd周报", "ab"]
+    assert found("b") == ["abcXbcd", "写abcd周报", "ab"]
+    assert found("周") == ["写abcd周报"]
+    assert found("ab", "2025-04-29") == ["写abcd周报", "ab"]
+
+
+def test_score_decays_by_half_life(data_dir):
+    add_session("2025-04-24", "写周报", "12:00:00", "13:00:00")
+    scores = desc_index.scores(storage.get_index(), ["写周报", "不存在"], NOW)
+    assert scores == {"写周报": pytest.approx(0.5)}
+
+    add_session("2025-05-01", "写周报", "12:00:00", "12:30:00")
+    assert desc_index.scores(storage.get_index(), ["写周报"], NOW)["写周报"] == pytest.approx(1.5)
+
+
+def days_ago(n):
+    # 选择时分数衰减到真实的当前时间, 数据要放在最近几天
+    return (datetime.now() - timedelta(days=n)).strftime("%Y-%m-%d")
+
+
+def test_frequent_task_is_picked(monkeypatch, data_dir):
+    for n in range(1, 8):
+        add_session(days_ago(n), "写周报", "09:00:00", "10:00:00")
+    add_session(days_ago(1), "周报模板", "11:00:00", "12:00:00")
+    monkeypatch.setattr(commands, "input", lambda prompt: pytest.fail("不应该提示选择"), raising=False)
+    assert commands.select_history_task("周报", days_ago(30)).description == "写周报"
+
+
+def test_close_scores_prompt(monkeypatch, data_dir):
+    add_session(days_ago(2), "写周报", "09:00:00", "10:00:00")
+    add_session(days_ago(1), "周报模板", "09:00:00", "10:00:00")
+    prompts = []
+    monkeypatch.setattr(commands, "input", lambda prompt: prompts.append(prompt) or "2", raising=False)
+    # 分数接近时按分数从高到低列出, 第 2 项是较早的那个
+    assert commands.select_history_task("周报", days_ago(30)).description == "写周报"
+    assert len(prompts) == 1
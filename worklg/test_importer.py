@@ -0,0 +1,76 @@
+import io
+import json
+
+import pytest
+from typer.testing import CliRunner
+
+import importer
+import main
+import storage
+
+runner = CliRunner()
+
+
+def run_import(*args):
+    return runner.invoke(main.app, ["import", *args])
+
+
+def test_import_missing_file(tmp_path, data_dir):
+    result = run_import(str(tmp_path / "missing.csv"))
+    assert result.exit_code == 1
+    assert result.exception is None or isinstance(result.exception, SystemExit)
+    assert "无法读取" in result.output
+
+
+def test_import_unreadable_file(tmp_path, data_dir):
+    # 目录当作文件打开会失败 (root 下 chmod 000 拦不住读取)
+    folder = tmp_path / "export.csv"
+    folder.mkdir()
+    result = run_import(str(folder))
+    assert result.exit_code == 1
+    assert result.exception is None or isinstance(result.exception, SystemExit)
+    assert "无法读取" in result.output
+
+
+def test_import_csv(tmp_path, data_dir):
+    path = tmp_path / "export.csv"
+    path.write_text(
+        "description,start_time,end_time\n"
+        "写周报,2025-04-27T09:00:00,2025-04-27T10:00:00\n",
+        encoding="utf-8",
+    )
+    result = run_import(str(path), "--dry-run")
+    assert result.exit_code == 0
+    assert "1 个 session" in result.output
+
+
+ELEMENTS = [
+    {"description": "写周报", "start_time": "2025-04-27T09:00:00", "end_time": "2025-04-27T10:00:00"},
+    12345678901234567890,
+    "一段说明",
+    [1, 2, {"a": "]"}],
+    {"description": "开会, 讨论 [排期]", "start_time": "2025-04-27T11:00:00", "end_time": "2025-04-27T11:30:00"},
+    -1.5e3,
+]
+
+
+@pytest.mark.parametrize("chunk", [1, 3, 7, 64 * 1024])
+def test_read_json_array_across_chunks(monkeypatch, chunk):
+    monkeypatch.setattr(importer, "JSON_CHUNK", chunk)
+    text = " [\n" + ",\n  ".join(json.dumps(e, ensure_ascii=False) for e in ELEMENTS) + "\n] \n"
+    assert list(importer.read_json(io.StringIO(text))) == ELEMENTS
+
+
+def test_read_json_truncated_array(monkeypatch):
+    monkeypatch.setattr(importer, "JSON_CHUNK", 7)
+    text = json.dumps(ELEMENTS[:1])[:-3]
+    with pytest.raises(ValueError):
+        list(importer.read_json(io.StringIO(text)))
+
+
+def test_non_object_elements_are_invalid(data_dir):
+    stats = importer.import_file(io.StringIO(json.dumps(ELEMENTS[1:], ensure_ascii=False)), "json", {})
+    assert stats.rows == 5
+    assert stats.invalid == 4
+    assert stats.sessions == 1
+    assert [t["description"] for t in storage.read_tasks("2025-04-27")] == ["开会, 讨论 [排期]"]
@@ -0,0 +1,91 @@
+import json
+import os
+import random
+
+from typer.testing import CliRunner
+
+import main
+from intervals import IntervalIndex, overlapping_pairs
+from model import to_ts
+
+runner = CliRunner()
+
+
+def overlaps(a, b):
+    return a[0] < b[1] and b[0] < a[1]
+
+
+def test_half_open_boundaries():
+    index = IntervalIndex([(10, 20, "a"), (30, 40, "b")])
+    # 首尾相接不算重叠
+    assert index.find_overlap(20, 30) is None
+    assert index.find_overlap(0, 10) is None
+    assert index.find_overlap(40, 50) is None
+    assert index.find_overlap(19, 21) == (10, 20, "a")
+    assert index.find_overlap(25, 31) == (30, 40, "b")
+    # 被一个很长的早期区间完全覆盖
+    index = IntervalIndex([(0, 100, "long"), (10, 20, "a"), (30, 40, "b")])
+    assert index.find_overlap(50, 60) == (0, 100, "long")
+    assert overlapping_pairs([(10, 20, "a"), (20, 30, "b")]) == []
+
+
+def test_matches_brute_force():
+    rng = random.Random(8)
+    for _ in range(200):
+        intervals = []
+        for i in range(rng.randint(0, 15)):
+            start = rng.randint(0, 60)
+            intervals.append((start, start + rng.randint(0, 12), i))
+        index = IntervalIndex(intervals)
+        for _ in range(20):
+            start = rng.randint(0, 70)
+            query = (start, start + rng.randint(0, 12))
+            hit = index.find_overlap(*query)
+            expected = [iv for iv in intervals if overlaps(iv, query)]
+            assert (hit is None) == (not expected)
+            if hit is not None:
+                assert hit in expected
+
+        found = sorted(tuple(sorted((a[2], b[2]))) for a, b in overlapping_pairs(intervals))
+        expected = sorted(
+            (a[2], b[2]) for a in intervals for b in intervals if a[2] < b[2] and overlaps(a, b)
+        )
+        assert found == expected
+
+
+def seed(data_dir, date_str, tasks):
+    os.makedirs(data_dir, exist_ok=True)
+    with open(os.path.join(data_dir, f"{date_str}.json"), "w") as f:
+        json.dump(tasks, f)
+
+
+def test_running_session_ends_now(data_dir):
+    seed(data_dir, "2025-04-27", [{"id": "a", "description": "写周报", "sessions": [
+        {"start_time": "2025-04-27T09:00:00", "end_time": None}]}])
+    now = to_ts("2025-04-27T11:00:00")
+    intervals = list(main.session_intervals("2025-04-27", "2025-04-27", now))
+    assert intervals == [(to_ts("2025-04-27T09:00:00"), now, "写周报")]
+
+    index = IntervalIndex(intervals)
+    assert main.has_conflict(index, to_ts("2025-04-27T10:30:00"), to_ts("2025-04-27T10:45:00"))[0]
+    assert not main.has_conflict(index, now, to_ts("2025-04-27T11:30:00"))[0]
+
+
+def test_audit_reports_cross_day_overlap(data_dir):
+    seed(data_dir, "2025-04-27", [{"id": "a", "description": "值夜班", "sessions": [
+        {"start_time": "2025-04-27T23:00:00", "end_time": "2025-04-28T01:00:00"}]}])
+    seed(data_dir, "2025-04-28", [
+        {"id": "b", "description": "处理告警", "sessions": [
+            {"start_time": "2025-04-28T00:30:00", "end_time": "2025-04-28T00:45:00"}]},
+        {"id": "c", "description": "写周报", "sessions": [
+            {"start_time": "2025-04-28T01:00:00", "end_time": "2025-04-28T02:00:00"}]},
+    ])
+
+    result = runner.invoke(main.app, ["audit", "--from", "2025-04-27", "--to", "2025-04-28"])
+    assert result.exit_code == 0, result.output
+    assert "Overlaps 1" in result.output
+    assert "值夜班" in result.output and "处理告警" in result.output
+    assert "重叠 0h15m" in result.output
+    # 只看后一天时跨天的 session 不在范围内
+    result = runner.invoke(main.app, ["audit", "--from", "2025-04-28", "--to", "2025-04-28"])
+    assert "没有发现重叠的 session" in result.output
@@ -0,0 +1,72 @@
+import json
+import os
+
+import pytest
+
+import pack
+import storage
+
+
+def day_tasks(date_str, description, hours=1):
+    return [{"id": description, "description": description, "sessions": [
+        {"start_time": f"{date_str}T09:00:00", "end_time": f"{date_str}T{9 + hours:02d}:00:00", "note": "备注"}]}]
+
+
+def seed(data_dir, days):
+    os.makedirs(data_dir, exist_ok=True)
+    for date_str, tasks in days.items():
+        with open(os.path.join(data_dir, f"{date_str}.json"), "w") as f:
+            json.dump(tasks, f, ensure_ascii=False)
+
+
+def test_pack_round_trip(data_dir):
+    days = {f"2025-03-{d:02d}": day_tasks(f"2025-03-{d:02d}", f"任务{d}") for d in (3, 4, 28)}
+    seed(data_dir, days)
+    assert storage.pack_month("2025-03") == 3
+
+    assert not [name for name in os.listdir(data_dir) if name.endswith(".json")]
+    assert storage.list_dates() == sorted(days)
+    for date_str, tasks in days.items():
+        assert storage.read_tasks(date_str) == tasks
+        assert pack.read_day(storage.get_pack_path(date_str), date_str) == tasks
+    assert pack.read_day(storage.get_pack_path("2025-03"), "2025-03-05") is None
+
+
+def test_repack_keeps_packed_days(data_dir):
+    seed(data_dir, {"2025-03-03": day_tasks("2025-03-03", "旧的")})
+    storage.pack_month("2025-03")
+    # 打包后又补录的一天: 零散文件并入已有的 pack, 原来的天不丢
+    seed(data_dir, {"2025-03-10": day_tasks("2025-03-10", "补录")})
+    assert storage.pack_month("2025-03") == 2
+    assert storage.read_tasks("2025-03-03") == day_tasks("2025-03-03", "旧的")
+    assert storage.read_tasks("2025-03-10") == day_tasks("2025-03-10", "补录")
+
+
+@pytest.mark.parametrize("keep", [3, len(pack.MAGIC) + 2, -5])
+def test_truncated_pack_is_an_error(data_dir, keep):
+    seed(data_dir, {"2025-03-03": day_tasks("2025-03-03", "旧的")})
+    storage.pack_month("2025-03")
+    path = storage.get_pack_path("2025-03")
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:keep])
+
+    with pytest.raises(ValueError):
+        storage.read_tasks("2025-03-03")
+    # 损坏的 pack 不能当成空的重新打包, 否则零散文件会被删掉
+    seed(data_dir, {"2025-03-10": day_tasks("2025-03-10", "补录")})
+    with pytest.raises(ValueError):
+        storage.pack_month("2025-03")
+    assert os.path.exists(storage.get_file_path("2025-03-10"))
+
+
+def test_corrupt_pack_day_is_an_error(data_dir):
+    seed(data_dir, {"2025-03-03": day_tasks("2025-03-03", "旧的")})
+    storage.pack_month("2025-03")
+    path = storage.get_pack_path("2025-03")
+    with open(path, "r+b") as f:
+        f.seek(-4, os.SEEK_END)
+        f.write(b"\0\0\0\0")
+    with pytest.raises(ValueError, match="损坏"):
+        storage.read_tasks("2025-03-03")
@@ -0,0 +1,50 @@
+import json
+import os
+
+from typer.testing import CliRunner
+
+import main
+import palette
+import storage
+from utils import pick_color_rgb
+
+runner = CliRunner()
+
+
+def test_pick_color_uses_given_palette(tmp_path):
+    colors = palette.Palette(str(tmp_path / "palette.json"))
+    first = pick_color_rgb("写周报", colors)
+    assert pick_color_rgb("写周报", colors) == first
+    assert pick_color_rgb("开会", colors) != first
+    # 分配的颜色只在内存里, 保存由调用方决定
+    assert not os.path.exists(tmp_path / "palette.json")
+    colors.save(["写周报"])
+    with open(tmp_path / "palette.json", encoding="utf-8") as f:
+        assert list(json.load(f)) == ["写周报"]
+
+
+def test_read_commands_do_not_write_palette(data_dir):
+    os.makedirs(data_dir, exist_ok=True)
+    with open(os.path.join(data_dir, "2025-04-27.json"), "w") as f:
+        json.dump([{"id": "a", "description": "写周报", "sessions": [
+            {"start_time": "2025-04-27T09:00:00", "end_time": "2025-04-27T10:00:00"}]}], f)
+
+    for args in (["tl", "--at", "2025-04-27"], ["tl", "--from", "2025-04-26", "--to", "2025-04-27"]):
+        result = runner.invoke(main.app, args)
+        assert result.exit_code == 0, result.output
+    # daemon 空闲时会 flush, 也不能把只读命令分配的颜色写出去
+    storage.flush()
+    assert not os.path.exists(os.path.join(data_dir, storage.PALETTE_FILE))
+
+
+def test_new_task_color_is_saved(data_dir, monkeypatch):
+    result = runner.invoke(main.app, ["start", "写周报"])
+    assert result.exit_code == 0, result.output
+    runner.invoke(main.app, ["stop"])
+
+    with open(os.path.join(data_dir, storage.PALETTE_FILE), encoding="utf-8") as f:
+        stored = json.load(f)
+    assert list(stored) == ["写周报"]
+    # 另一个进程读到的是同一个颜色
+    monkeypatch.setattr(storage, "_palette", None)
+    assert main.task_color("写周报") == "rgb({},{},{})".format(*stored["写周报"])
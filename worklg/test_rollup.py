@@ -0,0 +1,64 @@
+import json
+import os
+
+import pytest
+from typer.testing import CliRunner
+
+import main
+import rollup
+import sqlite_store
+import storage
+
+runner = CliRunner()
+
+
+def seed(data_dir, date_str, sessions):
+    os.makedirs(data_dir, exist_ok=True)
+    with open(os.path.join(data_dir, f"{date_str}.json"), "w") as f:
+        json.dump([{"id": "a", "description": "写周报", "sessions": sessions}], f)
+
+
+def test_cross_midnight_segments_keep_every_second():
+    day_infos = {}
+    rollup.add_to_days(day_infos, "写周报", "2025-04-27T23:00:30", "2025-04-28T00:59:30")
+    assert day_infos["2025-04-27"]["写周报"]["seconds"] == 59 * 60 + 30
+    assert day_infos["2025-04-27"]["写周报"]["end"] == "2025-04-27T23:59:59"
+    assert day_infos["2025-04-28"]["写周报"]["seconds"] == 59 * 60 + 30
+    assert day_infos["2025-04-28"]["写周报"]["start"] == "2025-04-28T00:00:00"
+
+
+@pytest.mark.parametrize("mode", ["json", "sqlite"])
+def test_multi_day_header_rounds_once(data_dir, monkeypatch, mode):
+    monkeypatch.setattr(storage, "STORAGE_MODE", mode)
+    # storage 只在启动时按配置导入 sqlite_store
+    monkeypatch.setattr(storage, "sqlite_store", sqlite_store, raising=False)
+    session = {"start_time": "2025-04-27T23:00:30", "end_time": "2025-04-28T00:59:30"}
+    if mode == "sqlite":
+        storage.write_tasks("2025-04-27", [{"id": "a", "description": "写周报", "sessions": [session]}])
+    else:
+        seed(data_dir, "2025-04-27", [session])
+
+    result = runner.invoke(main.app, ["tl", "--from", "2025-04-27", "--to", "2025-04-28"])
+    assert result.exit_code == 0, result.output
+    # 两段各 59 分 30 秒, 分段取整会显示成 1h58m
+    assert "Timeline View 1h59m" in result.output
+    # 再跑一次走汇总缓存, 结果不变
+    result = runner.invoke(main.app, ["tl", "--from", "2025-04-27", "--to", "2025-04-28"])
+    assert "Timeline View 1h59m" in result.output
+
+
+def test_old_cache_entries_are_rebuilt(data_dir):
+    seed(data_dir, "2025-04-27", [{"start_time": "2025-04-27T09:00:00", "end_time": "2025-04-27T10:00:00"}])
+    storage.read_rollups("2025-04-27", "2025-04-27")
+    path = os.path.join(data_dir, storage.ROLLUP_FILE)
+    with open(path) as f:
+        cache = json.load(f)
+    # 模拟旧版本写下的按分钟累计的条目
+    entry = cache["2025-04-27"]
+    del entry["version"]
+    entry["days"]["2025-04-27"]["写周报"] = {"minutes": 60, "start": "09:00", "end": "10:00"}
+    with open(path, "w") as f:
+        json.dump(cache, f)
+
+    day_infos = storage.summarize_days("2025-04-27", "2025-04-27", None, "2025-04-30T00:00:00")
+    assert day_infos["2025-04-27"]["写周报"]["seconds"] == 3600
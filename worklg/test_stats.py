@@ -0,0 +1,109 @@
+import os
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from typer.testing import CliRunner
+
+import main
+import sqlite_store
+import stats
+import storage
+from model import to_ts
+
+runner = CliRunner()
+
+# 2025-04-28 是周一
+DAYS = {
+    "2025-04-28": [
+        ("写周报", "09:00:00", "09:40:00"),
+        ("写周报", "09:40:30", "10:30:00"),  # 间隔 30 秒, 和上一段算同一个专注时段
+        ("开会", "10:30:00", "10:45:00"),
+        ("写周报", "11:00:00", "11:03:00"),
+    ],
+    "2025-04-29": [
+        ("开会", "23:30:00", "2025-04-30T00:30:00"),  # 跨零点, 分到周二 23 点和周三 0 点
+    ],
+}
+NOW = to_ts("2025-05-01T12:00:00")
+
+
+def iso(date_str, value):
+    return value if "T" in value else f"{date_str}T{value}"
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def seeded(request, data_dir, monkeypatch):
+    monkeypatch.setattr(storage, "STORAGE_MODE", request.param)
+    monkeypatch.setattr(storage, "sqlite_store", sqlite_store, raising=False)
+    os.makedirs(data_dir, exist_ok=True)
+    for date_str, sessions in DAYS.items():
+        tasks = {}
+        for desc, start, end in sessions:
+            task = tasks.setdefault(desc, {"id": desc, "description": desc, "sessions": []})
+            task["sessions"].append({"start_time": iso(date_str, start), "end_time": iso(date_str, end)})
+        storage.write_tasks(date_str, list(tasks.values()))
+    return data_dir
+
+
+def test_aggregates(seeded):
+    sessions = stats.load_sessions("2025-04-28", "2025-04-29", None, NOW)
+    assert len(sessions) == 5
+
+    heatmap = stats.weekday_hour_minutes(sessions)
+    assert heatmap.sum() == pytest.approx(40 + 49.5 + 15 + 3 + 60)
+    assert heatmap[0, 9] == pytest.approx(40 + 19.5)
+    assert heatmap[0, 10] == pytest.approx(45)
+    assert heatmap[1, 23] == pytest.approx(30)
+    assert heatmap[2, 0] == pytest.approx(30)
+
+    buckets, median, p90 = stats.length_distribution(sessions)
+    assert [count for _, _, count in buckets] == [1, 0, 1, 2, 1, 0, 0]
+    assert median == 40
+
+    days, switches = stats.context_switches(sessions)
+    assert [main.fmt_ts(int(d) * stats.DAY, "%Y-%m-%d") for d in days] == ["2025-04-28", "2025-04-29"]
+    assert switches.tolist() == [2, 0]
+
+    blocks = stats.focus_blocks(sessions, top=2)
+    assert blocks == [
+        ("写周报", to_ts("2025-04-28T09:00:00"), to_ts("2025-04-28T10:30:00")),
+        ("开会", to_ts("2025-04-29T23:30:00"), to_ts("2025-04-30T00:30:00")),
+    ]
+
+
+def test_filter_and_running(seeded):
+    storage.write_tasks("2025-05-01", [{"id": "x", "description": "开会", "sessions": [
+        {"start_time": "2025-05-01T11:00:00", "end_time": None}]}])
+    sessions = stats.load_sessions("2025-04-28", "2025-05-01", "开会", NOW)
+    assert [sessions.descriptions[i] for i in sessions.desc_ids] == ["开会"] * 3
+    # 进行中的 session 以 now 结束
+    assert sessions.ends[-1] == NOW
+    assert stats.weekday_hour_minutes(sessions)[3, 11] == pytest.approx(60)
+
+
+def test_heatmap_matches_minute_by_minute():
+    rng = random.Random(15)
+    base = to_ts("2025-04-28T00:00:00")
+    starts, ends = [], []
+    for _ in range(40):
+        start = base + rng.randrange(0, 14 * stats.DAY, 60)
+        starts.append(start)
+        ends.append(start + rng.randrange(0, 300, 1) * 60)
+    sessions = stats.Sessions(np.array(starts), np.array(ends), np.zeros(len(starts), dtype=np.int32), ["a"])
+
+    expected = np.zeros((7, 24))
+    for start, end in zip(starts, ends):
+        for minute in range(start, end, 60):
+            moment = datetime(1970, 1, 1) + timedelta(seconds=minute)
+            expected[moment.weekday(), moment.hour] += 1
+    assert np.allclose(stats.weekday_hour_minutes(sessions), expected)
+
+
+def test_stats_command(seeded):
+    result = runner.invoke(main.app, ["stats", "--from", "2025-04-28", "--to", "2025-04-29"])
+    assert result.exit_code == 0, result.output
+    assert "5 sessions" in result.output
+    assert "最多 2 次 (2025-04-28)" in result.output
+    assert "1h30m" in result.output
@@ -0,0 +1,107 @@
+import json
+import os
+
+import pack
+import storage
+from model import Session, Task, load_tasks, save_session, to_ts
+
+DAY = "2025-04-27"
+
+
+def start_task(description: str, at: str):
+    tasks = load_tasks(DAY)
+    task = Task(f"id-{description}", description)
+    tasks.append(task)
+    task.sessions.append(Session(to_ts(f"{DAY}T{at}")))
+    save_session(DAY, tasks, task, 0)
+    return tasks, task
+
+
+def journal_lines():
+    with open(storage.get_journal_path(DAY)) as f:
+        return [json.loads(line) for line in f]
+
+
+def as_dicts(tasks):
+    return [task.to_dict() for task in tasks]
+
+
+def test_journal_records_only_changes(journal):
+    tasks, task = start_task("写周报", "09:00:00")
+    sess = task.sessions[0]
+    for i in range(40):
+        sess.note = (sess.note + "\n\n" if sess.note else "") + f"第 {i} 条备注"
+        save_session(DAY, tasks, task, 0)
+    sess.end = to_ts(f"{DAY}T10:00:00")
+    save_session(DAY, tasks, task, 0)
+
+    assert not os.path.exists(storage.get_file_path(DAY))
+    events = journal_lines()
+    assert [e["op"] for e in events] == ["put"] + ["set"] * 41
+    # 第一条备注整体写入, 之后追加的只记录新增的部分, 每条记录的大小不随备注变长
+    assert events[1]["fields"] == {"note": "第 0 条备注"}
+    assert all("note_append" in e for e in events[2:-1])
+    assert max(len(json.dumps(e, ensure_ascii=False)) for e in events[1:]) < 200
+    assert events[-1]["fields"] == {"end_time": f"{DAY}T10:00:00"}
+
+    assert as_dicts(load_tasks(DAY)) == as_dicts(tasks)
+
+
+def test_journal_compacts_at_threshold(journal):
+    tasks, task = start_task("写周报", "09:00:00")
+    sess = task.sessions[0]
+    compacted = False
+    while not compacted:
+        sess.note = (sess.note or "") + "x" * 200
+        save_session(DAY, tasks, task, 0)
+        compacted = not os.path.exists(storage.get_journal_path(DAY))
+        if not compacted:
+            assert os.path.getsize(storage.get_journal_path(DAY)) <= storage.JOURNAL_COMPACT_BYTES
+    with open(storage.get_file_path(DAY)) as f:
+        assert json.load(f) == as_dicts(tasks)
+    assert as_dicts(load_tasks(DAY)) == as_dicts(tasks)
+
+    # 压缩后继续追加到新的 journal
+    tasks = load_tasks(DAY)
+    tasks[0].sessions[0].end = to_ts(f"{DAY}T10:00:00")
+    save_session(DAY, tasks, tasks[0], 0)
+    assert len(journal_lines()) == 1
+    assert as_dicts(load_tasks(DAY)) == as_dicts(tasks)
+
+
+def test_replay_after_interrupted_compaction(journal):
+    tasks, task = start_task("写周报", "09:00:00")
+    task.sessions[0].note = "开头"
+    save_session(DAY, tasks, task, 0)
+    task.sessions[0].note += " 追加"
+    save_session(DAY, tasks, task, 0)
+    with open(storage.get_journal_path(DAY)) as f:
+        saved_journal = f.read()
+
+    # 快照写好了但 journal 没来得及删除: 再回放一遍结果不变
+    storage.compact_tasks(DAY)
+    with open(storage.get_journal_path(DAY), "w") as f:
+        f.write(saved_journal)
+    assert as_dicts(load_tasks(DAY)) == as_dicts(tasks)
+    assert load_tasks(DAY)[0].sessions[0].note == "开头 追加"
+
+
+def test_loose_day_file_overrides_pack(journal):
+    packed = [{"id": "a", "description": "打包的版本", "sessions": [
+        {"start_time": f"{DAY}T08:00:00", "end_time": f"{DAY}T09:00:00"}]}]
+    loose = [{"id": "b", "description": "零散文件的版本", "sessions": [
+        {"start_time": f"{DAY}T10:00:00", "end_time": f"{DAY}T11:00:00"}]}]
+    os.makedirs(journal, exist_ok=True)
+    pack.write_pack(storage.get_pack_path(DAY), {DAY: packed})
+    assert storage.read_tasks(DAY) == packed
+
+    with open(storage.get_file_path(DAY), "w") as f:
+        json.dump(loose, f)
+    assert storage.read_tasks(DAY) == loose
+
+    # journal 回放在零散文件之上
+    tasks = load_tasks(DAY)
+    tasks[0].sessions[0].note = "补充"
+    save_session(DAY, tasks, tasks[0], 0)
+    assert storage.read_tasks(DAY)[0]["description"] == "零散文件的版本"
+    assert storage.read_tasks(DAY)[0]["sessions"][0]["note"] == "补充"
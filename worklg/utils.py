@@ -1,7 +1,7 @@
 import colorsys
 import hashlib
+from functools import lru_cache
 from datetime import datetime, timedelta
-import uuid
 
 def now_iso() -> str:
     return datetime.now().isoformat(timespec='seconds')
@@ -25,6 +25,7 @@ def weekday(date_str: str) -> str:
     return date.strftime('%A')  # 返回完整的星期几名称，如 'Monday'
 
 def gen_id() -> str:
+    import uuid
     return str(uuid.uuid4())[:8]
 
 def duration_minutes(start_iso, end_iso):
@@ -37,85 +38,135 @@ def format_duration(minutes):
     mins = int(minutes) % 60
     return f"{hours}h{mins:02d}m"
 
-used_colors = []
-used_colors_map = {}
-
-def color_distance(c1, c2):
-    """返回两个 RGB 颜色的欧几里得距离"""
-    return ((c1[0]-c2[0])**2 + (c1[1]-c2[1])**2 + (c1[2]-c2[2])**2) ** 0.5
-
-def pick_color_rgb(description, max_retry=20, similarity_threshold=60):
-    global used_colors
-    global used_colors_map
-
-    if description in used_colors_map:
-        return used_colors_map[description]
-
-    salt = 0
-    for _ in range(max_retry):
-        h = hashlib.md5((description + str(salt)).encode()).hexdigest()
-        raw_hue = int(h[0:256], 16)
-
-        # 避开紫色、深蓝区间：只用 0–220 和 320–360
-        allowed_ranges = [(0, 220), (320, 360)]
-        total_range = sum(end - start for start, end in allowed_ranges)
-        hue_selector = raw_hue % total_range
-        for start, end in allowed_ranges:
-            length = end - start
-            if hue_selector < length:
-                hue = start + hue_selector
+# 新颜色与已有颜色的最小 CIELAB 距离 (ΔE), 小于它算作太接近
+SIMILARITY_THRESHOLD = 20
+
+def _candidate_rgb(description, salt):
+    h = hashlib.md5((description + str(salt)).encode()).hexdigest()
+    raw_hue = int(h[0:256], 16)
+
+    # 避开紫色、深蓝区间：只用 0–220 和 320–360
+    allowed_ranges = [(0, 220), (320, 360)]
+    total_range = sum(end - start for start, end in allowed_ranges)
+    hue_selector = raw_hue % total_range
+    for start, end in allowed_ranges:
+        length = end - start
+        if hue_selector < length:
+            hue = start + hue_selector
+            break
+        hue_selector -= length
+
+    saturation = 0.85 + (int(h[6:8], 16) / 255) * 0.15
+    value = 0.9 + (int(h[8:10], 16) / 255) * 0.1
+
+    r, g, b = colorsys.hsv_to_rgb(hue / 360, saturation, value)
+    return (int(r * 255), int(g * 255), int(b * 255))
+
+def pick_color_rgb(description, palette, max_retry=20, similarity_threshold=SIMILARITY_THRESHOLD):
+    """任务的显示颜色; 已分配过的直接取配色表, 新任务挑一个和已有颜色不太接近的并记入配色表 (只在内存里, 由调用方决定是否保存)"""
+    rgb = palette.get(description)
+    if rgb is None:
+        best, best_distance = None, -1.0
+        for salt in range(max_retry):
+            # 距离判定：是否太接近已使用的颜色, 否则 hash 加点偏移，尝试生成下一个候选颜色
+            candidate = _candidate_rgb(description, salt)
+            distance = palette.nearest(candidate, similarity_threshold)
+            if distance >= similarity_threshold:
+                best = candidate
                 break
-            hue_selector -= length
-
-        saturation = 0.85 + (int(h[6:8], 16) / 255) * 0.15
-        value = 0.9 + (int(h[8:10], 16) / 255) * 0.1
-
-        r, g, b = colorsys.hsv_to_rgb(hue / 360, saturation, value)
-        rgb = (int(r * 255), int(g * 255), int(b * 255))
-
-        # 距离判定：是否太接近已使用的颜色
-        if all(color_distance(rgb, used) >= similarity_threshold for used in used_colors):
-            used_colors.append(rgb)
-            used_colors_map[description] = f"rgb({rgb[0]},{rgb[1]},{rgb[2]})"
-            return f"rgb({rgb[0]},{rgb[1]},{rgb[2]})"
-
-        # 否则 hash 加点随机偏移，尝试生成下一个候选颜色
-        salt += 1
-
-    # 如果多次尝试都太像，就无奈接受最后一个
-    used_colors.append(rgb)
-    used_colors_map[description] = f"rgb({rgb[0]},{rgb[1]},{rgb[2]})"
+            if distance > best_distance:
+                best, best_distance = candidate, distance
+        # 如果多次尝试都太像，就用离已有颜色最远的那个
+        rgb = best
+        palette.add(description, rgb)
     return f"rgb({rgb[0]},{rgb[1]},{rgb[2]})"
 
-from wcwidth import wcswidth
+# 显示宽度: 按 256 个码位一页查表, 页面第一次用到时才用 wcwidth 生成 (CJK 文本只会用到少数几页)。
+# wcwidth 只在渲染表格时用到, 延迟导入以免拖慢 start/stop 这类写命令的启动
+_WIDTH_PAGE_BITS = 8
+_width_pages = {}
+# 含零宽连接符 / VS16 的 emoji 序列宽度取决于上下文, 交给 wcswidth
+_SEQUENCE_CHARS = ('\u200d', '\ufe0f')
+
+def _width_page(page):
+    from wcwidth import wcwidth
+    base = page << _WIDTH_PAGE_BITS
+    # 控制字符 (wcwidth 返回 -1) 按 0 宽处理
+    table = bytes(max(0, wcwidth(chr(cp))) for cp in range(base, base + (1 << _WIDTH_PAGE_BITS)))
+    _width_pages[page] = table
+    return table
+
+def _widths(text):
+    """逐个字符的显示宽度"""
+    pages = _width_pages
+    mask = (1 << _WIDTH_PAGE_BITS) - 1
+    for char in text:
+        cp = ord(char)
+        page = pages.get(cp >> _WIDTH_PAGE_BITS) or _width_page(cp >> _WIDTH_PAGE_BITS)
+        yield page[cp & mask]
+
+@lru_cache(maxsize=4096)
+def text_width(text):
+    """字符串的显示宽度 (结果缓存, 同一个任务描述在表格里反复出现)"""
+    if text.isascii() and text.isprintable():
+        return len(text)
+    if any(c in text for c in _SEQUENCE_CHARS):
+        from wcwidth import wcswidth
+        return max(0, wcswidth(text))
+    return sum(_widths(text))
+
+def _truncate(text, max_width):
+    """截断到 max_width 列以内 (超出时末尾加...), 返回 (结果, 显示宽度); 只扫描一遍"""
+    text = text.replace('\n', '').replace('\r', '')
+    if text.isascii() and text.isprintable():
+        if len(text) <= max_width:
+            return text, len(text)
+        keep = max(0, max_width - 3)
+        return text[:keep] + '...', keep + 3
+    if any(c in text for c in _SEQUENCE_CHARS):
+        return _truncate_sequence(text, max_width)
+
+    width = 0
+    cut = None
+    cut_width = 0
+    for i, char_width in enumerate(_widths(text)):
+        if cut is None and width + char_width > max_width - 3:  # 留出3列给...
+            cut, cut_width = i, width
+        width += char_width
+        if width > max_width:
+            return text[:cut] + '...', cut_width + 3
+    return text, width
+
+def _truncate_sequence(text, max_width):
+    # 整体宽度和逐字宽度不一致, 沿用先整体测量再逐字截断的做法
+    total = text_width(text)
+    if total <= max_width:
+        return text, total
+    width = 0
+    for i, char in enumerate(text):
+        char_width = text_width(char)
+        if width + char_width > max_width - 3:
+            return text[:i] + '...', width + 3
+        width += char_width
+    return text + '...', width + 3
 
 def smart_ljust(text, width):
-    pad_len = width - wcswidth(text)
+    pad_len = width - text_width(text)
     return text + ' ' * max(0, pad_len)
 
 def smart_rjust(text, width):
-    pad_len = width - wcswidth(text)
+    pad_len = width - text_width(text)
     return ' ' * max(0, pad_len) + text
 
 def smart_truncate(text, max_width):
     """根据显示宽度智能截断，末尾加..."""
-    from wcwidth import wcswidth
-    text = text.replace('\n', '')
-    text = text.replace('\r', '')
-    if wcswidth(text) <= max_width:
-        return text
-
-    truncated = ''
-    current_width = 0
-
-    for char in text:
-        char_width = wcswidth(char)
-        if current_width + char_width > max_width - 3:  # 留出3列给...
-            break
-        truncated += char
-        current_width += char_width
+    return _truncate(text, max_width)[0]
 
-    return truncated + '...'
+@lru_cache(maxsize=4096)
+def smart_fit(text, width):
+    """截断并用空格补齐到正好 width 列 (等价于 smart_ljust(smart_truncate(text, width), width))"""
+    text, used = _truncate(text, width)
+    return text + ' ' * max(0, width - used)
 
 def percent(floatValue):
     """格式化百分比，保留两位小数"""
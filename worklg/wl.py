@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""命令行入口
+
+有 wl daemon 在运行时, 除 daemon 命令本身以外都转给它执行, 只需要一次 socket 往返。
+否则 start/stop/push/pop/note/curr 这几个高频写命令在这里直接解析参数并调用 commands,
+不导入 typer/rich, 启动只需要几十毫秒; 其它命令、--help 或者解析不了的参数都交给 main.app()。
+"""
+import os
+import sys
+
+import storage
+
+# 命令名 -> (位置参数个数, {选项: (关键字参数, 是否带值)})
+FAST_COMMANDS = {
+    "start": (1, {"--at": ("at", True), "--search-from": ("search_from", True)}),
+    "stop": (0, {"--at": ("at", True)}),
+    "push": (1, {"--at": ("start_at", True)}),
+    "pop": (0, {"--delete": ("delete", False)}),
+    "note": (1, {}),
+    "curr": (0, {}),
+}
+
+
+def parse_fast(argv):
+    """解析快速命令, 返回 (命令名, 位置参数, 关键字参数)；不是快速命令或参数不认识时返回 None"""
+    if not argv or argv[0] not in FAST_COMMANDS:
+        return None
+    name, rest = argv[0], argv[1:]
+    n_args, options = FAST_COMMANDS[name]
+
+    args, kwargs = [], {}
+    i = 0
+    while i < len(rest):
+        arg = rest[i]
+        if arg == "--":
+            args.extend(rest[i + 1:])
+            break
+        if arg.startswith("-") and arg != "-":
+            key, eq, value = arg.partition("=")
+            if key not in options:
+                return None
+            kwarg, takes_value = options[key]
+            if not takes_value:
+                if eq:
+                    return None
+                kwargs[kwarg] = True
+            elif eq:
+                kwargs[kwarg] = value
+            elif i + 1 < len(rest):
+                i += 1
+                kwargs[kwarg] = rest[i]
+            else:
+                return None
+        else:
+            args.append(arg)
+        i += 1
+
+    if len(args) != n_args:
+        return None
+    return name, args, kwargs
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # 没有 socket 文件时 daemon 肯定没在运行, 不必导入 daemon (以及 socket 等模块)
+    if argv[:1] != ["daemon"] and os.path.exists(storage.get_socket_path()):
+        import daemon
+        code = daemon.run_remote(argv)
+        if code is not None:
+            sys.exit(code)
+
+    parsed = parse_fast(argv)
+    if parsed is None:
+        import main as typer_main
+        typer_main.app()
+        return
+
+    import commands
+    name, args, kwargs = parsed
+    getattr(commands, name)(*args, **kwargs)
+
+
+if __name__ == "__main__":
+    main()